@@ -1,70 +1,45 @@
 import argparse
-import pandas as pd
+import sys
 from pathlib import Path
 import logging
 
+# Shared force.dat loader lives with the workflow scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "workflows" / "scripts"))
+from force_data import force_history_files, load_force_history, whole_hull_forces
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def parse_forces_dat(dat_path):
+def parse_forces_dat(forces_root):
     """
-    Parse forces from force.dat (ESI format).
+    Parse forces from force.dat (ESI format), joining the start-time
+    directories of a restarted run.
+    Columns are mapped from the file header; see workflows/scripts/force_data.py.
     """
-    data = []
-    try:
-        with open(dat_path, 'r') as f:
-            lines = f.readlines()
-            
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-                
-            parts = line.replace('(', '').replace(')', '').split()
-            
-            # Basic expectation: Time + Forces + Moments
-            if len(parts) >= 4:
-                try:
-                    time = float(parts[0])
-                    # Total X force usually index 1
-                    total_x = float(parts[1])
-                    
-                    # ESI force.dat columns can vary, but standard is:
-                    # Time, TotalX, TotalY, TotalZ, PressureX...
-                    
-                    data.append({
-                        'time': time,
-                        'force_x': total_x
-                    })
-                except ValueError:
-                    continue
-                    
-        return pd.DataFrame(data)
-        
-    except Exception as e:
-        logging.error(f"Error parsing {dat_path}: {e}")
-        return pd.DataFrame()
+    return load_force_history(forces_root)
 
 def main():
     parser = argparse.ArgumentParser(description="Extract results from OpenFOAM case.")
     parser.add_argument("case_dir", type=Path, help="Path to case directory")
+    parser.add_argument("--full-domain", action="store_true",
+                        help="The case meshes both sides of the hull (no symmetry feature); forces are not doubled")
     args = parser.parse_args()
     
     case_dir = args.case_dir.resolve()
     logging.info(f"Processing case: {case_dir}")
     
     # Locate data
-    # Standard ESI location
-    force_file = case_dir / "postProcessing" / "forces" / "0" / "force.dat"
-    # Fallback
-    if not force_file.exists():
-        force_file = case_dir / "postProcessing" / "forces" / "0" / "forces.dat"
+    # Standard ESI location (force.dat), with forces.dat as fallback
+    forces_root = case_dir / "postProcessing" / "forces"
         
-    if not force_file.exists():
+    if not force_history_files(forces_root):
         logging.warning(f"No force data found in {case_dir}")
         return
 
-    df = parse_forces_dat(force_file)
+    df = parse_forces_dat(forces_root)
+    if not args.full_domain:
+        # A half domain gives the forces on half the hull
+        df = whole_hull_forces(df)
     
     if not df.empty:
         output_csv = case_dir / "results.csv"
@@ -72,7 +47,7 @@ def main():
         logging.info(f"Saved results to {output_csv}")
         
         # Simple summary
-        mean_force = df['force_x'].tail(50).mean() # Last 50 steps
+        mean_force = df['force_total'].tail(50).mean() # Last 50 steps
         logging.info(f"Mean Force (Last 50): {mean_force}")
     else:
         logging.warning("Empty data extracted.")
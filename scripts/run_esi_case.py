@@ -3,6 +3,10 @@ import subprocess
 import argparse
 import os
 import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "workflows" / "scripts"))
+from foam_case import read_number_of_subdomains, set_number_of_subdomains
 
 def run_command(cmd, dry_run=False):
     print(f"Running: {cmd}")
@@ -17,9 +21,20 @@ def main():
     parser.add_argument("--case-dir", default="cases/dtc_esi_baseline", help="Path to the case directory")
     parser.add_argument("--image", default="openfoam-ships:2506", help="Docker image to use")
     parser.add_argument("--dry-run", action="store_true", help="Print commands without executing")
+    parser.add_argument("--np", type=int, default=None, help="MPI ranks (default: numberOfSubdomains in system/decomposeParDict)")
+    parser.add_argument("--reconstruct", choices=["none", "latest", "all"], default="latest",
+                        help="Time steps to reconstruct after the run; post-processing also reads processor* directly")
     args = parser.parse_args()
 
     abs_case_dir = os.path.abspath(args.case_dir)
+
+    # The rank count and the decomposition must agree
+    n_procs = read_number_of_subdomains(args.case_dir) or 8
+    if args.np is not None and args.np != n_procs:
+        print(f"Decomposing into {args.np} subdomains (was {n_procs})")
+        if not args.dry_run:
+            set_number_of_subdomains(Path(args.case_dir) / "system" / "decomposeParDict", args.np)
+        n_procs = args.np
     container_mount = "/mnt/case"
     
     # OpenFOAM environment setup
@@ -55,10 +70,13 @@ def main():
     cmds.append("renumberMesh -overwrite")
     
     # 7. Solver
-    cmds.append("mpirun -np 8 interFoam -parallel")
+    cmds.append(f"mpirun -np {n_procs} interFoam -parallel")
     
-    # 8. Reconstruct
-    cmds.append("reconstructPar")
+    # 8. Reconstruct (forces are written by the master process and need none)
+    if args.reconstruct == "latest":
+        cmds.append("reconstructPar -latestTime")
+    elif args.reconstruct == "all":
+        cmds.append("reconstructPar")
 
     # Combine into single bash command string
     full_cmd_str = " && ".join(cmds)
@@ -1,10 +1,20 @@
 #!/usr/bin/env python3
 import os
-import shutil
 import math
 import subprocess
 import argparse
 import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "workflows" / "scripts"))
+from thin_copy import link_methods, thin_copytree
+
+# Large inputs run_esi_case.py only reads: linked to the baseline, not copied
+SHARED_INPUTS = ["constant/triSurface/*.stl", "constant/triSurface/*.stl.gz", "constant/triSurface/*.obj*"]
+# Outputs run_esi_case.py regenerates in every variant: left out, never linked,
+# so the mesher and solver cannot write through a link into the baseline
+GENERATED_OUTPUTS = ["processor*", "postProcessing", "dynamicCode", "log.*", "*.foam",
+                     "constant/polyMesh", "constant/extendedFeatureEdgeMesh", "constant/triSurface/*.eMesh"]
 
 def calculate_velocity(fr, Lpp=5.976, g=9.81):
     """Calculate velocity U from Froude number."""
@@ -18,11 +28,24 @@ def sed_replace(file_path, search_str, replace_str):
     with open(file_path, 'w') as f:
         f.write(new_content)
 
+def time_dirs(case_dir):
+    """Names of the solution time directories (other than 0) of a case."""
+    names = []
+    for name in os.listdir(case_dir):
+        try:
+            if float(name) > 0:
+                names.append(name)
+        except ValueError:
+            pass
+    return names
+
 def main():
     parser = argparse.ArgumentParser(description="Run Velocity Sweep for DTC ESI")
     parser.add_argument("--dry-run", action="store_true", help="Print commands only")
     parser.add_argument("--base-case", default="cases/dtc_esi_baseline", help="Source baseline case")
     parser.add_argument("--froude", nargs="+", type=float, default=[0.18, 0.20, 0.22], help="List of Fr to run")
+    parser.add_argument("--link-mode", choices=["auto", "reflink", "hardlink", "symlink", "copy"], default="auto",
+                        help="How variants share the baseline geometry (default: first that works)")
     args = parser.parse_args()
 
     # Constants
@@ -44,8 +67,11 @@ def main():
                 print(f"Directory {case_dir} exists. Skipping/Overwriting? (Assumed safe or manual clean needed)")
                 # Ideally check or clean. For now, we assume user manages repeated runs or we overwrite.
             else:
-                print(f"Cloning {args.base_case} to {case_dir}...")
-                shutil.copytree(args.base_case, case_dir)
+                print(f"Cloning {args.base_case} to {case_dir} (thin)...")
+                used = thin_copytree(args.base_case, case_dir, link=SHARED_INPUTS,
+                                     ignore=GENERATED_OUTPUTS + time_dirs(args.base_case),
+                                     methods=link_methods(args.link_mode))
+                print(f"  {dict(used)}")
             
             # Update U
             u_file = os.path.join(case_dir, "0.orig/U")
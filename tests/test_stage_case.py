@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "workflows" / "scripts"))
+
+from stage_case import stage_case  # noqa: E402
+
+
+def make_build(build_dir, end_time="100"):
+    (build_dir / "system").mkdir(parents=True)
+    (build_dir / "constant" / "triSurface").mkdir(parents=True)
+    (build_dir / "system" / "blockMeshDict").write_text("blocks ();\n")
+    (build_dir / "system" / "controlDict").write_text(f"endTime {end_time};\n")
+    (build_dir / "constant" / "triSurface" / "hull.stl").write_text("solid hull\nendsolid hull\n")
+    (build_dir / "Allrun").write_text("#!/bin/bash\nblockMesh\n# --- End of meshing ---\nfoamRun\n")
+
+
+def run_mesh_stage(run_dir):
+    """What the meshing part of the Allrun leaves behind."""
+    stl = run_dir / "constant" / "triSurface" / "hull.stl"
+    stl.unlink()
+    stl.write_text("solid hull\nscaled\nendsolid hull\n")
+    (run_dir / "constant" / "triSurface" / "hull.eMesh").write_text("edges\n")
+    (run_dir / "constant" / "polyMesh").mkdir(parents=True)
+    (run_dir / "constant" / "polyMesh" / "points").write_text("()\n")
+    (run_dir / "log.blockMesh").write_text("End\n")
+
+
+def test_restage_after_mesh_stage_keeps_mesh(tmp_path):
+    build_dir, run_dir = tmp_path / "build" / "case", tmp_path / "results" / "case"
+    make_build(build_dir)
+    stage_case(build_dir, run_dir)
+    run_mesh_stage(run_dir)
+    (run_dir / "log.foamRun").write_text("previous run\n")
+
+    (build_dir / "system" / "controlDict").write_text("endTime 200;\n")
+    stage_case(build_dir, run_dir)
+
+    assert (run_dir / "constant" / "polyMesh" / "points").exists()
+    assert (run_dir / "constant" / "triSurface" / "hull.eMesh").exists()
+    assert (run_dir / "system" / "controlDict").read_text() == "endTime 200;\n"
+    assert not (run_dir / "log.foamRun").exists()
+
+
+def test_restage_with_new_meshing_inputs_discards_mesh(tmp_path):
+    build_dir, run_dir = tmp_path / "build" / "case", tmp_path / "results" / "case"
+    make_build(build_dir)
+    stage_case(build_dir, run_dir)
+    run_mesh_stage(run_dir)
+
+    (build_dir / "system" / "blockMeshDict").write_text("blocks (hex);\n")
+    stage_case(build_dir, run_dir)
+
+    assert not (run_dir / "constant" / "polyMesh" / "points").exists()
+    assert not (run_dir / "log.blockMesh").exists()
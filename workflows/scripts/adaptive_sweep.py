@@ -0,0 +1,107 @@
+"""
+Uncertainty-driven choice of Froude numbers for a resistance sweep.
+
+A Gaussian process is fitted to the resistance coefficient R / U^2 as a
+function of Froude number. That coefficient varies far less over the speed
+range than R itself, so few points pin it down. Resistance and effective
+power follow as R = c U^2 and P = c U^3, together with their standard
+deviations.
+
+New points go where the predicted uncertainty of the chosen quantity is
+largest. A batch is chosen one point at a time, each time adding the
+prediction at the chosen point as if it had been run ("kriging believer"),
+so the points of a batch spread out instead of piling up at one maximum.
+The sweep is done once the 95% band is within `tolerance` of the
+prediction everywhere in the range.
+"""
+import logging
+
+import numpy as np
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, RBF, WhiteKernel
+
+GRAVITY = 9.81
+Z_95 = 1.96
+# Froude resolution of the candidates; case names encode Fr to three decimals
+FROUDE_STEP = 0.001
+
+
+def make_surrogate():
+    """Gaussian process with a smooth trend plus noise from unsteady averaging."""
+    kernel = (
+        ConstantKernel(1.0, (1e-3, 1e3)) * RBF(length_scale=0.05, length_scale_bounds=(0.02, 1.0))
+        + WhiteKernel(noise_level=1e-4, noise_level_bounds=(1e-8, 1e-1))
+    )
+    return GaussianProcessRegressor(kernel=kernel, normalize_y=True, n_restarts_optimizer=5, random_state=0)
+
+
+def fit_surrogate(froude, velocity, force):
+    """Fit the surrogate to Fr -> R / U^2 of the runs so far."""
+    froude = np.asarray(froude, dtype=float)
+    coefficient = np.asarray(force, dtype=float) / np.asarray(velocity, dtype=float) ** 2
+    return make_surrogate().fit(froude.reshape(-1, 1), coefficient)
+
+
+def predict(model, froude, length, target="resistance"):
+    """
+    Predicted mean and standard deviation of `target` (resistance or power).
+    """
+    froude = np.asarray(froude, dtype=float)
+    velocity = froude * np.sqrt(GRAVITY * length)
+    mean, std = model.predict(froude.reshape(-1, 1), return_std=True)
+    power = {"resistance": 2, "power": 3}[target]
+    return mean * velocity ** power, std * velocity ** power
+
+
+def relative_half_width(model, froude, length, target="resistance"):
+    """Half-width of the 95% band relative to the prediction, per Froude number."""
+    mean, std = predict(model, froude, length, target)
+    return Z_95 * std / np.maximum(np.abs(mean), 1e-12)
+
+
+def candidate_grid(fr_min, fr_max):
+    """Froude numbers the sweep may choose from."""
+    n = int(round((fr_max - fr_min) / FROUDE_STEP)) + 1
+    return np.round(np.linspace(fr_min, fr_max, n), 3)
+
+
+def next_points(model, froude_done, fr_min, fr_max, length, target="resistance", batch_size=1, min_spacing=0.01):
+    """
+    Choose the next `batch_size` Froude numbers to run.
+
+    Candidates closer than `min_spacing` to a finished or chosen point are
+    skipped, since a nearby run adds little information.
+    """
+    grid = candidate_grid(fr_min, fr_max)
+    X = np.asarray(model.X_train_, dtype=float)
+    y = model.predict(X)
+    taken = list(froude_done)
+    chosen = []
+
+    believer = model
+    for _ in range(batch_size):
+        allowed = np.array([all(abs(fr - other) >= min_spacing for other in taken) for fr in grid])
+        if not allowed.any():
+            break
+        _, std = predict(believer, grid, length, target)
+        std[~allowed] = -np.inf
+        best = float(grid[int(np.argmax(std))])
+        chosen.append(best)
+        taken.append(best)
+
+        # Pretend the prediction at the chosen point was observed; keep the fitted kernel
+        X = np.vstack([X, [[best]]])
+        y = np.append(y, believer.predict([[best]]))
+        believer = GaussianProcessRegressor(kernel=model.kernel_, optimizer=None, normalize_y=model.normalize_y).fit(X, y)
+
+    return chosen
+
+
+def assess(model, fr_min, fr_max, length, target="resistance", tolerance=0.02):
+    """Worst relative 95% half-width over the range, and whether it meets `tolerance`."""
+    grid = candidate_grid(fr_min, fr_max)
+    width = relative_half_width(model, grid, length, target)
+    worst = int(np.argmax(width))
+    logging.info(f"Largest {target} uncertainty: +/-{100 * width[worst]:.1f}% at Fr={grid[worst]:.3f} "
+                 f"(target {100 * tolerance:.1f}%)")
+    return float(width[worst]), bool(width[worst] <= tolerance)
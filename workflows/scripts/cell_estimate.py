@@ -0,0 +1,340 @@
+"""
+Cell count and memory of a prepared case, predicted before it is meshed.
+
+Works on the rendered dictionaries of a case directory (see prepare_case.py)
+and takes well under a second, where snappyHexMesh takes an hour:
+
+- blockMeshDict: the background blocks, their cell counts and z grading;
+- topoSetDict.<n> with refineMeshDict: the boxes the Allrun refines before
+  snappyHexMesh, each splitting the cells in it in 4 (tan1 tan2) or 8;
+- snappyHexMeshDict: surface, feature-edge and distance refinement levels
+  and nCellsBetweenLevels;
+- the hull STL of constant/triSurface: its bounding box, area and feature
+  edges (sharper than surfaceFeatureExtractDict's includedAngle).
+
+snappyHexMesh splits a cell of size h at the hull into cells of h / 2^level.
+A distance region of level l around the hull (its bounding box grown by the
+distance, within the domain) holds volume / (h / 2^l)^3 cells. Above the
+finest region every level adds a shell of nCellsBetweenLevels cells over
+the hull area, and feature edges a tube of that radius. Cells inside the
+hull are not subtracted; the estimate errs on the large side.
+
+Memory follows from rules of thumb for incompressibleVoF with k-omega SST:
+about SOLVER_BYTES_PER_CELL per cell plus RANK_OVERHEAD per MPI rank, and
+MESHING_BYTES_PER_CELL for the serial snappyHexMesh.
+"""
+import json
+import logging
+import math
+import re
+from pathlib import Path
+
+import click
+import numpy as np
+
+from foam_case import read_number_of_subdomains
+from stl_io import read_stl
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+ESTIMATE_FILE = "cell_estimate.json"
+SOLVER_BYTES_PER_CELL = 2_000
+MESHING_BYTES_PER_CELL = 3_000
+RANK_OVERHEAD = 300e6
+# includedAngle of templates/scripts/surfaceFeatureExtractDict.template
+INCLUDED_ANGLE = 150
+
+VERTICES_PATTERN = re.compile(r"^vertices\s*\((.*?)^\);", re.S | re.M)
+POINT_PATTERN = re.compile(r"\(\s*([-+\d.eE]+)\s+([-+\d.eE]+)\s+([-+\d.eE]+)\s*\)")
+BLOCK_PATTERN = re.compile(r"hex\s*\(([\d\s]+)\)\s*\((\d+)\s+(\d+)\s+(\d+)\)\s*simpleGrading\s*\(([^()]*)\)")
+BOX_PATTERN = re.compile(r"^\s*box\s+" + POINT_PATTERN.pattern + r"\s*" + POINT_PATTERN.pattern + r"\s*;", re.M)
+DIRECTIONS_PATTERN = re.compile(r"^\s*directions\s*\(([^()]*)\)\s*;", re.M)
+REFINE_LOOP_PATTERN = re.compile(r"for i in \$\(seq 1 (\d+)\)")
+SURFACE_LEVEL_PATTERN = re.compile(r"refinementSurfaces\s*\{.*?level\s*\(\s*\d+\s+(\d+)\s*\)", re.S)
+FEATURE_LEVEL_PATTERN = re.compile(r"features\s*\(.*?level\s+(\d+)\s*;", re.S)
+DISTANCE_LEVELS_PATTERN = re.compile(r"mode\s+distance\s*;\s*levels\s*\(((?:\s*\([^()]*\))*)\s*\)\s*;")
+LEVEL_PAIR_PATTERN = re.compile(r"\(\s*([\d.eE+-]+)\s+(\d+)\s*\)")
+STL_FILE_PATTERN = re.compile(r"file\s+\"([^\"]+\.stl)\"")
+
+
+def _entry(text, name, default=None, cast=float):
+    match = re.search(rf"^\s*{name}\s+([^;\s]+)\s*;", text, re.M)
+    return cast(match.group(1)) if match else default
+
+
+def graded_nodes(x0, x1, cells, grading):
+    """Node positions of a simpleGrading block edge (grading = last / first cell)."""
+    ratio = grading ** (1 / (cells - 1)) if cells > 1 else 1.0
+    sizes = ratio ** np.arange(cells)
+    return x0 + (x1 - x0) * np.concatenate([[0.0], np.cumsum(sizes) / sizes.sum()])
+
+
+def read_blocks(case_dir):
+    """
+    Blocks of system/blockMeshDict as dicts of their bounding box `lo`, `hi`,
+    `cells` (nx, ny, nz) and `grading` (x, y, z). Blocks are taken to be
+    axis-aligned, as in templates/base.
+    """
+    text = (Path(case_dir) / "system" / "blockMeshDict").read_text()
+    vertices = np.array(POINT_PATTERN.findall(VERTICES_PATTERN.search(text).group(1)), dtype=float)
+    blocks = []
+    for labels, n_x, n_y, n_z, grading in BLOCK_PATTERN.findall(text):
+        corners = vertices[[int(label) for label in labels.split()]]
+        grading = [float(value) for value in grading.split()]
+        blocks.append({
+            "lo": corners.min(axis=0),
+            "hi": corners.max(axis=0),
+            "cells": (int(n_x), int(n_y), int(n_z)),
+            "grading": grading * 3 if len(grading) == 1 else grading,
+        })
+    if not blocks:
+        raise ValueError(f"{case_dir}: no hex blocks with simpleGrading in blockMeshDict")
+    return blocks
+
+
+def refinement_boxes(case_dir):
+    """
+    The (lo, hi) boxes the Allrun refines with topoSet and refineMesh, in
+    order, and the cells each refined cell becomes (4 or 8).
+    """
+    case_dir = Path(case_dir)
+    allrun = case_dir / "Allrun"
+    loop = REFINE_LOOP_PATTERN.search(allrun.read_text()) if allrun.exists() else None
+    if loop is None:
+        return [], 1
+    boxes = []
+    for i in range(1, int(loop.group(1)) + 1):
+        values = [float(v) for v in BOX_PATTERN.search((case_dir / "system" / f"topoSetDict.{i}").read_text()).groups()]
+        boxes.append((np.array(values[:3]), np.array(values[3:])))
+    directions = DIRECTIONS_PATTERN.search((case_dir / "system" / "refineMeshDict").read_text())
+    split = 2 ** len(directions.group(1).split()) if directions else 8
+    return boxes, split
+
+
+def snappy_levels(case_dir):
+    """
+    Refinement settings of system/snappyHexMeshDict: surface and feature
+    levels, [(distance, level)] of the distance regions, nCellsBetweenLevels,
+    maxGlobalCells and the STL file. None without a snappyHexMeshDict.
+    """
+    path = Path(case_dir) / "system" / "snappyHexMeshDict"
+    if not path.exists():
+        return None
+    text = path.read_text()
+    surface = SURFACE_LEVEL_PATTERN.search(text)
+    feature = FEATURE_LEVEL_PATTERN.search(text)
+    stl = STL_FILE_PATTERN.search(text)
+    distances = [(float(d), int(level)) for levels in DISTANCE_LEVELS_PATTERN.findall(text)
+                 for d, level in LEVEL_PAIR_PATTERN.findall(levels)]
+    return {
+        "surface": int(surface.group(1)) if surface else 0,
+        "feature": int(feature.group(1)) if feature else 0,
+        "distance": sorted(distances, reverse=True),
+        "between": _entry(text, "nCellsBetweenLevels", 1, int),
+        "max_global": _entry(text, "maxGlobalCells", None, int),
+        "stl": stl.group(1) if stl else None,
+    }
+
+
+def _cell_size(blocks, boxes, split, point):
+    """(dx, dy, dz) of the background cell at `point`, after the box refinement."""
+    block = next((b for b in blocks if np.all(point >= b["lo"]) and np.all(point <= b["hi"])), None)
+    if block is None:
+        return None
+    sizes = []
+    for axis in range(3):
+        nodes = graded_nodes(block["lo"][axis], block["hi"][axis], block["cells"][axis], block["grading"][axis])
+        i = min(max(np.searchsorted(nodes, point[axis]) - 1, 0), len(nodes) - 2)
+        sizes.append(nodes[i + 1] - nodes[i])
+    for lo, hi in boxes:
+        if np.all(point >= lo) and np.all(point <= hi):
+            sizes[0] /= 2
+            sizes[1] /= 2
+            if split == 8:
+                sizes[2] /= 2
+    return sizes
+
+
+def background_cells(blocks, boxes, split):
+    """Cells after blockMesh and after the box refinement of the Allrun."""
+    block_cells = sum(math.prod(b["cells"]) for b in blocks)
+    cells = float(block_cells)
+    for level, (lo, hi) in enumerate(boxes):
+        for block in blocks:
+            # Columns of the box in the block and its cells' z centres inside it
+            n_x, n_y, n_z = block["cells"]
+            extent = block["hi"] - block["lo"]
+            overlap = np.clip(np.minimum(hi, block["hi"]) - np.maximum(lo, block["lo"]), 0, None)
+            nodes = graded_nodes(block["lo"][2], block["hi"][2], n_z, block["grading"][2])
+            centres = 0.5 * (nodes[1:] + nodes[:-1])
+            layers = np.count_nonzero((centres >= lo[2]) & (centres <= hi[2]))
+            if split == 8:
+                layers = overlap[2] / extent[2] * n_z
+            inside = overlap[0] / extent[0] * n_x * overlap[1] / extent[1] * n_y * layers * split ** level
+            cells += (split - 1) * inside
+    return block_cells, cells
+
+
+def feature_edge_length(triangles, included_angle=INCLUDED_ANGLE):
+    """Length of the edges where the surface turns by more than 180 - included_angle degrees."""
+    points, index = np.unique(np.round(triangles.reshape(-1, 3), 9), axis=0, return_inverse=True)
+    faces = index.reshape(-1, 3)
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-300)
+    edges = np.sort(np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]]), axis=1)
+    owner = np.tile(np.arange(len(faces)), 3)
+    order = np.lexsort((edges[:, 1], edges[:, 0]))
+    edges, owner = edges[order], owner[order]
+    # Manifold edges appear twice in a row, once for each of their faces
+    pair = np.all(edges[1:] == edges[:-1], axis=1)
+    first, second = owner[:-1][pair], owner[1:][pair]
+    cos_turn = np.einsum("ij,ij->i", normals[first], normals[second])
+    sharp = cos_turn < math.cos(math.radians(180 - included_angle))
+    lengths = np.linalg.norm(points[edges[:-1][pair][sharp, 0]] - points[edges[:-1][pair][sharp, 1]], axis=1)
+    return float(lengths.sum())
+
+
+def _region_volume(lo, hi, distance, domain_lo, domain_hi):
+    """Volume of a box grown by `distance`, within the domain."""
+    return float(np.prod(np.clip(np.minimum(hi + distance, domain_hi) - np.maximum(lo - distance, domain_lo), 0, None)))
+
+
+def snappy_cells(levels, triangles, cell_size, domain_lo, domain_hi):
+    """Cells snappyHexMesh adds around a hull in cells of `cell_size` (dx, dy, dz)."""
+    inside = np.all((triangles.mean(axis=1) >= domain_lo) & (triangles.mean(axis=1) <= domain_hi), axis=1)
+    triangles = triangles[inside]
+    if not len(triangles):
+        return 0.0, 0.0, 0.0
+    lo, hi = triangles.reshape(-1, 3).min(axis=0), triangles.reshape(-1, 3).max(axis=0)
+    area = float(0.5 * np.linalg.norm(np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]), axis=1).sum())
+    h = float(np.prod(cell_size)) ** (1 / 3)
+    between = levels["between"]
+
+    # Distance regions, coarse to fine, each net of the finer ones inside it
+    regions = [(distance, level) for distance, level in levels["distance"] if level > 0]
+    volumes = [_region_volume(lo, hi, distance, domain_lo, domain_hi) for distance, _ in regions]
+    added = -volumes[0] / h ** 3 if regions else 0.0
+    for k, (_, level) in enumerate(regions):
+        net = volumes[k] - (volumes[k + 1] if k + 1 < len(regions) else 0.0)
+        added += net / (h / 2 ** level) ** 3
+    top = regions[-1][1] if regions else 0
+
+    # Shells of nCellsBetweenLevels cells on the outside of the hull per finer level
+    for level in range(top + 1, levels["surface"] + 1):
+        added += area * between / (h / 2 ** level) ** 2
+    if levels["surface"] > top:
+        added += area / (h / 2 ** levels["surface"]) ** 2
+
+    # Tubes of that radius along the feature edges, half of them outside the hull
+    edges = feature_edge_length(triangles) if levels["feature"] > levels["surface"] else 0.0
+    for level in range(max(levels["surface"], top) + 1, levels["feature"] + 1):
+        added += 0.5 * math.pi * between ** 2 * edges / (h / 2 ** level)
+    return added, area, edges
+
+
+def estimate_case(case_dir, scale=1.0):
+    """
+    Predicted cells and memory of the rendered case in `case_dir`, as a dict.
+    `scale` is the factor the Allrun scales the hull STL by.
+    """
+    case_dir = Path(case_dir)
+    blocks = read_blocks(case_dir)
+    boxes, split = refinement_boxes(case_dir)
+    block_cells, cells = background_cells(blocks, boxes, split)
+    domain_lo = np.min([b["lo"] for b in blocks], axis=0)
+    domain_hi = np.max([b["hi"] for b in blocks], axis=0)
+
+    levels = snappy_levels(case_dir)
+    stl = case_dir / "constant" / "triSurface" / levels["stl"] if levels and levels["stl"] else None
+    area = edges = 0.0
+    cell_size = None
+    if stl is not None and stl.exists():
+        triangles = read_stl(stl) * (scale or 1.0)
+        centre = 0.5 * (triangles.reshape(-1, 3).min(axis=0) + triangles.reshape(-1, 3).max(axis=0))
+        cell_size = _cell_size(blocks, boxes, split, np.clip(centre, domain_lo, domain_hi))
+        if cell_size is not None:
+            added, area, edges = snappy_cells(levels, triangles, cell_size, domain_lo, domain_hi)
+            cells += added
+    elif levels:
+        logging.warning(f"{case_dir}: no hull STL; the estimate leaves out snappyHexMesh")
+
+    capped = bool(levels and levels["max_global"] and cells > levels["max_global"])
+    if capped:
+        # snappyHexMesh stops refining at maxGlobalCells
+        cells = levels["max_global"]
+    ranks = read_number_of_subdomains(case_dir) or 1
+    return {
+        "block_cells": int(block_cells),
+        "cells": int(cells),
+        "capped": capped,
+        "ranks": ranks,
+        "memory_per_rank": memory_per_rank(cells, ranks),
+        "meshing_memory": cells * MESHING_BYTES_PER_CELL,
+        "cell_size_at_hull": [float(s) for s in cell_size] if cell_size is not None else None,
+        "hull_area": area,
+        "feature_edge_length": edges,
+    }
+
+
+def memory_per_rank(cells, ranks):
+    """Bytes each of `ranks` MPI ranks needs to solve on `cells` cells."""
+    return cells / max(ranks, 1) * SOLVER_BYTES_PER_CELL + RANK_OVERHEAD
+
+
+def ranks_for_memory(cells, budget):
+    """Fewest ranks that keep each within `budget` GB, or 1 without a budget."""
+    if not budget:
+        return 1
+    free = budget * 1e9 - RANK_OVERHEAD
+    if free <= 0:
+        raise ValueError(f"A memory budget of {budget} GB per rank leaves nothing for the mesh")
+    return max(1, math.ceil(cells * SOLVER_BYTES_PER_CELL / free))
+
+
+def check_memory(estimate, budget):
+    """Raise if the estimated memory per rank exceeds `budget` GB (None: no budget)."""
+    if budget and estimate["memory_per_rank"] > budget * 1e9:
+        raise ValueError(
+            f"~{estimate['cells']:,} cells on {estimate['ranks']} rank(s) need "
+            f"{estimate['memory_per_rank'] / 1e9:.2f} GB per rank, over the budget of {budget} GB; "
+            f"use at least {ranks_for_memory(estimate['cells'], budget)} ranks (nProcs) or a coarser mesh")
+
+
+def write_estimate(case_dir, estimate):
+    """Keep an estimate next to the case's dictionaries (see read_estimate)."""
+    (Path(case_dir) / ESTIMATE_FILE).write_text(json.dumps(estimate, indent=2) + "\n")
+
+
+def read_estimate(case_dir):
+    """The estimate prepare_case wrote for a case, or None."""
+    path = Path(case_dir) / ESTIMATE_FILE
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def log_estimate(estimate):
+    """Log an estimate."""
+    capped = " (maxGlobalCells)" if estimate["capped"] else ""
+    logging.info(f"Estimated mesh: ~{estimate['cells']:,} cells{capped} from {estimate['block_cells']:,} blockMesh cells; "
+                 f"{estimate['memory_per_rank'] / 1e9:.2f} GB per rank on {estimate['ranks']} rank(s), "
+                 f"{estimate['meshing_memory'] / 1e9:.2f} GB for snappyHexMesh")
+
+
+@click.command()
+@click.argument("case_dir", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option("--scale", type=float, default=1.0, show_default=True, help="Factor the Allrun scales the hull STL by")
+@click.option("--memory-budget", type=float, default=None, help="GB per rank; exit with an error above it")
+def main(case_dir, scale, memory_budget):
+    """
+    Print the predicted cells and memory of the prepared case CASE_DIR as JSON.
+    """
+    estimate = estimate_case(case_dir, scale)
+    click.echo(json.dumps(estimate, indent=2))
+    try:
+        check_memory(estimate, memory_budget)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Domain extents, background mesh and free-surface refinement of a case.
+
+Without the auto_domain feature a case gets the fixed domain of the DTC
+tutorial (FIXED_DOMAIN). With it, everything follows from the hull length L
+and the speed U through the Kelvin wavelength lambda = 2 pi U^2 / g:
+
+- the domain reaches max(a L, b lambda) upstream, downstream, below and
+  above the hull (see EXTENTS), and sideways past the 19.47 degree Kelvin
+  wedge at the outlet;
+- the finest free-surface cells are lambda / cells_per_wavelength wide (a
+  TOML parameter) and cubic, in a band of +- lambda / 14 (the steepest
+  wave) around the waterline;
+- nested boxes around the wedge and the free surface, coarse to fine, are
+  refined horizontally one level each by topoSet and refineMesh, up to the
+  background cells of about L / BACKGROUND_CELLS; snappyHexMesh resolves
+  the hull itself.
+
+Lengths are in metres; the flow runs towards -x (the inlet is at x max) and
+the domain holds the y < 0 half unless it is symmetric = False.
+"""
+import json
+import logging
+import math
+from pathlib import Path
+
+import click
+import numpy as np
+import toml
+
+from cell_estimate import graded_nodes
+from stl_io import read_stl
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+G = 9.81
+KELVIN_ANGLE = math.degrees(math.asin(1 / 3))
+# Water level of constant/hRef and system/setFieldsDict
+WATERLINE = 0.244
+# (hull lengths, wavelengths) of the distance from the hull to each boundary
+EXTENTS = {
+    "upstream": (0.75, 1.0),
+    "downstream": (1.0, 4.0),
+    "depth": (0.75, 0.5),
+    "air": (0.25, 0.25),
+}
+# Side boundary beyond the Kelvin wedge at the outlet, and at least this many L
+WEDGE_MARGIN = 1.25
+MIN_SIDE = 0.75
+# Background cell size of about L / BACKGROUND_CELLS; at most one refinement
+# box per system/topoSetDict.<n>
+BACKGROUND_CELLS = 8
+MAX_LEVELS = 6
+CELLS_PER_WAVELENGTH = 40
+
+# The DTC tutorial domain of templates/base: its y < 0 half (see _mirror)
+FIXED_DOMAIN = {
+    "auto": False,
+    "x": [-26, 16],
+    "y": [-19, 0],
+    "z": [-16, -1, 0.185, 0.244, 0.3, 1.6, 4],
+    "cells": [42, 19],
+    "cells_z": [50, 50, 4, 4, 40, 20],
+    "grading_z": [0.05, 1, 1, 1, 1, 5],
+    "boxes": [
+        [[-10, -6, -3], [10, 0, 3]],
+        [[-5, -3, -2.5], [9, 0, 2]],
+        [[-3, -1.5, -1], [8, 0, 1.5]],
+        [[-2, -1, -0.6], [7, 0, 1]],
+        [[-1, -0.6, -0.3], [6.5, 0, 0.8]],
+        [[-0.5, -0.55, -0.15], [6.25, 0, 0.65]],
+    ],
+    "location_in_mesh": [3.0, -3.0, 0.5],
+}
+
+
+def kelvin_wavelength(velocity, g=G):
+    """Length of the transverse waves of a hull moving at `velocity`."""
+    return 2 * math.pi * velocity ** 2 / g
+
+
+def _number(value):
+    """A coordinate rounded to the millimetre, as an int where it is one."""
+    value = round(float(value), 3)
+    return int(value) if value == int(value) else value
+
+
+def _graded(thickness, first, last):
+    """
+    (cells, simpleGrading) of a block whose cells grow geometrically from
+    `first` to `last` over `thickness`.
+    """
+    if math.isclose(first, last, rel_tol=1e-6):
+        return max(1, math.ceil(thickness / first - 1e-9)), 1
+    cells = max(1, math.ceil(thickness * math.log(last / first) / (last - first)))
+    return cells, (round(last / first, 4) if cells > 1 else 1)
+
+
+def cell_centres_z(domain):
+    """Heights of the background cell centres of a layout, bottom to top."""
+    centres = []
+    for z0, z1, cells, grading in zip(domain["z"], domain["z"][1:], domain["cells_z"], domain["grading_z"]):
+        nodes = graded_nodes(z0, z1, cells, grading)
+        centres.append(0.5 * (nodes[1:] + nodes[:-1]))
+    return np.concatenate(centres)
+
+
+def cell_estimate(domain, refined=None):
+    """
+    Cells of a layout before snappyHexMesh: the background mesh plus three
+    for every cell that refineMesh splits in four in each box. `refined`
+    defaults to the boxes of an auto layout only, as the Allrun runs
+    refineMesh for those alone.
+    """
+    refined = domain["auto"] if refined is None else refined
+    (x0, x1), (y0, y1) = domain["x"], domain["y"]
+    n_x, n_y = domain["cells"]
+    z = cell_centres_z(domain)
+    count = n_x * n_y * len(z)
+    if refined:
+        dx, dy = (x1 - x0) / n_x, (y1 - y0) / n_y
+        for level, (lo, hi) in enumerate(domain["boxes"]):
+            area = (min(hi[0], x1) - max(lo[0], x0)) * (min(hi[1], y1) - max(lo[1], y0))
+            columns = area / (dx * dy) * 4 ** level
+            count += 3 * columns * np.count_nonzero((z >= lo[2]) & (z <= hi[2]))
+    return int(count)
+
+
+def _mirror(domain):
+    """A layout of the full domain from one of its y < 0 half."""
+    full = dict(domain)
+    full["y"] = [domain["y"][0], -domain["y"][0]]
+    full["cells"] = [domain["cells"][0], 2 * domain["cells"][1]]
+    full["boxes"] = [[lo, [hi[0], -lo[1], hi[2]]] for lo, hi in domain["boxes"]]
+    return full
+
+
+def hull_bounds(stl_path, scale=1.0):
+    """(min, max) corners of a hull STL scaled by `scale`."""
+    points = read_stl(stl_path).reshape(-1, 3) * (scale or 1.0)
+    return points.min(axis=0).tolist(), points.max(axis=0).tolist()
+
+
+def hull_length(parameters, bounds=None):
+    """
+    Hull length of a case: its `length` parameter, else the one its velocity
+    and Froude number imply, else the length of its STL.
+    """
+    if parameters.get("length"):
+        return float(parameters["length"])
+    if parameters.get("velocity") and parameters.get("froude"):
+        return parameters["velocity"] ** 2 / (G * parameters["froude"] ** 2)
+    if bounds is not None:
+        return bounds[1][0] - bounds[0][0]
+    raise ValueError("auto_domain needs a length, a velocity and froude, or the hull geometry")
+
+
+def hull_speed(parameters, length):
+    """
+    Speed of a case: its `velocity` parameter, else U = Fr sqrt(g L) from its
+    Froude number and hull length.
+    """
+    if parameters.get("velocity"):
+        return float(parameters["velocity"])
+    if parameters.get("froude"):
+        return parameters["froude"] * math.sqrt(G * length)
+    raise ValueError("auto_domain needs a velocity or a froude number")
+
+
+def auto_domain(parameters, bounds=None):
+    """
+    Layout of the y < 0 half of the domain of a case from its Froude number
+    and length; see the module docstring. `bounds` of the hull (see
+    hull_bounds) default to a hull from x = 0 to L at the waterline.
+    """
+    length = hull_length(parameters, bounds)
+    wavelength = kelvin_wavelength(hull_speed(parameters, length))
+    if bounds is None:
+        keel = WATERLINE - parameters.get("draft", 0.0)
+        bounds = ([0.0, 0.0, keel], [length, 0.0, WATERLINE])
+    (stern, _, keel), (bow, beam, top) = bounds
+    beam = max(beam, -bounds[0][1])
+    extent = {name: max(a * length, b * wavelength) for name, (a, b) in EXTENTS.items()}
+    tan_kelvin = math.tan(math.radians(KELVIN_ANGLE))
+
+    # Finest cells at the free surface; the background is 2^levels coarser
+    fine = wavelength / parameters.get("cells_per_wavelength", CELLS_PER_WAVELENGTH)
+    levels = min(MAX_LEVELS, max(0, math.floor(math.log2(length / BACKGROUND_CELLS / fine))))
+    background = fine * 2 ** levels
+    band = max(wavelength / 14, fine)
+    transition = min(4 * fine, background)
+
+    x_min, x_max = stern - extent["downstream"], bow + extent["upstream"]
+    side = max(MIN_SIDE * length, WEDGE_MARGIN * (beam + (bow - x_min) * tan_kelvin))
+    draft = max(WATERLINE - keel, band)
+    z = [
+        WATERLINE - draft - extent["depth"],
+        min(keel - 0.5 * draft, WATERLINE - band - transition),
+        WATERLINE - band,
+        WATERLINE,
+        WATERLINE + band,
+        max(top + 0.5 * draft, WATERLINE + band + transition),
+    ]
+    z.append(z[-1] + extent["air"])
+    sizes = [background, transition, fine, fine, fine, transition, background]
+    # Cell sizes at each level: cells grow away from the free surface
+    blocks = [_graded(z1 - z0, first, last) for z0, z1, first, last in zip(z, z[1:], sizes, sizes[1:])]
+
+    # Boxes around the wedge from the bow, shrinking towards the hull and
+    # the free surface
+    boxes = []
+    for level in range(levels):
+        share = (levels - level) / levels
+        wake = max(wavelength, 0.9 * share * (stern - x_min))
+        pad = min(band * (levels - level), WATERLINE - z[1], z[-2] - WATERLINE)
+        lo_x = stern - wake
+        half_width = min(0.9 * side, beam + (bow - lo_x) * tan_kelvin + band)
+        boxes.append([
+            [_number(lo_x), _number(-half_width), _number(WATERLINE - pad)],
+            [_number(bow + max(0.5 * wavelength, share * 0.5 * extent["upstream"])), 0,
+             _number(WATERLINE + pad)],
+        ])
+
+    return {
+        "auto": True,
+        "x": [_number(x_min), _number(x_max)],
+        "y": [_number(-side), 0],
+        "z": [_number(value) for value in z],
+        "cells": [math.ceil((x_max - x_min) / background), math.ceil(side / background)],
+        "cells_z": [cells for cells, _ in blocks],
+        "grading_z": [grading for _, grading in blocks],
+        "boxes": boxes,
+        "location_in_mesh": [_number(0.5 * (stern + bow)), _number(-0.5 * side), _number(0.5 * (z[-2] + z[-1]))],
+        "length": length,
+        "wavelength": wavelength,
+        "cell_size": fine,
+    }
+
+
+def domain_layout(parameters, features, bounds=None):
+    """
+    Domain of a case for the templates (blockMeshDict, topoSetDict.<n>,
+    snappyHexMeshDict and the Allrun), auto-sized with the auto_domain
+    feature, mirrored to both sides without the symmetry feature.
+    """
+    domain = auto_domain(parameters, bounds) if features.get("auto_domain") else dict(FIXED_DOMAIN)
+    if not features.get("symmetry", True):
+        domain = _mirror(domain)
+    domain["cell_estimate"] = cell_estimate(domain)
+    return domain
+
+
+@click.command()
+@click.argument("toml_path", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--stl", type=click.Path(exists=True, dir_okay=False), help="Hull STL to take the hull extent from")
+def main(toml_path, stl):
+    """
+    Print the domain layout of the case TOML_PATH as JSON, with the cells of
+    the fixed domain for comparison.
+    """
+    config = toml.load(toml_path)
+    parameters = config.get("parameters", {})
+    features = {**config.get("flags", {}).get("features", {}), "auto_domain": True}
+    bounds = hull_bounds(stl, parameters.get("scale")) if stl else None
+    domain = domain_layout(parameters, features, bounds)
+    fixed = domain_layout(parameters, {**features, "auto_domain": False})
+    click.echo(json.dumps({**domain, "fixed_cell_estimate": fixed["cell_estimate"]}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
 
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import re
+import click
 import pandas as pd
 import toml
 import numpy as np
 
+from foam_log import read_forces_log
+from foam_case import symmetric_domain
+from force_data import drop_superseded, force_history_files, load_force_history, whole_hull_forces
+from hydrostatics import hull_hydrostatics, resistance_coefficients
+from monitor_convergence import load_convergence
+from timeseries_cache import load_cached
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(name)s - %(levelname)s - %(message)s')
 
@@ -20,109 +28,34 @@ def parse_forces_log(log_path):
     sum of forces:
         pressure : (Fx Fy Fz)
         viscous  : (Fx Fy Fz)
+
+    The log is streamed and checkpointed (see foam_log.py), so repeated calls
+    only parse what the solver appended since the previous extraction. A
+    restarted run appends to the same log; the steps it repeats are taken
+    from the restart.
     """
-    data = []
-    
-    current_time = 0.0
-    
-    # Regex for capturing vector components: (val1 val2 val3)
-    vector_pattern = re.compile(r'\(([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?) ([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?) ([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)\)')
-    
-    with open(log_path, 'r') as f:
-        lines = f.readlines()
-        
-    for i, line in enumerate(lines):
-        if "Time =" in line and "ExecutionTime" not in line:
-            try:
-                current_time = float(line.split()[2].replace('s', ''))
-            except ValueError:
-                pass
-                
-        if "sum of forces:" in line:
-            # Next line usually pressure
-            # Next next line usually viscous
-            if i+2 < len(lines):
-                p_line = lines[i+1]
-                v_line = lines[i+2]
-                
-                if "pressure :" in p_line and "viscous  :" in v_line:
-                    p_match = vector_pattern.search(p_line)
-                    v_match = vector_pattern.search(v_line)
-                    
-                    if p_match and v_match:
-                        fp_x = float(p_match.group(1))
-                        fv_x = float(v_match.group(1))
-                        
-                        data.append({
-                            'time': current_time,
-                            'force_p': fp_x,
-                            'force_v': fv_x,
-                            'force_total': fp_x + fv_x
-                        })
-                        
-    return pd.DataFrame(data)
-
-def parse_forces_dat(dat_path):
+    return drop_superseded(read_forces_log(log_path))
+
+def parse_forces_dat(forces_root):
     """
-    Parse forces from force.dat (ESI format).
-    Expects standard OF function object output:
-    # Time       total_x total_y total_z pressure_x ... viscous_x ...
-    0.01         ...     ...     ...     ...            ...
+    Parse forces from force.dat (ESI format) under postProcessing/forces.
+    Columns are mapped from the '# Time ...' header (see force_data.py), and
+    every force and moment component is returned alongside the x-component
+    aliases force_p, force_v and force_total. The start-time directories of
+    a restarted run are joined into one history.
+    The parsed table is cached beside the first force.dat until the files change.
     """
-    data = []
-    
-    try:
-        # force.dat usually has columns:
-        # Time(0) TotalX(1) TotalY(2) TotalZ(3) PressureX(4) ... ViscousX(7) ...
-        # But let's check the header or assume standard structure based on previous inspection
-        # Previous view showed:
-        # Time total_x total_y total_z pressure_x pressure_y pressure_z viscous_x viscous_y viscous_z
-        # So: Time=0, TotalX=1, PressureX=4, ViscousX=7
-        
-        # Using pandas is easiest for whitespace separated data
-        # Skip rows starting with # (comments), but headers might be commented
-        
-        # Manual parsing often more robust against weird header variations
-        with open(dat_path, 'r') as f:
-            lines = f.readlines()
-            
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-                
-            parts = line.replace('(', '').replace(')', '').split()
-            
-            # Ensure we have enough columns. We saw about 10 columns.
-            if len(parts) >= 8:
-                try:
-                    time = float(parts[0])
-                    # Ensure we handle scientific notation
-                    total_x = float(parts[1])
-                    pressure_x = float(parts[4])
-                    viscous_x = float(parts[7])
-                    
-                    data.append({
-                        'time': time,
-                        'force_p': pressure_x,
-                        'force_v': viscous_x,
-                        'force_total': total_x
-                    })
-                except ValueError:
-                    continue
-                    
-        return pd.DataFrame(data)
-        
-    except Exception as e:
-        logging.error(f"Error parsing {dat_path}: {e}")
-        return pd.DataFrame()
+    return load_cached(force_history_files(forces_root), lambda: load_force_history(forces_root))
 
-def extract_resistance():
-    """Iterate over successful cases and extract mean resistance."""
-    results = []
+def collect_cases():
+    """
+    List every case with force data, in a deterministic order.
+    Returns one task dict per case for `extract_case`.
+    """
+    tasks = []
     
     # 1. Process Standard/Benchmark Cases (Managed by Snakemake/case.toml)
-    for case_dir in CASES_DIR.glob("dtc_fr*"):
+    for case_dir in sorted(CASES_DIR.glob("dtc_fr*")):
         case_name = case_dir.name
         log_path = RESULTS_DIR / case_name / "log.foamRun"
         config_path = case_dir / "case.toml"
@@ -131,31 +64,34 @@ def extract_resistance():
             continue
             
         config = toml.load(config_path)
-        velocity = config['parameters'].get('velocity')
-        froude = config['parameters'].get('froude')
-        
-        logging.info(f"Processing {case_name} (Standard, Fr={froude})...")
-        df = parse_forces_log(log_path)
-        process_df(df, case_name, velocity, froude, results)
+        tasks.append({
+            'case': case_name,
+            'kind': 'standard',
+            'source': log_path,
+            'run_dir': RESULTS_DIR / case_name,
+            'velocity': config['parameters'].get('velocity'),
+            'froude': config['parameters'].get('froude'),
+            'draft': config['parameters'].get('draft'),
+            'symmetric': symmetric_domain(config),
+            # Scaled in place by the Allrun
+            'stl': RESULTS_DIR / case_name / "constant" / "triSurface" / f"{config.get('meta', {}).get('name', case_name)}.stl",
+        })
 
     # 2. Process ESI Sweep Cases (Managed by scripts/sweep_velocity_esi.py)
     # Pattern: dtc_esi_frXXX where XXX is Fr * 1000
     LPP = 5.976
-    match_velocity_baseline = 1.668 # Hardcoded reference if needed
     g = 9.81
 
-    for case_dir in CASES_DIR.glob("dtc_esi_fr*"):
+    for case_dir in sorted(CASES_DIR.glob("dtc_esi_fr*")):
         case_name = case_dir.name
         
         # Locate force data
         # ESI Tutorial typically puts it in postProcessing/forces/0/force.dat
-        # But sometimes it might be just 'forces/0/force.dat' depending on OF version/func object
-        dat_path = case_dir / "postProcessing/forces/0/force.dat"
-        if not dat_path.exists():
-             # Try alternate path?
-             dat_path = case_dir / "postProcessing/forces/0/forces.dat"
+        # (Foundation and older ESI versions write forces.dat instead), and a
+        # restart adds postProcessing/forces/<restart time>/
+        forces_root = case_dir / "postProcessing/forces"
         
-        if not dat_path.exists():
+        if not force_history_files(forces_root):
             logging.warning(f"Data not found for {case_name}, skipping.")
             continue
             
@@ -168,33 +104,119 @@ def extract_resistance():
             logging.warning(f"Could not parse Fr from {case_name}")
             continue
 
-        logging.info(f"Processing {case_name} (ESI, Fr={froude:.3f}, V={velocity:.3f})...")
-        df = parse_forces_dat(dat_path)
-        process_df(df, case_name, velocity, froude, results)
+        tasks.append({
+            'case': case_name,
+            'kind': 'esi',
+            'source': forces_root,
+            'run_dir': case_dir,
+            'velocity': velocity,
+            'froude': froude,
+            # The ESI DTC tutorial meshes the half hull
+            'symmetric': True,
+        })
+
+    return tasks
+
+def extract_case(task):
+    """Parse and average one case. Returns its result row, or None without usable data."""
+    case_name = task['case']
+    if task['kind'] == 'standard':
+        logging.info(f"Processing {case_name} (Standard, Fr={task['froude']})...")
+        df = parse_forces_log(task['source'])
+    else:
+        logging.info(f"Processing {case_name} (ESI, Fr={task['froude']:.3f}, V={task['velocity']:.3f})...")
+        df = parse_forces_dat(task['source'])
+    if task['symmetric']:
+        # Results are for the whole hull
+        df = whole_hull_forces(df)
+
+    rows = []
+    process_df(df, case_name, task['velocity'], task['froude'], rows, window=load_convergence(task['run_dir']))
+    if rows and task.get('draft') and task.get('stl') and task['stl'].exists():
+        add_coefficients(rows[0], task['stl'], task['draft'], task['symmetric'])
+    return rows[0] if rows else None
+
+def add_coefficients(row, stl_path, draft, symmetric=True):
+    """
+    Add the wetted area, waterline length, Ct and Cf of a result row, from the
+    hydrostatics of the whole hull at its draft. A symmetric case may mesh a
+    half hull STL, so its area is twice that of the y < 0 half.
+    """
+    hydro = hull_hydrostatics(stl_path, draft, half=symmetric)
+    if symmetric:
+        hydro['wetted_area'] *= 2
+    row['wetted_area'] = hydro['wetted_area']
+    row['waterline_length'] = hydro['waterline_length']
+    row.update(resistance_coefficients(row['force_x'], row['velocity'], hydro['wetted_area'], hydro['waterline_length']))
+    logging.info(f"  Ct: {row['ct']:.4g}, Cf: {row['cf']:.4g} (S = {hydro['wetted_area']:.4g} m2)")
+
+def extract_resistance(jobs=1):
+    """
+    Iterate over successful cases and extract mean resistance.
+    With jobs > 1 cases are parsed in a process pool. A case that fails to
+    parse is reported and left out; the other cases are still written.
+    """
+    tasks = collect_cases()
+    results = []
+    failed = []
+
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(extract_case, task) for task in tasks]
+            outcomes = []
+            for task, future in zip(tasks, futures):
+                exc = future.exception()
+                outcomes.append((task, exc, None if exc else future.result()))
+    else:
+        outcomes = []
+        for task in tasks:
+            try:
+                outcomes.append((task, None, extract_case(task)))
+            except Exception as exc:
+                outcomes.append((task, exc, None))
+
+    for task, exc, row in outcomes:
+        if exc is not None:
+            logging.error(f"Extraction failed for {task['case']} ({task['source']}): {exc!r}", exc_info=exc)
+            failed.append(task['case'])
+        elif row is not None:
+            results.append(row)
 
     # Save to CSV
     if results:
         out_df = pd.DataFrame(results)
-        out_df = out_df.sort_values('velocity')
+        out_df = out_df.sort_values(['velocity', 'case'], kind='stable')
         out_df.to_csv(OUTPUT_FILE, index=False)
         logging.info(f"Results saved to {OUTPUT_FILE}")
         print(out_df)
     else:
         logging.warning("No results extracted.")
 
-def process_df(df, case_name, velocity, froude, results_list):
-    """Helper to average data and append to results."""
+    if failed:
+        logging.error(f"{len(failed)} case(s) could not be extracted: {', '.join(failed)}")
+    return failed
+
+def process_df(df, case_name, velocity, froude, results_list, window=None):
+    """
+    Helper to average data and append to results.
+    `window` is the convergence record of monitor_convergence.py; when given,
+    exactly its converged [t_start, t_end] window is averaged.
+    """
     if df.empty:
         logging.warning(f"No valid force data found for {case_name}.")
         return
 
-    # Calculate mean over stable region (last 20%)
+    # Calculate mean over stable region (converged window, else last 20%)
     if df['time'].max() > 0:
-        t_end = df['time'].max()
-        # Ensure we take a reasonable window, e.g., last 20% or last 5 seconds
-        t_start = t_end * 0.8
+        if window is not None:
+            t_start, t_end = window['t_start'], window['t_end']
+            logging.info(f"  Using converged window [{t_start:g}, {t_end:g}] from monitor")
+        else:
+            t_end = df['time'].max()
+            # Ensure we take a reasonable window, e.g., last 20% or last 5 seconds
+            t_start = t_end * 0.8
         
-        stable_df = df[df['time'] >= t_start]
+        stable_df = df[(df['time'] >= t_start) & (df['time'] <= t_end)]
         if stable_df.empty:
              logging.warning(f"Stable region empty for {case_name}")
              return
@@ -215,5 +237,16 @@ def process_df(df, case_name, velocity, froude, results_list):
     else:
             logging.warning(f"  Time series too short for {case_name}.")
 
+@click.command()
+@click.option("--jobs", "-j", default=1, show_default=True, help="Number of cases to parse in parallel")
+def main(jobs: int):
+    """
+    Extract the mean resistance of every finished sweep case into dtc_sweep.csv.
+    Exits with an error when a case could not be extracted.
+    """
+    failed = extract_resistance(jobs=jobs)
+    if failed:
+        raise click.ClickException(f"Extraction failed for {len(failed)} case(s): {', '.join(failed)}")
+
 if __name__ == "__main__":
-    extract_resistance()
+    main()
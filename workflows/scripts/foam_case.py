@@ -0,0 +1,93 @@
+import re
+from pathlib import Path
+
+# polyMesh files carry their sizes in the header, e.g.
+# note "nPoints:1234  nCells:567  nFaces:890  nInternalFaces:456";
+N_CELLS_PATTERN = re.compile(rb'nCells:\s*(\d+)')
+N_SUBDOMAINS_PATTERN = re.compile(r'^(\s*numberOfSubdomains\s+)(\d+)(\s*;)', re.MULTILINE)
+METHOD_PATTERN = re.compile(r'^(\s*method\s+)(\w+)(\s*;)', re.MULTILINE)
+
+# Only the FoamFile header is needed; it is ASCII even for binary meshes
+HEADER_BYTES = 4096
+
+
+def symmetric_domain(config):
+    """
+    Whether a case simulates only the y < 0 half of the hull, with a symmetry
+    plane at y = 0: the symmetry feature of its case.toml, on by default.
+    """
+    return config.get("flags", {}).get("features", {}).get("symmetry", True)
+
+
+def read_cell_count(mesh_dir):
+    """Number of cells of the polyMesh in `mesh_dir`, or None if unknown."""
+    mesh_dir = Path(mesh_dir)
+    for name in ("owner", "owner.gz"):
+        owner = mesh_dir / name
+        if owner.exists():
+            with open(owner, "rb") as f:
+                match = N_CELLS_PATTERN.search(f.read(HEADER_BYTES))
+            return int(match.group(1)) if match else None
+    return None
+
+
+def read_number_of_subdomains(case_dir):
+    """numberOfSubdomains from system/decomposeParDict, or None without one."""
+    decompose_dict = Path(case_dir) / "system" / "decomposeParDict"
+    if not decompose_dict.exists():
+        return None
+    match = N_SUBDOMAINS_PATTERN.search(decompose_dict.read_text())
+    if match is None:
+        raise ValueError(f"No numberOfSubdomains entry in {decompose_dict}")
+    return int(match.group(2))
+
+
+def set_number_of_subdomains(decompose_dict, n_procs):
+    """
+    Point an existing decomposeParDict at `n_procs` subdomains.
+
+    The geometric methods need their (nx ny nz) split to match the count, so
+    the method is switched to scotch, which decomposes any count without
+    further coefficients.
+    """
+    decompose_dict = Path(decompose_dict)
+    content = decompose_dict.read_text()
+    content, count = N_SUBDOMAINS_PATTERN.subn(rf'\g<1>{int(n_procs)}\3', content, count=1)
+    if count == 0:
+        raise ValueError(f"No numberOfSubdomains entry in {decompose_dict}")
+    content = METHOD_PATTERN.sub(r'\1scotch\3', content, count=1)
+    decompose_dict.write_text(content)
+
+
+def time_dirs(case_dir):
+    """The time directories of a case (or of one processor directory), in time order."""
+    times = []
+    for path in Path(case_dir).iterdir():
+        if not path.is_dir():
+            continue
+        try:
+            times.append((float(path.name), path))
+        except ValueError:
+            pass
+    return [path for _, path in sorted(times)]
+
+
+def processor_dirs(case_dir):
+    """The processor* directories of a decomposed case, in rank order."""
+    dirs = [p for p in Path(case_dir).glob("processor*") if p.is_dir() and p.name[len("processor"):].isdigit()]
+    return sorted(dirs, key=lambda p: int(p.name[len("processor"):]))
+
+
+def latest_time(case_dir):
+    """
+    Latest written time of a case as (time name, decomposed), or None.
+
+    `decomposed` is True when that time only exists in the processor
+    directories, i.e. the run was not (or not yet) reconstructed.
+    """
+    root = time_dirs(case_dir)
+    processors = processor_dirs(case_dir)
+    decomposed = time_dirs(processors[0]) if processors else []
+    if decomposed and (not root or float(decomposed[-1].name) > float(root[-1].name)):
+        return decomposed[-1].name, True
+    return (root[-1].name, False) if root else None
@@ -0,0 +1,359 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from pathlib import Path
+
+import click
+import numpy as np
+import pandas as pd
+
+from timeseries_cache import read_columns, read_key, source_key, write_columns
+
+FLOAT = r'[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?'
+
+# Regex for capturing vector components: (val1 val2 val3)
+VECTOR_PATTERN = re.compile(rf'\(({FLOAT}) ({FLOAT}) ({FLOAT})\)')
+EXECUTION_PATTERN = re.compile(rf'ExecutionTime = ({FLOAT}) s\s+ClockTime = ({FLOAT}) s')
+COURANT_PATTERN = re.compile(rf'Courant Number mean: ({FLOAT}) max: ({FLOAT})')
+DELTA_T_PATTERN = re.compile(rf'^deltaT = ({FLOAT})')
+# e.g. "GAMG:  Solving for p_rgh, Initial residual = 1, Final residual = 0.004, No Iterations 7"
+SOLVE_PATTERN = re.compile(
+    rf'(\w+):\s+Solving for (\S+), Initial residual = ({FLOAT}), '
+    rf'Final residual = ({FLOAT}), No Iterations (\d+)'
+)
+PIMPLE_PATTERN = re.compile(r'PIMPLE: [Ii]teration (\d+)')
+MESH_UPDATE_PATTERN = re.compile(rf'Execution time for mesh\.update\(\) = ({FLOAT}) s')
+
+# Number of leading bytes hashed to recognise a log that was replaced by a new run
+FINGERPRINT_BYTES = 4096
+
+FORCE_COLUMNS = ['time', 'force_p', 'force_v', 'force_total']
+
+
+def iter_lines(log_path, offset=0, follow=False, poll_interval=1.0, idle_timeout=None):
+    """
+    Yield (line, next_offset) for every complete line after `offset`.
+
+    A trailing line without a newline is not yielded, so a log that is still
+    being written is never parsed half-way through a line. In follow mode the
+    generator keeps polling for appended bytes until `idle_timeout` seconds
+    pass without growth (or forever when `idle_timeout` is None).
+    """
+    log_path = Path(log_path)
+    idle_since = time.monotonic()
+
+    with open(log_path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            raw = f.readline()
+            if raw.endswith(b'\n'):
+                offset += len(raw)
+                idle_since = time.monotonic()
+                yield raw.decode(errors='replace'), offset
+                continue
+
+            # Incomplete line or EOF: rewind so the partial line is re-read later
+            f.seek(offset)
+            if not follow:
+                return
+            if idle_timeout is not None and time.monotonic() - idle_since > idle_timeout:
+                return
+            time.sleep(poll_interval)
+
+
+def iter_events(lines):
+    """
+    Turn (line, offset) pairs into (kind, value, offset) events.
+
+    Events:
+    - ('time', t): start of a new time step ("Time = t")
+    - ('forces', (fp_x, fv_x)): x-components of a "sum of forces" block
+    - ('execution', (execution_time, clock_time)): end-of-step timing
+    - ('courant', (mean, max)) and ('interface_courant', (mean, max))
+    - ('deltaT', dt): time step chosen for the coming step
+    - ('solve', (solver, field, initial, final, iterations)): one linear solve
+    - ('pimple', n): start of PIMPLE outer corrector n
+    - ('mesh_update', seconds): cost of the mesh motion / 6DoF update
+
+    Courant numbers and deltaT are reported before the "Time =" line of the
+    step they belong to.
+    """
+    pending = None  # State of a partially read "sum of forces:" block
+
+    for line, offset in lines:
+        if pending is not None:
+            stage, fp_x = pending
+            pending = None
+            if stage == 'pressure' and "pressure :" in line:
+                p_match = VECTOR_PATTERN.search(line)
+                if p_match:
+                    pending = ('viscous', float(p_match.group(1)))
+                    continue
+            elif stage == 'viscous' and "viscous  :" in line:
+                v_match = VECTOR_PATTERN.search(line)
+                if v_match:
+                    yield 'forces', (fp_x, float(v_match.group(1))), offset
+                    continue
+            # Malformed block: treat the line as an ordinary log line
+
+        if "sum of forces:" in line:
+            pending = ('pressure', None)
+        elif "Solving for" in line:
+            match = SOLVE_PATTERN.search(line)
+            if match:
+                solver, field, initial, final, iterations = match.groups()
+                yield 'solve', (solver, field, float(initial), float(final), int(iterations)), offset
+        elif "Courant Number" in line:
+            match = COURANT_PATTERN.search(line)
+            if match:
+                kind = 'interface_courant' if "Interface" in line else 'courant'
+                yield kind, (float(match.group(1)), float(match.group(2))), offset
+        elif line.startswith("deltaT ="):
+            match = DELTA_T_PATTERN.match(line)
+            if match:
+                yield 'deltaT', float(match.group(1)), offset
+        elif line.startswith("PIMPLE:"):
+            match = PIMPLE_PATTERN.match(line)
+            if match:
+                yield 'pimple', int(match.group(1)), offset
+        elif "mesh.update()" in line:
+            match = MESH_UPDATE_PATTERN.search(line)
+            if match:
+                yield 'mesh_update', float(match.group(1)), offset
+        elif "ExecutionTime =" in line:
+            match = EXECUTION_PATTERN.search(line)
+            if match:
+                yield 'execution', (float(match.group(1)), float(match.group(2))), offset
+        elif "Time =" in line:
+            try:
+                yield 'time', float(line.split()[2].replace('s', '')), offset
+            except (ValueError, IndexError):
+                pass
+
+
+def iter_force_records(log_path, offset=0, current_time=0.0, **kwargs):
+    """
+    Yield one dict per "sum of forces" block found after `offset`.
+
+    Each record carries the byte offset just past the block, which is a safe
+    point to resume parsing from. Extra keyword arguments go to `iter_lines`.
+    """
+    for kind, value, event_offset in iter_events(iter_lines(log_path, offset, **kwargs)):
+        if kind == 'time':
+            current_time = value
+        elif kind == 'forces':
+            fp_x, fv_x = value
+            yield {
+                'time': current_time,
+                'force_p': fp_x,
+                'force_v': fv_x,
+                'force_total': fp_x + fv_x,
+                'offset': event_offset,
+            }
+
+
+def iter_time_steps(log_path, offset=0, **kwargs):
+    """Yield (time, execution_time, clock_time) for every completed time step."""
+    current_time = None
+    for kind, value, _ in iter_events(iter_lines(log_path, offset, **kwargs)):
+        if kind == 'time':
+            current_time = value
+        elif kind == 'execution' and current_time is not None:
+            yield current_time, value[0], value[1]
+
+
+def equation_name(field):
+    """Group the fields of one equation, e.g. Ux/Uy/Uz -> U, cellDisplacementx -> cellDisplacement."""
+    return re.sub(r'^(U|cellDisplacement)[xyz]$', r'\1', field)
+
+
+def iter_step_profiles(log_path, offset=0, **kwargs):
+    """
+    Yield one flat dict per completed time step with everything the log says
+    about its cost: deltaT, Courant numbers, PIMPLE correctors, mesh update
+    time, ExecutionTime/ClockTime and, per equation, the number of solves,
+    the linear-solver iterations and the first initial / last final residual.
+    """
+    upcoming = {}  # Values reported before the "Time =" line of a step
+    step = None
+
+    for kind, value, _ in iter_events(iter_lines(log_path, offset, **kwargs)):
+        if kind == 'courant':
+            upcoming['courant_mean'], upcoming['courant_max'] = value
+        elif kind == 'interface_courant':
+            upcoming['interface_courant_mean'], upcoming['interface_courant_max'] = value
+        elif kind == 'deltaT':
+            upcoming['deltaT'] = value
+        elif kind == 'time':
+            step = {'time': value, 'pimple_iterations': 0, 'mesh_update_time': 0.0, **upcoming}
+            upcoming = {}
+        elif step is None:
+            continue
+        elif kind == 'pimple':
+            step['pimple_iterations'] = max(step['pimple_iterations'], value)
+        elif kind == 'mesh_update':
+            step['mesh_update_time'] += value
+        elif kind == 'solve':
+            solver, field, initial, final, iterations = value
+            eq = equation_name(field)
+            if f'{eq}_solves' not in step:
+                step[f'{eq}_solves'] = 0
+                step[f'{eq}_iterations'] = 0
+                step[f'{eq}_initial_residual'] = initial
+                step[f'{eq}_solver'] = solver
+            step[f'{eq}_solves'] += 1
+            step[f'{eq}_iterations'] += iterations
+            step[f'{eq}_final_residual'] = final
+        elif kind == 'execution':
+            step['execution_time'], step['clock_time'] = value
+            yield step
+            step = None
+
+
+def checkpoint_path(log_path):
+    """Location of the checkpoint kept next to a log."""
+    return log_path.with_name(f"{log_path.name}.checkpoint.json")
+
+
+def forces_store_path(log_path):
+    """Location of the columnar store of force rows already parsed from a log."""
+    return log_path.with_name(f"{log_path.name}.forces.npz")
+
+
+def _fingerprint(log_path, length):
+    with open(log_path, 'rb') as f:
+        return hashlib.sha1(f.read(min(length, FINGERPRINT_BYTES))).hexdigest()
+
+
+def load_checkpoint(log_path):
+    """
+    Return the stored checkpoint if it still describes `log_path`, else None.
+
+    A checkpoint is discarded when the log shrank or its first bytes changed,
+    i.e. the log was truncated or replaced by a new run.
+    """
+    ckpt_file = checkpoint_path(log_path)
+    if not ckpt_file.exists() or not forces_store_path(log_path).exists():
+        return None
+
+    checkpoint = json.loads(ckpt_file.read_text())
+    if log_path.stat().st_size < checkpoint['offset']:
+        return None
+    if _fingerprint(log_path, checkpoint['offset']) != checkpoint['fingerprint']:
+        return None
+    return checkpoint
+
+
+def save_checkpoint(log_path, df, offset, current_time, key):
+    """
+    Store the parsed rows and record how far `log_path` has been parsed.
+
+    `key` is the (size, mtime) of the log taken before parsing started, so a
+    log that grew while it was being parsed is not mistaken for unchanged.
+    """
+    write_columns(forces_store_path(log_path), df, key=key)
+    checkpoint = {
+        'offset': offset,
+        'time': current_time,
+        'fingerprint': _fingerprint(log_path, offset),
+    }
+    checkpoint_path(log_path).write_text(json.dumps(checkpoint))
+
+
+def read_forces_log(log_path, resume=True):
+    """
+    Return the full force history of a log as a DataFrame.
+
+    With `resume`, an unchanged log (same size and mtime) is served straight
+    from the columnar store next to it. A grown log is parsed from the
+    checkpoint onwards and the new rows are appended to the stored ones.
+    """
+    log_path = Path(log_path)
+    store = forces_store_path(log_path)
+    key = source_key([log_path])
+
+    if resume and store.exists() and np.array_equal(read_key(store), key):
+        return read_columns(store)
+
+    checkpoint = load_checkpoint(log_path) if resume else None
+    if checkpoint is None:
+        offset, current_time = 0, 0.0
+        previous = pd.DataFrame(columns=FORCE_COLUMNS)
+    else:
+        offset, current_time = checkpoint['offset'], checkpoint['time']
+        previous = read_columns(store)
+
+    new_rows = list(iter_force_records(log_path, offset=offset, current_time=current_time))
+    if new_rows:
+        offset, current_time = new_rows[-1]['offset'], new_rows[-1]['time']
+    new_df = pd.DataFrame(new_rows, columns=FORCE_COLUMNS)
+
+    df = new_df if previous.empty else pd.concat([previous, new_df], ignore_index=True)
+    save_checkpoint(log_path, df.astype(float), offset, current_time, key)
+
+    logging.debug(f"Parsed {len(new_df)} new force records from {log_path} (offset {offset})")
+    return df
+
+
+def follow_forces_log(log_path, poll_interval=5.0, idle_timeout=None, flush_interval=30.0):
+    """
+    Yield force records of a running case as they are appended to its log.
+
+    The store and checkpoint next to the log are refreshed at most every
+    `flush_interval` seconds and when following stops, so a later
+    `read_forces_log` call picks up where following left off.
+    """
+    log_path = Path(log_path)
+    df = read_forces_log(log_path)
+    checkpoint = load_checkpoint(log_path)
+    offset, current_time = checkpoint['offset'], checkpoint['time']
+
+    pending = []
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal df, pending, last_flush
+        if pending:
+            df = pd.concat([df, pd.DataFrame(pending, columns=FORCE_COLUMNS)], ignore_index=True)
+            save_checkpoint(log_path, df.astype(float), offset, current_time, key=None)
+            pending = []
+        last_flush = time.monotonic()
+
+    records = iter_force_records(
+        log_path, offset=offset, current_time=current_time,
+        follow=True, poll_interval=poll_interval, idle_timeout=idle_timeout
+    )
+    try:
+        for record in records:
+            pending.append(record)
+            offset, current_time = record['offset'], record['time']
+            if time.monotonic() - last_flush > flush_interval:
+                flush()
+            yield record
+    finally:
+        flush()
+
+
+@click.command()
+@click.argument("log_path", type=click.Path(exists=True, path_type=Path))
+@click.option("--follow", is_flag=True, help="Keep reading as the solver appends to the log")
+@click.option("--poll-interval", default=5.0, show_default=True, help="Seconds between polls in follow mode")
+@click.option("--idle-timeout", default=None, type=float, help="Stop following after this many seconds without new output")
+def main(log_path: Path, follow: bool, poll_interval: float, idle_timeout: float):
+    """
+    Parse the force history of LOG_PATH, resuming from its checkpoint.
+    """
+    if not follow:
+        df = read_forces_log(log_path)
+        logging.info(f"{log_path}: {len(df)} force records, last time {df['time'].iloc[-1] if len(df) else 'n/a'}")
+        return
+
+    for record in follow_forces_log(log_path, poll_interval=poll_interval, idle_timeout=idle_timeout):
+        logging.info(f"t={record['time']:g}  Fx={record['force_total']:.4f} N")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
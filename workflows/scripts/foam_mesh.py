@@ -0,0 +1,184 @@
+"""
+Reading (and rewriting the points of) an OpenFOAM polyMesh with NumPy.
+
+Handles ASCII and binary files, optionally gzipped. Faces are returned in
+compact form: `offsets` (n_faces + 1) into a flat `labels` array, as
+OpenFOAM itself writes binary faces (faceCompactList).
+"""
+import gzip
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+HEADER_PATTERN = re.compile(rb"FoamFile\s*\{(.*?)\}", re.S)
+FORMAT_PATTERN = re.compile(rb"format\s+(\w+)\s*;")
+LABEL_SIZE_PATTERN = re.compile(rb"label=(\d+)")
+SCALAR_SIZE_PATTERN = re.compile(rb"scalar=(\d+)")
+CLASS_PATTERN = re.compile(rb"class\s+(\w+)\s*;")
+# Start of a list: its size followed by ( or, for a uniform list, {
+LIST_START_PATTERN = re.compile(rb"(\d+)\s*([({])")
+# End of an ASCII list of lists, e.g. of points (x y z) or faces 4(a b c d)
+NESTED_END_PATTERN = re.compile(rb"\)\s*\)")
+PATCH_PATTERN = re.compile(r"([^\s{}();]+)\s*\{([^{}]*)\}")
+ENTRY_PATTERN = re.compile(r"(\w+)\s+([^;]+);")
+
+
+def mesh_file(mesh_dir, name):
+    """Path of a polyMesh file, which may be gzipped."""
+    path = Path(mesh_dir) / name
+    gz = path.with_name(name + ".gz")
+    return gz if not path.exists() and gz.exists() else path
+
+
+def _read_bytes(path):
+    path = Path(path)
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rb") as f:
+        return f.read()
+
+
+def _header(data, path):
+    """(format, class, label dtype, scalar dtype, end of header) of a FoamFile."""
+    match = HEADER_PATTERN.search(data)
+    if match is None:
+        raise ValueError(f"{path}: no FoamFile header")
+    header = match.group(1)
+    binary = FORMAT_PATTERN.search(header).group(1) == b"binary"
+    foam_class = CLASS_PATTERN.search(header).group(1).decode()
+    label_size = LABEL_SIZE_PATTERN.search(header)
+    scalar_size = SCALAR_SIZE_PATTERN.search(header)
+    label = np.dtype(f"<i{int(label_size.group(1)) // 8 if label_size else 4}")
+    scalar = np.dtype(f"<f{int(scalar_size.group(1)) // 8 if scalar_size else 8}")
+    return binary, foam_class, label, scalar, match.end()
+
+
+def _read_list(data, pos, binary, dtype, width=1, path=None):
+    """
+    The list starting at or after `pos` as an array of `width` columns,
+    and the (start, end) byte range of the list including its size.
+    """
+    match = LIST_START_PATTERN.search(data, pos)
+    if match is None:
+        raise ValueError(f"{path}: no list after byte {pos}")
+    size, opening = int(match.group(1)), match.group(2)
+    body = match.end()
+    if opening == b"{":
+        end = data.index(b"}", body)
+        value = np.array(data[body:end].replace(b"(", b" ").replace(b")", b" ").split(), dtype=dtype)
+        values = np.tile(value, (size, 1))
+        return (values if width > 1 else values[:, 0]), (match.start(), end + 1)
+    if binary:
+        end = body + size * width * dtype.itemsize
+        values = np.frombuffer(data, dtype=dtype, count=size * width, offset=body)
+        return (values.reshape(size, width) if width > 1 else values), (match.start(), end + 1)
+    if width > 1 and size > 0:
+        end = NESTED_END_PATTERN.search(data, body).start() + 1
+    else:
+        end = data.index(b")", body)
+    values = np.array(data[body:end].replace(b"(", b" ").replace(b")", b" ").split(), dtype=dtype)
+    return (values.reshape(size, width) if width > 1 else values), (match.start(), end + 1)
+
+
+def read_points(mesh_dir):
+    """Points of a polyMesh as an (n, 3) float array."""
+    path = mesh_file(mesh_dir, "points")
+    data = _read_bytes(path)
+    binary, _, _, scalar, start = _header(data, path)
+    points, _ = _read_list(data, start, binary, scalar, width=3, path=path)
+    return points.astype(float)
+
+
+def read_labels(mesh_dir, name):
+    """A labelList of a polyMesh (owner, neighbour) as an int array."""
+    path = mesh_file(mesh_dir, name)
+    data = _read_bytes(path)
+    binary, _, label, _, start = _header(data, path)
+    labels, _ = _read_list(data, start, binary, label, path=path)
+    return np.atleast_1d(labels).astype(np.int64)
+
+
+def read_faces(mesh_dir):
+    """Faces of a polyMesh as (offsets, labels), see the module docstring."""
+    path = mesh_file(mesh_dir, "faces")
+    data = _read_bytes(path)
+    binary, foam_class, label, _, start = _header(data, path)
+    if foam_class == "faceCompactList":
+        offsets, (_, end) = _read_list(data, start, binary, label, path=path)
+        labels, _ = _read_list(data, end, binary, label, path=path)
+        return offsets.astype(np.int64), labels.astype(np.int64)
+    if binary:
+        raise ValueError(f"{path}: binary {foam_class} is not supported")
+    # ASCII faceList: n(a b c ...) per face, flattened to size, labels, size, ...
+    match = LIST_START_PATTERN.search(data, start)
+    end = NESTED_END_PATTERN.search(data, match.end()).start() + 1
+    flat = np.array(data[match.end():end].replace(b"(", b" ").replace(b")", b" ").split(), dtype=np.int64)
+    sizes, labels, i = [], [], 0
+    while i < len(flat):
+        sizes.append(flat[i])
+        labels.append(flat[i + 1:i + 1 + flat[i]])
+        i += 1 + flat[i]
+    offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+    return offsets, np.concatenate(labels) if labels else np.zeros(0, dtype=np.int64)
+
+
+def read_boundary(mesh_dir):
+    """Patches of a polyMesh as {name: {"type", "nFaces", "startFace", ...}}, in file order."""
+    path = mesh_file(mesh_dir, "boundary")
+    text = _read_bytes(path).decode()
+    text = text[HEADER_PATTERN.search(text.encode()).end():]
+    patches = {}
+    for name, body in PATCH_PATTERN.findall(text):
+        entries = dict(ENTRY_PATTERN.findall(body))
+        entries["nFaces"] = int(entries["nFaces"])
+        entries["startFace"] = int(entries["startFace"])
+        patches[name] = entries
+    return patches
+
+
+def read_mesh(mesh_dir):
+    """A polyMesh as a dict of points, offsets, labels, owner, neighbour and boundary."""
+    offsets, labels = read_faces(mesh_dir)
+    return {
+        "points": read_points(mesh_dir),
+        "offsets": offsets,
+        "labels": labels,
+        "owner": read_labels(mesh_dir, "owner"),
+        "neighbour": read_labels(mesh_dir, "neighbour"),
+        "boundary": read_boundary(mesh_dir),
+    }
+
+
+def patch_points(mesh, patch):
+    """Sorted point labels of a boundary patch."""
+    entry = mesh["boundary"][patch]
+    start, end = entry["startFace"], entry["startFace"] + entry["nFaces"]
+    return np.unique(mesh["labels"][mesh["offsets"][start]:mesh["offsets"][end]])
+
+
+def write_points(mesh_dir, points):
+    """
+    Replace the points of a polyMesh, keeping the file's header and format.
+
+    The file is written next to the old one and renamed over it, so a
+    points file hardlinked from elsewhere (see mesh_cache.py) is replaced,
+    not modified.
+    """
+    path = mesh_file(mesh_dir, "points")
+    data = _read_bytes(path)
+    binary, _, _, scalar, start = _header(data, path)
+    old, (list_start, list_end) = _read_list(data, start, binary, scalar, width=3, path=path)
+    if len(points) != len(old):
+        raise ValueError(f"{path}: {len(old)} points, got {len(points)}")
+    if binary:
+        body = np.ascontiguousarray(points, dtype=scalar).tobytes()
+    else:
+        body = "\n".join(f"({x:.10g} {y:.10g} {z:.10g})" for x, y, z in np.asarray(points).tolist()).encode() + b"\n"
+    separator = b"(" if binary else b"(\n"
+    content = data[:list_start] + f"{len(points)}\n".encode() + separator + body + b")" + data[list_end:]
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(tmp, "wb") as f:
+        f.write(content)
+    tmp.replace(path)
@@ -0,0 +1,208 @@
+import io
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+PARTS = ("total", "pressure", "viscous")
+AXES = ("x", "y", "z")
+
+# Component layout assumed when a file carries no "# Time" header (ESI force.dat)
+DEFAULT_COMPONENTS = [f"{part}_{axis}" for part in PARTS for axis in AXES]
+
+# File names written by the forces function object, newest layout first.
+# ESI (v2006+): force.dat / moment.dat
+# Foundation and older ESI: forces.dat / moments.dat
+FORCE_FILES = ("force.dat", "forces.dat")
+MOMENT_FILES = ("moment.dat", "moments.dat")
+
+# Group names used by the legacy combined layout:
+# "# Time forces(pressure viscous porous) moment(pressure viscous porous)"
+LEGACY_GROUPS = {"forces": "force", "force": "force", "moments": "moment", "moment": "moment"}
+
+PARENTHESES = bytes.maketrans(b"()", b"  ")
+
+
+def _split_header(raw):
+    """Split raw file bytes into (comment lines, data bytes)."""
+    header = []
+    start = 0
+    while start < len(raw) and raw.startswith(b"#", start):
+        end = raw.find(b"\n", start)
+        if end == -1:
+            end = len(raw)
+        header.append(raw[start:end].decode(errors="replace"))
+        start = end + 1
+    return header, raw[start:]
+
+
+def parse_header_columns(header, quantity):
+    """
+    Map the "# Time ..." header line to column names.
+
+    Component columns are prefixed with `quantity` ("force" or "moment"),
+    e.g. "pressure_x" becomes "force_pressure_x". Returns None when the file
+    has no recognisable header.
+    """
+    time_lines = [line for line in header if line.lstrip("# \t").startswith("Time")]
+    if not time_lines:
+        return None
+
+    tokens = time_lines[-1].lstrip("#").translate(str.maketrans("()", "  ")).split()
+    columns = ["time"]
+    group = quantity
+    for token in tokens[1:]:
+        if token in LEGACY_GROUPS:
+            # Legacy layout: a group name followed by bare part names
+            group = LEGACY_GROUPS[token]
+        elif "_" in token:
+            columns.append(f"{quantity}_{token}")
+        else:
+            columns.extend(f"{group}_{token}_{axis}" for axis in AXES)
+    return columns
+
+
+def load_force_file(dat_path, quantity="force"):
+    """
+    Load one forces function-object file into a DataFrame.
+
+    The "# Time ..." header decides the column names, so ESI and Foundation
+    layouts (with or without vector parentheses) load the same way. The whole
+    body is parsed in one call by the pandas C parser; an incomplete last
+    line of a file that is still being written is dropped.
+    """
+    dat_path = Path(dat_path)
+    header, body = _split_header(dat_path.read_bytes())
+
+    columns = parse_header_columns(header, quantity)
+    if columns is None:
+        logging.warning(f"No '# Time' header in {dat_path}; assuming ESI column layout.")
+        columns = ["time"] + [f"{quantity}_{name}" for name in DEFAULT_COMPONENTS]
+
+    df = pd.read_csv(
+        io.BytesIO(body.translate(PARENTHESES)),
+        sep=r"\s+",
+        header=None,
+        names=columns,
+        index_col=False,
+        comment="#",
+        engine="c",
+    )
+    return df.dropna().reset_index(drop=True)
+
+
+def find_force_file(forces_dir, candidates=FORCE_FILES):
+    """Return the first existing file of `candidates` in `forces_dir`, or None."""
+    for name in candidates:
+        path = Path(forces_dir) / name
+        if path.exists():
+            return path
+    return None
+
+
+def load_forces(forces_dir):
+    """
+    Load every force and moment component written to `forces_dir`.
+
+    Returns a DataFrame with a `time` column plus `force_<part>_<axis>` and
+    `moment_<part>_<axis>` for part in total/pressure/viscous. Missing totals
+    are summed from the parts. The x-components are also exposed as
+    `force_p`, `force_v` and `force_total` for the resistance averaging.
+    """
+    force_file = find_force_file(forces_dir, FORCE_FILES)
+    if force_file is None:
+        raise FileNotFoundError(f"No force data in {forces_dir}")
+
+    df = load_force_file(force_file, "force")
+
+    moment_file = find_force_file(forces_dir, MOMENT_FILES)
+    if moment_file is not None:
+        moments = load_force_file(moment_file, "moment")
+        df = df.merge(moments, on="time", how="left")
+
+    for quantity in ("force", "moment"):
+        for axis in AXES:
+            total = f"{quantity}_total_{axis}"
+            parts = [f"{quantity}_{part}_{axis}" for part in PARTS[1:]]
+            if total not in df and all(part in df for part in parts):
+                # Legacy layouts only list the parts (plus porous, if present)
+                porous = f"{quantity}_porous_{axis}"
+                df[total] = df[parts].sum(axis=1) + (df[porous] if porous in df else 0.0)
+
+    missing = [c for c in ("force_total_x", "force_pressure_x", "force_viscous_x") if c not in df]
+    if missing:
+        raise ValueError(f"{force_file}: unrecognised column layout, missing {missing} in {list(df.columns)}")
+
+    df["force_p"] = df["force_pressure_x"]
+    df["force_v"] = df["force_viscous_x"]
+    df["force_total"] = df["force_total_x"]
+    return df
+
+
+def drop_superseded(df):
+    """
+    Drop rows a restarted run wrote again.
+
+    A run restarted from its latest written time repeats the steps after
+    that time; the rows of the later attempt win. A row is kept only if it
+    comes before every row that follows it.
+    """
+    if df.empty:
+        return df
+    later_min = df["time"][::-1].cummin()[::-1].shift(-1, fill_value=float("inf"))
+    return df[df["time"] < later_min].reset_index(drop=True)
+
+
+def force_time_dirs(forces_root):
+    """
+    Start-time directories of a forces function object, in time order.
+
+    A run writes to postProcessing/forces/<start time>/, so a restarted run
+    adds a directory next to the first one.
+    """
+    dirs = []
+    for path in Path(forces_root).iterdir() if Path(forces_root).is_dir() else []:
+        try:
+            dirs.append((float(path.name), path))
+        except ValueError:
+            pass
+    return [path for _, path in sorted(dirs) if find_force_file(path) is not None]
+
+
+def force_history_files(forces_root):
+    """Every force and moment file of a (possibly restarted) run, oldest first."""
+    files = []
+    for forces_dir in force_time_dirs(forces_root):
+        files += [p for p in (find_force_file(forces_dir, FORCE_FILES), find_force_file(forces_dir, MOMENT_FILES)) if p]
+    return files
+
+
+def load_force_history(forces_root):
+    """
+    The force history of a run over all its restarts (see load_forces),
+    with the steps repeated after a restart taken from the later attempt.
+    """
+    dirs = force_time_dirs(forces_root)
+    if not dirs:
+        raise FileNotFoundError(f"No force data in {forces_root}")
+    df = pd.concat([load_forces(forces_dir) for forces_dir in dirs], ignore_index=True)
+    return drop_superseded(df)
+
+
+def whole_hull_forces(df):
+    """
+    Forces and moments on the whole hull from those on the y < 0 half that a
+    symmetric half domain simulates (moments about a point on y = 0): the
+    mirrored half doubles the x and z forces and the y moment and cancels
+    the others. force_p, force_v and force_total are x-components.
+    """
+    df = df.copy()
+    for column in df.columns:
+        quantity, _, rest = column.partition("_")
+        if quantity not in ("force", "moment"):
+            continue
+        axis = rest.rsplit("_", 1)[-1]
+        axis = axis if axis in AXES else "x"
+        in_plane = axis in ("x", "z") if quantity == "force" else axis == "y"
+        df[column] = df[column] * 2 if in_plane else 0.0
+    return df
@@ -1,129 +1,122 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
+import click
 import numpy as np
 
-def generate_wigley_stl(filename="wigley.stl", L=1.0, B=0.1, T=0.0625, n_x=100, n_z=20):
+from stl_io import write_ascii_stl, write_binary_stl
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+def wigley_points(L=1.0, B=0.1, T=0.0625, n_x=100, n_z=20):
     """
-    Generate a Wigley hull STL file.
-    Formula: y = +/- (B/2) * (1 - (2x/L)^2) * (1 - (z/T)^2)
+    Starboard grid of the Wigley hull as an (n_z, n_x, 3) array.
+    Formula: y = (B/2) * (1 - (2x/L)^2) * (1 - (z/T)^2)
     where x in [-L/2, L/2], z in [-T, 0]
     """
     x = np.linspace(-L/2, L/2, n_x)
     z = np.linspace(-T, 0, n_z)
     X, Z = np.meshgrid(x, z)
-    
-    # Calculate Y for positive side
-    # Ensure arguments are within bounds to avoid negative sqrt issues if using modified formulas
-    # Standard Wigley:
-    term1 = 1 - (2 * X / L)**2
-    term2 = 1 - (Z / T)**2
-    
+
     # Clip to 0 to handle numerical noise at boundaries
-    term1 = np.maximum(term1, 0)
-    term2 = np.maximum(term2, 0)
-    
+    term1 = np.maximum(1 - (2 * X / L)**2, 0)
+    term2 = np.maximum(1 - (Z / T)**2, 0)
     Y = (B / 2) * term1 * term2
-    
-    # Create vertices and faces (quads to triangles)
-    vertices = []
-    
-    # We need to triangulate the grid (X, Y, Z)
-    # Strategy: Build two sides (port and starboard) and a deck?
-    # Usually for CFD we just need the closed surface.
-    # OpenFOAM needs a watertight surface. We need to close the top (deck) and maybe centerline?
-    # But Wigley is usually symmetric. We can generate the whole hull.
-    
-    # Helper to add quad as two triangles
-    def add_quad(p1, p2, p3, p4, faces_list):
-        faces_list.append([p1, p2, p3])
-        faces_list.append([p1, p3, p4])
-
-    faces = []
-    
-    # Generate points array
-    # We will have (n_z, n_x) points for Starboard, same for Port.
-    # Starboard: +Y
-    # Port: -Y
-    
-    sb_points = np.zeros((n_z, n_x, 3))
-    sb_points[:,:,0] = X
-    sb_points[:,:,1] = Y
-    sb_points[:,:,2] = Z
-    
-    pt_points = np.zeros((n_z, n_x, 3))
-    pt_points[:,:,0] = X
-    pt_points[:,:,1] = -Y
-    pt_points[:,:,2] = Z
-
-    def write_stl_triangle(f, v1, v2, v3):
-        # Normal calculation
-        edge1 = v2 - v1
-        edge2 = v3 - v1
-        normal = np.cross(edge1, edge2)
-        norm_len = np.linalg.norm(normal)
-        if norm_len > 1e-6:
-            normal /= norm_len
-        else:
-            normal = np.array([0, 0, 0])
-            
-        f.write(f"facet normal {normal[0]} {normal[1]} {normal[2]}\n")
-        f.write("  outer loop\n")
-        f.write(f"    vertex {v1[0]} {v1[1]} {v1[2]}\n")
-        f.write(f"    vertex {v2[0]} {v2[1]} {v2[2]}\n")
-        f.write(f"    vertex {v3[0]} {v3[1]} {v3[2]}\n")
-        f.write("  endloop\n")
-        f.write("endfacet\n")
-
-    with open(filename, 'w') as f:
-        f.write("solid wigley\n")
-        
-        # Side shells
-        for i in range(n_z - 1):
-            for j in range(n_x - 1):
-                # Starboard (CCW winding looking from outside)
-                # p1(i, j) -> p2(i, j+1) -> p4(i+1, j+1) -> p3(i+1, j)
-                # Normal should point OUT (+Y)
-                v1 = sb_points[i, j]
-                v2 = sb_points[i, j+1]
-                v3 = sb_points[i+1, j+1]
-                v4 = sb_points[i+1, j]
-                write_stl_triangle(f, v1, v2, v3)
-                write_stl_triangle(f, v1, v3, v4)
-                
-                # Port (Normal should point OUT (-Y))
-                v1 = pt_points[i, j]
-                v2 = pt_points[i+1, j]
-                v3 = pt_points[i+1, j+1]
-                v4 = pt_points[i, j+1]
-                
-                write_stl_triangle(f, v1, v2, v3)
-                write_stl_triangle(f, v1, v3, v4)
-        
-        # Transom / Stern ? Wigley is sharp at both ends (Y=0).
-        # But top deck (z=0) needs closing.
-        # Deck: connect top row (i = n_z - 1) of Port to Starboard?
-        # Z is increasing from -T to 0. So deck is at index n_z - 1.
-        
-        # Deck
-        i_deck = n_z - 1
-        for j in range(n_x - 1):
-            # Connect SB[i_deck, j] to SB[i_deck, j+1]
-            # to PT[i_deck, j+1] to PT[i_deck, j]
-            # Normal point UP (+Z)
-            v1 = sb_points[i_deck, j]
-            v2 = sb_points[i_deck, j+1]
-            v3 = pt_points[i_deck, j+1] # Y is negative
-            v4 = pt_points[i_deck, j]
-            
-            # v1->v4->v3->v2 ? No.
-            # SB (+Y) -> PT (-Y).
-            # v1(x, y, 0), v2(x+dx, y', 0)
-            # Normal up: v1 -> v2 -> v3
-            write_stl_triangle(f, v1, v2, v3)
-            write_stl_triangle(f, v1, v3, v4)
-
-        f.write("endsolid wigley\n")
-    
-    print(f"Generated {filename}")
+
+    return np.stack([X, Y, Z], axis=-1)
+
+def _quads(p1, p2, p3, p4):
+    """Two triangles (p1, p2, p3) and (p1, p3, p4) per quad, for (..., 3) corner arrays."""
+    first = np.stack([p1, p2, p3], axis=-2).reshape(-1, 3, 3)
+    second = np.stack([p1, p3, p4], axis=-2).reshape(-1, 3, 3)
+    # Interleave so each quad's triangles stay together, as in the original facet order
+    return np.stack([first, second], axis=1).reshape(-1, 3, 3)
+
+def wigley_triangles(L=1.0, B=0.1, T=0.0625, n_x=100, n_z=20, half=False):
+    """
+    Closed Wigley hull surface as an (n, 3, 3) triangle array, normals pointing out.
+
+    Port and starboard shells plus a flat deck at z = 0; the hull is sharp
+    at both ends, so no transom is needed. With `half`, only the y <= 0
+    side (the one inside a symmetric half domain), open at y = 0.
+    """
+    sb = wigley_points(L, B, T, n_x, n_z)
+    pt = sb * np.array([1.0, -1.0, 1.0])
+    if half:
+        centre = sb * np.array([1.0, 0.0, 1.0])
+        port = _quads(pt[:-1, :-1], pt[:-1, 1:], pt[1:, 1:], pt[1:, :-1])
+        # Deck from the centreline to the port edge: C(j) -> PT(j) -> PT(j+1) -> C(j+1)
+        deck = _quads(centre[-1, :-1], pt[-1, :-1], pt[-1, 1:], centre[-1, 1:])
+        return np.concatenate([port, deck])
+
+    # Starboard: p(i, j) -> p(i+1, j) -> p(i+1, j+1) -> p(i, j+1), normal out (+Y)
+    starboard = _quads(sb[:-1, :-1], sb[1:, :-1], sb[1:, 1:], sb[:-1, 1:])
+    # Port: p(i, j) -> p(i, j+1) -> p(i+1, j+1) -> p(i+1, j), normal out (-Y)
+    port = _quads(pt[:-1, :-1], pt[:-1, 1:], pt[1:, 1:], pt[1:, :-1])
+    # Side shells alternate starboard and port quads
+    sides = np.stack([starboard.reshape(-1, 2, 3, 3), port.reshape(-1, 2, 3, 3)], axis=1).reshape(-1, 3, 3)
+
+    # Deck: SB(j) -> PT(j) -> PT(j+1) -> SB(j+1), normal up (+Z)
+    deck = _quads(sb[-1, :-1], pt[-1, :-1], pt[-1, 1:], sb[-1, 1:])
+    return np.concatenate([sides, deck])
+
+def generate_wigley_stl(filename="wigley.stl", L=1.0, B=0.1, T=0.0625, n_x=100, n_z=20, binary=True, half=False):
+    """
+    Generate a Wigley hull STL file (binary by default; see wigley_triangles).
+    """
+    triangles = wigley_triangles(L, B, T, n_x, n_z, half)
+    if binary:
+        write_binary_stl(filename, triangles, header=f"wigley L={L} B={B} T={T}")
+    else:
+        write_ascii_stl(filename, triangles, name="wigley")
+    logging.info(f"Generated {filename} ({len(triangles)} triangles)")
+    return Path(filename)
+
+def variant_filename(L, B, T):
+    """File name of one hull of a family, e.g. wigley_L1_B0.1_T0.0625.stl."""
+    return f"wigley_L{L:g}_B{B:g}_T{T:g}.stl"
+
+def _generate_variant(args):
+    output_dir, variant, n_x, n_z, binary, half = args
+    filename = Path(output_dir) / variant_filename(variant["L"], variant["B"], variant["T"])
+    return generate_wigley_stl(filename, variant["L"], variant["B"], variant["T"], n_x, n_z, binary, half)
+
+def generate_wigley_family(variants, output_dir, n_x=100, n_z=20, binary=True, jobs=None, half=False):
+    """
+    Generate one STL per (L, B, T) variant (dicts with keys L, B and T) in
+    `output_dir`, in a process pool. Returns the files in variant order.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tasks = [(output_dir, variant, n_x, n_z, binary, half) for variant in variants]
+    if jobs == 1 or len(tasks) <= 1:
+        return [_generate_variant(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(_generate_variant, tasks))
+
+@click.command()
+@click.option("--output", "-o", type=click.Path(path_type=Path), default=Path("config/geometry/wigley.stl"), show_default=True,
+              help="STL file, or the output directory with --variant")
+@click.option("--length", "-L", default=1.0, show_default=True, help="Hull length L")
+@click.option("--beam", "-B", default=0.1, show_default=True, help="Hull beam B")
+@click.option("--draft", "-T", default=0.0625, show_default=True, help="Hull draft T")
+@click.option("--n-x", default=100, show_default=True, help="Points along the hull")
+@click.option("--n-z", default=20, show_default=True, help="Points over the draft")
+@click.option("--ascii", "ascii_", is_flag=True, help="Write ASCII instead of binary STL")
+@click.option("--variant", "variants", multiple=True, help="Batch mode: generate the hull L,B,T (repeatable) into OUTPUT")
+@click.option("--jobs", "-j", type=int, default=None, help="Worker processes in batch mode (default: all cores)")
+@click.option("--half", is_flag=True, help="Only the y <= 0 side, for cases with the symmetry feature")
+def main(output, length, beam, draft, n_x, n_z, ascii_, variants, jobs, half):
+    """
+    Generate Wigley hull STL geometry.
+    """
+    if variants:
+        family = [dict(zip("LBT", map(float, variant.split(",")))) for variant in variants]
+        generate_wigley_family(family, output, n_x, n_z, binary=not ascii_, jobs=jobs, half=half)
+    else:
+        generate_wigley_stl(output, length, beam, draft, n_x, n_z, binary=not ascii_, half=half)
 
 if __name__ == "__main__":
-    generate_wigley_stl("config/geometry/wigley.stl")
+    main()
@@ -0,0 +1,227 @@
+"""
+Hydrostatics of a hull surface at a given draft and trim.
+
+The hull is an (n, 3, 3) triangle array (see stl_io.read_stl) of a closed
+surface, z pointing up; inward normals are flipped. Triangles are clipped exactly at the waterplane;
+everything else follows from surface integrals over the wetted triangles,
+so no cap has to be built:
+
+- volume, centre of buoyancy and the inertia tensor of the displaced volume
+  from tetrahedra spanned by each wetted triangle and a reference point on
+  the waterplane (and on y = 0); the missing waterplane (and centreplane)
+  faces contain that point and contribute nothing;
+- waterplane area, centre of flotation and second moments from the
+  divergence theorem, as the wetted hull and the waterplane together form a
+  closed surface.
+
+With `half`, only the y <= 0 half of the hull counts, as the simulations
+model that half with a symmetry plane at y = 0. A half hull (open at y = 0)
+works either way.
+"""
+import json
+import logging
+import os
+from functools import lru_cache
+
+import click
+import numpy as np
+
+from stl_io import read_stl
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+# Water properties of templates/base/constant/transportProperties
+RHO = 998.8
+NU = 1.09e-6
+# Radii of gyration (roll, pitch, yaw) as fractions of the waterline beam, length, length
+GYRATION = (0.34, 0.25, 0.25)
+
+
+def clip_below(triangles, origin, normal):
+    """
+    The parts of `triangles` with (p - origin) . normal <= 0, cut exactly,
+    as a new triangle array with the same orientation.
+    """
+    s = (triangles - origin) @ normal
+    below = s < 0
+    count = below.sum(axis=1)
+    mixed = (count == 1) | (count == 2)
+
+    # Roll each cut triangle so that its odd vertex (alone on its side) comes first
+    odd = np.where(count[mixed] == 1, below[mixed].argmax(axis=1), below[mixed].argmin(axis=1))
+    order = (odd[:, None] + np.arange(3)) % 3
+    p = np.take_along_axis(triangles[mixed], order[:, :, None], axis=1)
+    d = np.take_along_axis(s[mixed], order, axis=1)
+    p0, p1, p2 = p[:, 0], p[:, 1], p[:, 2]
+    p01 = p0 + (d[:, 0] / (d[:, 0] - d[:, 1]))[:, None] * (p1 - p0)
+    p02 = p0 + (d[:, 0] / (d[:, 0] - d[:, 2]))[:, None] * (p2 - p0)
+
+    one = count[mixed] == 1
+    return np.concatenate([
+        triangles[count == 3],
+        # Odd vertex below: the triangle at its tip
+        np.stack([p0, p01, p02], axis=1)[one],
+        # Odd vertex above: the remaining quadrilateral as two triangles
+        np.stack([p01, p1, p2], axis=1)[~one],
+        np.stack([p01, p2, p02], axis=1)[~one],
+    ])
+
+
+def _quadratic_means(f, triangles):
+    """Mean of a quadratic function f(points) over each triangle (edge-midpoint rule, exact)."""
+    midpoints = 0.5 * (triangles + np.roll(triangles, -1, axis=1))
+    return f(midpoints).mean(axis=1)
+
+
+def _signed_volume(triangles):
+    """Volume enclosed by triangles, from tetrahedra to the origin; negative for inward normals."""
+    return np.einsum("ij,ij->i", triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])).sum() / 6
+
+
+def hydrostatics(triangles, draft, trim=0.0, half=False):
+    """
+    Hydrostatic properties of a hull at `draft` above its lowest point.
+
+    `trim` (degrees) tilts the waterplane about the y axis through the
+    waterline at mid-length; positive trim immerses the +x end deeper.
+    Lengths are in the units of the triangles. Returns a dict.
+    """
+    triangles = np.asarray(triangles, dtype=float)
+    keel = float(triangles[..., 2].min())
+    x_min, x_max = triangles[..., 0].min(), triangles[..., 0].max()
+    origin = np.array([0.5 * (x_min + x_max), 0.0, keel + draft])
+    if _signed_volume(triangles - origin) < 0:
+        # Consistently inward normals (snappyHexMesh does not mind them)
+        triangles = triangles[:, ::-1]
+    angle = np.radians(trim)
+    normal = np.array([-np.sin(angle), 0.0, np.cos(angle)])
+    along = np.array([np.cos(angle), 0.0, np.sin(angle)])
+
+    wet = clip_below(triangles - origin, np.zeros(3), normal)
+    if half:
+        wet = clip_below(wet, np.zeros(3), np.array([0.0, 1.0, 0.0]))
+    a, b, c = wet[:, 0], wet[:, 1], wet[:, 2]
+    areas = 0.5 * np.cross(b - a, c - a)
+
+    # Displaced volume: tetrahedra from the origin (on the waterplane and y = 0)
+    det = np.einsum("ij,ij->i", a, np.cross(b, c))
+    volume = det.sum() / 6
+    total = a + b + c
+    first = (det[:, None] * total).sum(axis=0) / 24
+    second = np.einsum("i,ij,ik->jk", det, total, total) + np.einsum("n,nij,nik->jk", det, wet, wet)
+    second /= 120
+    centre = first / volume if volume > 0 else np.zeros(3)
+    covariance = second - volume * np.outer(centre, centre)
+    inertia = np.trace(covariance) * np.eye(3) - covariance
+
+    # Waterplane: its integrals are minus those over the wetted hull of f (n . dS)
+    flux = -(areas @ normal)
+    u = lambda p: p @ along
+    v = lambda p: p[..., 1]
+    waterplane_area = flux.sum()
+    if waterplane_area > 0:
+        u_f = (flux * _quadratic_means(u, wet)).sum() / waterplane_area
+        v_f = (flux * _quadratic_means(v, wet)).sum() / waterplane_area
+    else:
+        u_f = v_f = 0.0
+    # A half waterplane turns about the centreplane, like the whole one
+    inertia_t = (flux * _quadratic_means(lambda p: v(p) ** 2, wet)).sum() - (0.0 if half else waterplane_area * v_f ** 2)
+    inertia_l = (flux * _quadratic_means(lambda p: u(p) ** 2, wet)).sum() - waterplane_area * u_f ** 2
+
+    # Waterline extent: the wetted points on the waterplane
+    points = wet.reshape(-1, 3)
+    on_plane = points[np.abs(points @ normal) <= 1e-9 * max(np.ptp(triangles.reshape(-1, 3), axis=0).max(), 1.0)]
+    length = float(np.ptp(on_plane @ along)) if len(on_plane) else 0.0
+    beam = float(2 * np.abs(on_plane[:, 1]).max() if half else np.ptp(on_plane[:, 1])) if len(on_plane) else 0.0
+
+    return {
+        "draft": draft,
+        "trim": trim,
+        "half": half,
+        "keel": keel,
+        "waterline": float(origin[2]),
+        "volume": float(volume),
+        "centre_of_buoyancy": (origin + centre).tolist(),
+        "volume_inertia": inertia.tolist(),
+        "wetted_area": float(np.linalg.norm(areas, axis=1).sum()),
+        "waterplane_area": float(waterplane_area),
+        "centre_of_flotation": (origin + u_f * along + v_f * np.array([0.0, 1.0, 0.0])).tolist(),
+        "waterplane_inertia_transverse": float(inertia_t),
+        "waterplane_inertia_longitudinal": float(inertia_l),
+        "bm_transverse": float(inertia_t / volume) if volume > 0 else 0.0,
+        "bm_longitudinal": float(inertia_l / volume) if volume > 0 else 0.0,
+        "waterline_length": length,
+        "waterline_beam": beam,
+    }
+
+
+@lru_cache(maxsize=32)
+def _hull_hydrostatics(stl_path, mtime, draft, scale, trim, half):
+    return hydrostatics(read_stl(stl_path) * scale, draft, trim, half)
+
+
+def hull_hydrostatics(stl_path, draft, scale=1.0, trim=0.0, half=False):
+    """
+    hydrostatics() of an STL file scaled by `scale`; `draft` is in scaled
+    units. Results are cached per process, so cases sharing a hull load it once.
+    """
+    stl_path = str(stl_path)
+    return dict(_hull_hydrostatics(stl_path, os.path.getmtime(stl_path), float(draft), float(scale or 1.0), float(trim), bool(half)))
+
+
+def rigid_body_properties(hydro, rho=RHO, kg=None, gyration=GYRATION):
+    """
+    Mass, centre of mass and inertia of a freely floating hull, as the
+    parameters mass, CoM and MoI (xx xy xz yy yz zz) of dynamicMeshDict.
+
+    The mass balances the displacement and the centre of mass lies above the
+    centre of buoyancy, at `kg` above the keel (default: the waterline).
+    The inertia follows from radii of gyration relative to the waterline
+    beam and length.
+    """
+    mass = rho * hydro["volume"]
+    x_b, y_b, _ = hydro["centre_of_buoyancy"]
+    z_g = hydro["waterline"] if kg is None else hydro["keel"] + kg
+    k_xx = gyration[0] * hydro["waterline_beam"]
+    k_yy = gyration[1] * hydro["waterline_length"]
+    k_zz = gyration[2] * hydro["waterline_length"]
+    return {
+        "mass": float(f"{mass:.6g}"),
+        # A half hull moves in the symmetry plane
+        "CoM": [float(f"{x_b:.6g}"), 0.0 if hydro["half"] else float(f"{y_b:.6g}"), float(f"{z_g:.6g}")],
+        "MoI": [float(f"{mass * k ** 2:.6g}") if i in (0, 3, 5) else 0.0
+                for i, k in zip(range(6), (k_xx, 0, 0, k_yy, 0, k_zz))],
+    }
+
+
+def resistance_coefficients(force_x, velocity, wetted_area, length, rho=RHO, nu=NU):
+    """
+    Total resistance coefficient Ct and the ITTC-1957 friction line Cf at the
+    run's Reynolds number. Works on scalars and on pandas/NumPy columns alike.
+    """
+    reynolds = velocity * length / nu
+    return {
+        "ct": force_x / (0.5 * rho * velocity ** 2 * wetted_area),
+        "cf": 0.075 / (np.log10(reynolds) - 2) ** 2,
+        "reynolds": reynolds,
+    }
+
+
+@click.command()
+@click.argument("stl_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--draft", type=float, required=True, help="Waterline height above the keel (scaled units)")
+@click.option("--trim", type=float, default=0.0, show_default=True, help="Trim in degrees, positive immerses +x")
+@click.option("--scale", type=float, default=1.0, show_default=True, help="Geometry scale factor")
+@click.option("--half", is_flag=True, help="Only the y <= 0 half, as simulated with a symmetry plane")
+@click.option("--rho", type=float, default=RHO, show_default=True, help="Water density for the rigid-body properties")
+def main(stl_path, draft, trim, scale, half, rho):
+    """
+    Print the hydrostatics and rigid-body properties of the hull STL_PATH as JSON.
+    """
+    hydro = hull_hydrostatics(stl_path, draft, scale, trim, half)
+    click.echo(json.dumps({**hydro, **rigid_body_properties(hydro, rho)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
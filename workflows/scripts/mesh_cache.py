@@ -0,0 +1,245 @@
+"""
+Content-addressed cache of generated meshes.
+
+A mesh is identified by a hash of everything that decides it: the rendered
+meshing dictionaries, the geometry, the meshing part of the Allrun, the
+geometry scale and the OpenFOAM version/image. The case name only appears as
+a file name in those inputs and is normalised away, so every case with the
+same meshing inputs (all points of a Froude sweep, reruns of a case) shares
+one cache entry.
+
+    mesh_cache/<key>/polyMesh   the cached constant/polyMesh
+    mesh_cache/<key>/key.json   the inputs that went into the key
+
+`fetch` places a cached mesh in a case before it runs, so the Allrun skips
+blockMesh/snappyHexMesh; `store` adds the mesh of a case that meshed itself.
+`build` runs only the meshing steps (Allrun --mesh-only) on a miss.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import click
+import toml
+
+from thin_copy import thin_copytree
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+MESH_CACHE_DIR = Path("mesh_cache")
+DEFAULT_IMAGE = "openfoam-ships:latest"
+CASE_PLACEHOLDER = "@CASE@"
+# Everything in the Allrun before this line belongs to mesh generation
+ALLRUN_MESH_END = "# --- End of meshing ---"
+# Bump to invalidate every entry when the key scheme changes
+KEY_VERSION = 1
+# Cached meshes are shared read-only with the cases using them; symlinks are
+# avoided because cases run in containers that do not see the host paths
+LINK_METHODS = ("reflink", "hardlink", "copy")
+CONTAINER_CASE_DIR = "/home/openfoam/run/case"
+
+MESHING_PATTERNS = [
+    "system/blockMeshDict",
+    "system/snappyHexMeshDict",
+    "system/topoSetDict*",
+    "system/refineMeshDict",
+    "system/surfaceFeatureExtractDict",
+    "system/surfaceFeaturesDict",
+    "system/meshQualityDict",
+    "constant/triSurface/*",
+]
+
+
+def _hash_file(path, case_name):
+    """sha256 of a file; text files are hashed with the case name normalised."""
+    content = Path(path).read_bytes()
+    if case_name and b"\0" not in content[:1024]:
+        content = content.replace(case_name.encode(), CASE_PLACEHOLDER.encode())
+    return hashlib.sha256(content).hexdigest()
+
+
+def meshing_inputs(case_dir, config, image=DEFAULT_IMAGE):
+    """The inputs that determine the mesh of a prepared case, as a dict."""
+    case_dir = Path(case_dir)
+    meta = config.get("meta", {})
+    case_name = meta.get("name", case_dir.name)
+
+    files = {}
+    for pattern in MESHING_PATTERNS:
+        for path in sorted(case_dir.glob(pattern)):
+            if path.is_file():
+                name = str(path.relative_to(case_dir)).replace(case_name, CASE_PLACEHOLDER)
+                files[name] = _hash_file(path, case_name)
+
+    allrun = case_dir / "Allrun"
+    allrun_mesh = ""
+    if allrun.exists():
+        allrun_mesh = allrun.read_text().split(ALLRUN_MESH_END)[0].replace(case_name, CASE_PLACEHOLDER)
+
+    return {
+        "key_version": KEY_VERSION,
+        "version": meta.get("version", "of13"),
+        "image": image,
+        "scale": config.get("parameters", {}).get("scale"),
+        "allrun": hashlib.sha256(allrun_mesh.encode()).hexdigest(),
+        "files": files,
+    }
+
+
+def mesh_key(inputs):
+    """Cache key of a set of meshing inputs."""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def docker_command(case_dir, image=DEFAULT_IMAGE):
+    """
+    docker run arguments for a command in `case_dir`, as the calling user so
+    that the files it writes stay removable; shared with the Snakefile.
+    """
+    return [
+        "docker", "run", "--rm",
+        "--user", f"{os.getuid()}:{os.getgid()}", "-e", "HOME=/tmp",
+        "-v", f"{Path(case_dir).resolve()}:{CONTAINER_CASE_DIR}",
+        "-w", CONTAINER_CASE_DIR,
+        image,
+    ]
+
+
+def cached_mesh(key, cache_dir=MESH_CACHE_DIR):
+    """The cached polyMesh for `key`, or None on a miss."""
+    mesh = Path(cache_dir) / key / "polyMesh"
+    return mesh if (mesh / "points").exists() or (mesh / "points.gz").exists() else None
+
+
+def fetch_mesh(build_dir, run_dir, config, image=DEFAULT_IMAGE, cache_dir=MESH_CACHE_DIR):
+    """
+    Copy the cached mesh for the case prepared in `build_dir` into `run_dir`.
+    Returns True on a hit. A run directory that already has a mesh is left alone.
+    """
+    target = Path(run_dir) / "constant" / "polyMesh"
+    if (target / "points").exists():
+        return False
+    key = mesh_key(meshing_inputs(build_dir, config, image))
+    mesh = cached_mesh(key, cache_dir)
+    if mesh is None:
+        logging.info(f"Mesh cache miss ({key})")
+        return False
+    if target.exists():
+        shutil.rmtree(target)
+    thin_copytree(mesh, target, methods=LINK_METHODS)
+    logging.info(f"Mesh cache hit ({key}): linked {mesh} to {target}")
+    return True
+
+
+def store_mesh(build_dir, run_dir, config, image=DEFAULT_IMAGE, cache_dir=MESH_CACHE_DIR):
+    """
+    Add the mesh generated in `run_dir` to the cache under the key of `build_dir`.
+
+    Only meshes the case generated itself are stored (a blockMesh or
+    snappyHexMesh log exists); a mesh copied in from elsewhere may not match
+    the case's meshing inputs. Returns the cached polyMesh, or None for such
+    a case.
+    """
+    run_dir = Path(run_dir)
+    mesh = run_dir / "constant" / "polyMesh"
+    meshed_here = any((run_dir / log).exists() for log in ("log.blockMesh", "log.snappyHexMesh"))
+    if not meshed_here:
+        logging.info(f"Not storing the mesh of {run_dir}: it was fetched or morphed, not generated here")
+        return None
+    if not ((mesh / "points").exists() or (mesh / "points.gz").exists()):
+        raise FileNotFoundError(f"{run_dir} ran its meshing steps but has no mesh in {mesh}")
+
+    inputs = meshing_inputs(build_dir, config, image)
+    key = mesh_key(inputs)
+    if cached_mesh(key, cache_dir) is not None:
+        return cached_mesh(key, cache_dir)
+
+    # Assemble next to the entry and rename, so a concurrent reader never sees half a mesh
+    entry = Path(cache_dir) / key
+    tmp_entry = Path(cache_dir) / f".{key}.{os.getpid()}.tmp"
+    if tmp_entry.exists():
+        shutil.rmtree(tmp_entry)
+    thin_copytree(mesh, tmp_entry / "polyMesh", methods=LINK_METHODS)
+    (tmp_entry / "key.json").write_text(json.dumps(inputs, indent=2))
+    try:
+        tmp_entry.rename(entry)
+    except OSError:
+        if cached_mesh(key, cache_dir) is None:
+            raise
+        # Another case stored the same mesh first
+        shutil.rmtree(tmp_entry)
+    logging.info(f"Stored mesh of {run_dir} in cache ({key})")
+    return cached_mesh(key, cache_dir)
+
+
+def build_mesh(build_dir, config, image=DEFAULT_IMAGE, cache_dir=MESH_CACHE_DIR):
+    """
+    Return the cached mesh of a prepared case, meshing it first on a miss.
+
+    On a miss only the meshing steps run (Allrun --mesh-only), in a scratch
+    copy of `build_dir` that is removed afterwards.
+    """
+    key = mesh_key(meshing_inputs(build_dir, config, image))
+    mesh = cached_mesh(key, cache_dir)
+    if mesh is not None:
+        logging.info(f"Mesh cache hit ({key}): {mesh}")
+        return mesh
+
+    scratch = Path(cache_dir) / f".build-{key}"
+    if scratch.exists():
+        shutil.rmtree(scratch)
+    shutil.copytree(build_dir, scratch)
+    logging.info(f"Mesh cache miss ({key}): meshing {build_dir} in {scratch}")
+    subprocess.run(docker_command(scratch, image) + ["/bin/bash", "-c", "./Allrun --mesh-only"], check=True)
+    mesh = store_mesh(build_dir, scratch, config, image, cache_dir)
+    if mesh is None:
+        raise RuntimeError(f"Meshing {build_dir} produced no mesh; see the logs in {scratch}")
+    shutil.rmtree(scratch)
+    return mesh
+
+
+@click.group()
+def cli():
+    """Content-addressed cache of generated meshes."""
+    pass
+
+
+@cli.command()
+@click.argument("build_dir", type=click.Path(exists=True, path_type=Path))
+@click.argument("run_dir", type=click.Path(path_type=Path))
+@click.option("--config", "config_path", type=click.Path(exists=True, path_type=Path), required=True, help="case.toml of the case")
+@click.option("--image", default=DEFAULT_IMAGE, show_default=True, help="Docker image the case runs in")
+@click.option("--cache-dir", type=click.Path(path_type=Path), default=MESH_CACHE_DIR, show_default=True)
+def fetch(build_dir: Path, run_dir: Path, config_path: Path, image: str, cache_dir: Path):
+    """Copy a cached mesh matching BUILD_DIR into RUN_DIR, if there is one."""
+    fetch_mesh(build_dir, run_dir, toml.load(config_path), image, cache_dir)
+
+
+@cli.command()
+@click.argument("build_dir", type=click.Path(exists=True, path_type=Path))
+@click.argument("run_dir", type=click.Path(exists=True, path_type=Path))
+@click.option("--config", "config_path", type=click.Path(exists=True, path_type=Path), required=True, help="case.toml of the case")
+@click.option("--image", default=DEFAULT_IMAGE, show_default=True, help="Docker image the case ran in")
+@click.option("--cache-dir", type=click.Path(path_type=Path), default=MESH_CACHE_DIR, show_default=True)
+def store(build_dir: Path, run_dir: Path, config_path: Path, image: str, cache_dir: Path):
+    """Add the mesh generated in RUN_DIR to the cache."""
+    store_mesh(build_dir, run_dir, toml.load(config_path), image, cache_dir)
+
+
+@cli.command()
+@click.argument("build_dir", type=click.Path(exists=True, path_type=Path))
+@click.option("--config", "config_path", type=click.Path(exists=True, path_type=Path), required=True, help="case.toml of the case")
+@click.option("--image", default=DEFAULT_IMAGE, show_default=True, help="Docker image to mesh with")
+@click.option("--cache-dir", type=click.Path(path_type=Path), default=MESH_CACHE_DIR, show_default=True)
+def build(build_dir: Path, config_path: Path, image: str, cache_dir: Path):
+    """Print the cached mesh of BUILD_DIR, running only the meshing steps on a miss."""
+    click.echo(build_mesh(build_dir, toml.load(config_path), image, cache_dir))
+
+
+if __name__ == "__main__":
+    cli()
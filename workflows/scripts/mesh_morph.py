@@ -0,0 +1,396 @@
+"""
+Morphing an existing mesh onto a slightly different hull, instead of remeshing.
+
+For hull-form variations the new STL has the same triangulation as the one
+the base mesh was snapped to (e.g. generate_wigley.py with another L, B, T).
+Every point of the base mesh's hull patch is located on the old surface
+(closest triangle, barycentric coordinates) and moved with the same point
+of the new surface. The hull displacement is spread into the volume with
+radial basis functions of compact support (Wendland C2), centred on a
+subset of the hull points, so points far from the hull stay put. Points on
+the planar domain boundaries (midPlane, inlet, ...) slide within their
+plane.
+
+The morphed mesh is checked against the limits of system/meshQualityDict
+(non-orthogonality, skewness) and for inverted faces and cells. It is only
+written when it passes; otherwise the case is left without a mesh and the
+Allrun remeshes it with blockMesh/snappyHexMesh as usual.
+
+A case opts in with `morph_from = "<base case>"` in [parameters]; the
+Snakefile then morphs the base case's mesh while staging the case.
+"""
+import logging
+import re
+import shutil
+from pathlib import Path
+
+import click
+import numpy as np
+import toml
+from sklearn.neighbors import KDTree
+
+from foam_mesh import patch_points, read_mesh, write_points
+from mesh_cache import LINK_METHODS
+from stl_io import read_stl
+from thin_copy import thin_copytree
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+HULL_PATCH = "hull"
+# RBF centres: the interpolation matrix is dense in the number of centres
+MAX_CENTRES = 1000
+# Candidate triangles per hull point for the closest-triangle search
+CANDIDATE_TRIANGLES = 16
+CHUNK_SIZE = 20000
+# Defaults of the meshQualityDict entries that are checked
+QUALITY_DEFAULTS = {"maxNonOrtho": 65.0, "maxInternalSkewness": 4.0, "maxBoundarySkewness": 20.0}
+QUALITY_ENTRY_PATTERN = re.compile(r"^\s*(maxNonOrtho|maxInternalSkewness|maxBoundarySkewness)\s+([-+0-9.eE]+)\s*;", re.MULTILINE)
+
+
+def closest_on_triangles(points, triangles):
+    """
+    Closest points of (n, 3) `points` on (n, k, 3, 3) candidate triangles.
+    Returns the barycentric coordinates (n, k, 3) and distances (n, k).
+    """
+    p = points[:, None, :]
+    a, b, c = triangles[..., 0, :], triangles[..., 1, :], triangles[..., 2, :]
+    ab, ac, ap = b - a, c - a, p - a
+    d00, d01, d11 = (ab * ab).sum(-1), (ab * ac).sum(-1), (ac * ac).sum(-1)
+    d20, d21 = (ap * ab).sum(-1), (ap * ac).sum(-1)
+    denominator = d00 * d11 - d01 * d01
+    with np.errstate(divide="ignore", invalid="ignore"):
+        v = np.where(denominator > 0, (d11 * d20 - d01 * d21) / denominator, -1.0)
+        w = np.where(denominator > 0, (d00 * d21 - d01 * d20) / denominator, -1.0)
+    plane = np.stack([1 - v - w, v, w], axis=-1)
+
+    # Projection onto the plane when it falls inside, else the closest point on an edge
+    options = [np.where((plane >= 0).all(-1, keepdims=True), plane, np.nan)]
+    corners = (a, b, c)
+    for i, j in ((0, 1), (1, 2), (2, 0)):
+        edge = corners[j] - corners[i]
+        t = np.clip(((p - corners[i]) * edge).sum(-1) / np.maximum((edge * edge).sum(-1), 1e-300), 0, 1)
+        bary = np.zeros(t.shape + (3,))
+        bary[..., i], bary[..., j] = 1 - t, t
+        options.append(bary)
+    options = np.stack(options, axis=-2)
+    closest = np.einsum("nkoc,nkcx->nkox", options, triangles)
+    distance = np.linalg.norm(closest - p[:, :, None, :], axis=-1)
+    best = np.where(np.isnan(distance), np.inf, distance).argmin(axis=-1)
+    bary = np.take_along_axis(options, best[..., None, None], axis=-2)[..., 0, :]
+    return bary, np.take_along_axis(distance, best[..., None], axis=-1)[..., 0]
+
+
+def surface_displacement(points, old_triangles, new_triangles, candidates=CANDIDATE_TRIANGLES):
+    """
+    Displacement of points on the old surface to the same (barycentric)
+    location on the new surface; both surfaces share their triangulation.
+    """
+    if old_triangles.shape != new_triangles.shape:
+        raise ValueError(f"Surfaces differ in triangulation: {len(old_triangles)} vs {len(new_triangles)} triangles")
+    k = min(candidates, len(old_triangles))
+    _, nearest = KDTree(old_triangles.mean(axis=1)).query(points, k=k)
+    displacement = np.empty_like(points)
+    for start in range(0, len(points), CHUNK_SIZE):
+        chunk = slice(start, start + CHUNK_SIZE)
+        bary, distance = closest_on_triangles(points[chunk], old_triangles[nearest[chunk]])
+        best = distance.argmin(axis=1)
+        rows = np.arange(len(best))
+        triangle = nearest[chunk][rows, best]
+        change = new_triangles[triangle] - old_triangles[triangle]
+        displacement[chunk] = np.einsum("nc,ncx->nx", bary[rows, best], change)
+    return displacement
+
+
+def wendland_c2(r, radius):
+    """Wendland C2 basis function, zero beyond `radius`."""
+    x = np.clip(r / radius, 0, 1)
+    return (1 - x) ** 4 * (4 * x + 1)
+
+
+def farthest_point_sample(points, n):
+    """Indices of `n` points spread evenly over `points` (farthest point sampling)."""
+    if len(points) <= n:
+        return np.arange(len(points))
+    chosen = [0]
+    distance = np.linalg.norm(points - points[0], axis=1)
+    for _ in range(n - 1):
+        chosen.append(int(distance.argmax()))
+        distance = np.minimum(distance, np.linalg.norm(points - points[chosen[-1]], axis=1))
+    return np.array(chosen)
+
+
+def rbf_displacement(centres, displacement, targets, radius):
+    """Displacement at `targets` interpolated from the `centres` with Wendland C2 RBFs."""
+    matrix = wendland_c2(np.linalg.norm(centres[:, None] - centres[None], axis=-1), radius)
+    weights = np.linalg.solve(matrix, displacement)
+    result = np.zeros_like(targets)
+    # Only points within the support radius of the hull move
+    lower, upper = centres.min(axis=0) - radius, centres.max(axis=0) + radius
+    inside = np.flatnonzero(((targets >= lower) & (targets <= upper)).all(axis=1))
+    for start in range(0, len(inside), CHUNK_SIZE):
+        ids = inside[start:start + CHUNK_SIZE]
+        basis = wendland_c2(np.linalg.norm(targets[ids, None] - centres[None], axis=-1), radius)
+        result[ids] = basis @ weights
+    return result
+
+
+def planar_patches(mesh, exclude=()):
+    """(point labels, axis) of every boundary patch that is a plane normal to a coordinate axis."""
+    tolerance = 1e-9 * np.ptp(mesh["points"], axis=0).max()
+    planes = []
+    for name in mesh["boundary"]:
+        if name in exclude:
+            continue
+        ids = patch_points(mesh, name)
+        if len(ids) == 0:
+            continue
+        for axis in np.flatnonzero(np.ptp(mesh["points"][ids], axis=0) <= tolerance):
+            planes.append((ids, int(axis)))
+    return planes
+
+
+def morph_points(mesh, old_triangles, new_triangles, hull_patch=HULL_PATCH, radius=None, max_centres=MAX_CENTRES):
+    """
+    Morphed points of `mesh` (see foam_mesh.read_mesh) and a summary dict.
+    `radius` is the RBF support radius, by default the hull's bounding-box diagonal.
+    """
+    points = mesh["points"]
+    hull = patch_points(mesh, hull_patch)
+    if len(hull) == 0:
+        raise ValueError(f"Mesh has no points on patch '{hull_patch}'")
+    hull_displacement = surface_displacement(points[hull], old_triangles, new_triangles)
+    if radius is None:
+        radius = float(np.linalg.norm(np.ptp(points[hull], axis=0)))
+
+    centres = farthest_point_sample(points[hull], max_centres)
+    displacement = rbf_displacement(points[hull][centres], hull_displacement[centres], points, radius)
+    displacement[hull] = hull_displacement
+    for ids, axis in planar_patches(mesh, exclude=(hull_patch,)):
+        displacement[ids, axis] = 0.0
+
+    summary = {
+        "hull_points": len(hull),
+        "centres": len(centres),
+        "radius": radius,
+        "max_hull_displacement": float(np.linalg.norm(hull_displacement, axis=1).max()),
+        "moved_points": int((np.abs(displacement) > 0).any(axis=1).sum()),
+    }
+    return points + displacement, summary
+
+
+def face_geometry(points, offsets, labels):
+    """Area vectors and centres of all faces, from their triangle fans."""
+    sizes = np.diff(offsets)
+    face = np.repeat(np.arange(len(sizes)), sizes)
+    p = points[labels]
+    following = np.arange(len(labels)) + 1
+    following[offsets[1:] - 1] = offsets[:-1]
+    estimate = (np.add.reduceat(p, offsets[:-1], axis=0) / sizes[:, None])[face]
+    doubled = np.cross(p - estimate, p[following] - estimate)
+    areas = 0.5 * np.add.reduceat(doubled, offsets[:-1], axis=0)
+    normals = areas / np.maximum(np.linalg.norm(areas, axis=1), 1e-300)[:, None]
+    weight = np.einsum("ij,ij->i", doubled, normals[face])
+    centroid = (estimate + p + p[following]) / 3
+    total = np.add.reduceat(weight, offsets[:-1])
+    centres = np.add.reduceat(centroid * weight[:, None], offsets[:-1], axis=0)
+    fallback = np.add.reduceat(p, offsets[:-1], axis=0) / sizes[:, None]
+    centres = np.where(total[:, None] > 0, centres / np.where(total > 0, total, 1)[:, None], fallback)
+    return areas, centres
+
+
+def _bincount3(index, values, n):
+    return np.column_stack([np.bincount(index, values[:, i], minlength=n) for i in range(3)])
+
+
+def mesh_quality(mesh, points=None):
+    """
+    Quality measures of a mesh (optionally with moved `points`), computed
+    as checkMesh does: cell volumes and centres from face pyramids,
+    non-orthogonality and skewness from face and cell centres.
+    """
+    points = mesh["points"] if points is None else points
+    owner, neighbour = mesh["owner"], mesh["neighbour"]
+    n_internal, n_cells = len(neighbour), int(owner.max()) + 1
+    areas, centres = face_geometry(points, mesh["offsets"], mesh["labels"])
+    magnitude = np.linalg.norm(areas, axis=1)
+
+    # Cell centre estimate, then pyramid volumes and centroids
+    cells = np.concatenate([owner, neighbour])
+    face_ids = np.concatenate([np.arange(len(owner)), np.arange(n_internal)])
+    weight = np.bincount(cells, magnitude[face_ids], minlength=n_cells)
+    estimate = _bincount3(cells, centres[face_ids] * magnitude[face_ids, None], n_cells) / np.maximum(weight, 1e-300)[:, None]
+    sign = np.concatenate([np.ones(len(owner)), -np.ones(n_internal)])
+    pyramid = sign * np.einsum("ij,ij->i", areas[face_ids], centres[face_ids] - estimate[cells]) / 3
+    volumes = np.bincount(cells, pyramid, minlength=n_cells)
+    cell_centres = estimate + _bincount3(cells, 0.75 * (centres[face_ids] - estimate[cells]) * pyramid[:, None], n_cells) \
+        / np.where(np.abs(volumes) > 0, volumes, 1)[:, None]
+
+    # Internal faces: non-orthogonality and skewness
+    own = cell_centres[owner[:n_internal]]
+    d = cell_centres[neighbour] - own
+    s = areas[:n_internal]
+    cosine = np.einsum("ij,ij->i", d, s) / np.maximum(np.linalg.norm(d, axis=1) * magnitude[:n_internal], 1e-300)
+    non_ortho = np.degrees(np.arccos(np.clip(cosine, -1, 1)))
+    to_face = centres[:n_internal] - own
+    with np.errstate(divide="ignore", invalid="ignore"):
+        offset = to_face - (np.einsum("ij,ij->i", s, to_face) / np.einsum("ij,ij->i", s, d))[:, None] * d
+    internal_skewness = np.linalg.norm(offset, axis=1) / np.maximum(np.linalg.norm(d, axis=1), 1e-300)
+
+    # Boundary faces: skewness against the normal distance to the owner centre
+    to_face = centres[n_internal:] - cell_centres[owner[n_internal:]]
+    normal = areas[n_internal:] / np.maximum(magnitude[n_internal:], 1e-300)[:, None]
+    d = normal * np.einsum("ij,ij->i", normal, to_face)[:, None]
+    boundary_skewness = np.linalg.norm(to_face - d, axis=1) / np.maximum(np.linalg.norm(d, axis=1), 1e-300)
+
+    return {
+        "areas": areas,
+        "max_non_ortho": float(np.nan_to_num(non_ortho, nan=180.0).max(initial=0.0)),
+        "max_internal_skewness": float(np.nan_to_num(internal_skewness, nan=np.inf).max(initial=0.0)),
+        "max_boundary_skewness": float(np.nan_to_num(boundary_skewness, nan=np.inf).max(initial=0.0)),
+        "min_volume": float(volumes.min()),
+        "negative_volumes": int((volumes <= 0).sum()),
+    }
+
+
+def quality_limits(case_dir):
+    """The checked limits of system/meshQualityDict of a case, with defaults for missing entries."""
+    limits = dict(QUALITY_DEFAULTS)
+    quality_dict = Path(case_dir) / "system" / "meshQualityDict"
+    if quality_dict.exists():
+        limits.update({key: float(value) for key, value in QUALITY_ENTRY_PATTERN.findall(quality_dict.read_text())})
+    return limits
+
+
+def quality_violations(before, after, limits):
+    """
+    Reasons to reject a morphed mesh: inverted faces or cells, or a measure
+    beyond its limit. A base mesh that already exceeds a limit may not get worse.
+    """
+    violations = []
+    flipped = int((np.einsum("ij,ij->i", before["areas"], after["areas"]) <= 0).sum())
+    if flipped:
+        violations.append(f"{flipped} inverted faces")
+    if after["negative_volumes"] > before["negative_volumes"]:
+        violations.append(f"{after['negative_volumes']} cells with negative volume")
+    for measure, entry in (("max_non_ortho", "maxNonOrtho"), ("max_internal_skewness", "maxInternalSkewness"),
+                           ("max_boundary_skewness", "maxBoundarySkewness")):
+        limit = limits[entry]
+        # Negative skewness limits (and a non-orthogonality of 180) disable the check
+        if limit < 0 or (entry == "maxNonOrtho" and limit >= 180):
+            continue
+        if after[measure] > max(limit, before[measure]) * (1 + 1e-9):
+            violations.append(f"{entry} {after[measure]:.3g} > {max(limit, before[measure]):.3g}")
+    return violations
+
+
+def morph_mesh(base_mesh_dir, old_stl, new_stl, output_mesh_dir, limits=None, hull_patch=HULL_PATCH,
+               old_scale=1.0, new_scale=1.0, radius=None, max_centres=MAX_CENTRES):
+    """
+    Morph the polyMesh in `base_mesh_dir`, snapped to `old_stl`, onto `new_stl`
+    (both scaled like the Allrun scales them) and write it to `output_mesh_dir`
+    if it passes the quality checks. Returns a report dict with "accepted".
+    """
+    mesh = read_mesh(base_mesh_dir)
+    old_triangles = read_stl(old_stl) * (old_scale or 1.0)
+    new_triangles = read_stl(new_stl) * (new_scale or 1.0)
+    points, report = morph_points(mesh, old_triangles, new_triangles, hull_patch, radius, max_centres)
+
+    before, after = mesh_quality(mesh), mesh_quality(mesh, points)
+    violations = quality_violations(before, after, limits or QUALITY_DEFAULTS)
+    report.update({key: after[key] for key in after if key != "areas"})
+    report.update({"violations": violations, "accepted": not violations})
+    if violations:
+        logging.warning(f"Morphed mesh rejected: {'; '.join(violations)}")
+        return report
+
+    output_mesh_dir = Path(output_mesh_dir)
+    tmp = output_mesh_dir.with_name(f".{output_mesh_dir.name}.morph.tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    # Only the points change; the connectivity is shared with the base mesh
+    thin_copytree(base_mesh_dir, tmp, methods=LINK_METHODS)
+    write_points(tmp, points)
+    if output_mesh_dir.exists():
+        shutil.rmtree(output_mesh_dir)
+    tmp.rename(output_mesh_dir)
+    logging.info(f"Morphed {base_mesh_dir} into {output_mesh_dir}: {report['moved_points']} points moved, "
+                 f"hull displacement up to {report['max_hull_displacement']:.3g} m, "
+                 f"maxNonOrtho {after['max_non_ortho']:.1f}, maxSkewness {after['max_internal_skewness']:.2f}")
+    return report
+
+
+def morph_case(build_dir, run_dir, config, results_root=Path("results"), build_root=Path("build"), cases_dir=Path("cases")):
+    """
+    Give the case staged in `run_dir` the morphed mesh of its `morph_from`
+    base case. Returns the morph report, or None when the case does not
+    morph (no morph_from, a mesh already present, no base mesh yet).
+    """
+    parameters = config.get("parameters", {})
+    base = parameters.get("morph_from")
+    if not base:
+        return None
+    target = Path(run_dir) / "constant" / "polyMesh"
+    if (target / "points").exists():
+        logging.info(f"{run_dir} already has a mesh; not morphing")
+        return None
+    base_mesh = Path(results_root) / base / "constant" / "polyMesh"
+    if not (base_mesh / "points").exists() and not (base_mesh / "points.gz").exists():
+        logging.warning(f"Base case {base} has no mesh in {base_mesh}; remeshing instead")
+        return None
+
+    name = config.get("meta", {}).get("name", Path(run_dir).name)
+    base_config = toml.load(Path(cases_dir) / base / "case.toml")
+    # The build directories hold the unscaled geometry
+    return morph_mesh(
+        base_mesh,
+        Path(build_root) / base / "constant" / "triSurface" / f"{base}.stl",
+        Path(build_dir) / "constant" / "triSurface" / f"{name}.stl",
+        target,
+        limits=quality_limits(build_dir),
+        old_scale=base_config.get("parameters", {}).get("scale", 1.0),
+        new_scale=parameters.get("scale", 1.0),
+    )
+
+
+@click.group()
+def cli():
+    """Morph existing meshes onto new hull geometry."""
+    pass
+
+
+@cli.command()
+@click.argument("base_mesh_dir", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.argument("old_stl", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.argument("new_stl", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.argument("output_mesh_dir", type=click.Path(path_type=Path))
+@click.option("--case-dir", type=click.Path(exists=True, file_okay=False, path_type=Path), default=None,
+              help="Case whose system/meshQualityDict sets the limits")
+@click.option("--hull-patch", default=HULL_PATCH, show_default=True)
+@click.option("--radius", type=float, default=None, help="RBF support radius (default: hull bounding-box diagonal)")
+@click.option("--max-centres", default=MAX_CENTRES, show_default=True, help="RBF centres on the hull")
+def mesh(base_mesh_dir, old_stl, new_stl, output_mesh_dir, case_dir, hull_patch, radius, max_centres):
+    """Morph BASE_MESH_DIR, snapped to OLD_STL, onto NEW_STL as OUTPUT_MESH_DIR."""
+    limits = quality_limits(case_dir) if case_dir else None
+    report = morph_mesh(base_mesh_dir, old_stl, new_stl, output_mesh_dir, limits, hull_patch, radius=radius, max_centres=max_centres)
+    if not report["accepted"]:
+        raise SystemExit(1)
+
+
+@cli.command()
+@click.argument("build_dir", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.argument("run_dir", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option("--config", "config_path", type=click.Path(exists=True, path_type=Path), required=True, help="case.toml of the case")
+@click.option("--results-root", type=click.Path(path_type=Path), default=Path("results"), show_default=True)
+@click.option("--build-root", type=click.Path(path_type=Path), default=Path("build"), show_default=True)
+@click.option("--cases-dir", type=click.Path(path_type=Path), default=Path("cases"), show_default=True)
+def case(build_dir, run_dir, config_path, results_root, build_root, cases_dir):
+    """
+    Morph the mesh of the morph_from case of RUN_DIR, if it has one. A
+    rejected morph leaves RUN_DIR without a mesh, so the Allrun remeshes.
+    """
+    morph_case(build_dir, run_dir, toml.load(config_path), results_root, build_root, cases_dir)
+
+
+if __name__ == "__main__":
+    cli()
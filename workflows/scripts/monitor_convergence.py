@@ -0,0 +1,170 @@
+import json
+import logging
+import re
+import time
+from pathlib import Path
+
+import click
+import numpy as np
+
+from force_data import force_history_files, load_force_history
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CONVERGENCE_FILE = "convergence.json"
+STOP_AT_PATTERN = re.compile(r'^(\s*stopAt\s+)\w+(\s*;)', re.MULTILINE)
+
+
+def estimate_period(t, f):
+    """
+    Dominant oscillation period of f(t), or None if there is no clear peak.
+
+    The signal is resampled to a uniform grid (adjustable time steps are not
+    uniform), detrended, and the strongest non-zero FFT frequency is taken.
+    Zero-padding and a parabolic fit around the peak refine the frequency
+    beyond the 1/duration resolution of the raw spectrum.
+    """
+    if len(t) < 16 or t[-1] <= t[0]:
+        return None
+
+    t_uniform = np.linspace(t[0], t[-1], len(t))
+    f_uniform = np.interp(t_uniform, t, f)
+    f_uniform = f_uniform - np.polyval(np.polyfit(t_uniform, f_uniform, 1), t_uniform)
+
+    n_fft = 8 * len(t_uniform)
+    power = np.abs(np.fft.rfft(f_uniform, n=n_fft)) ** 2
+    freqs = np.fft.rfftfreq(n_fft, d=t_uniform[1] - t_uniform[0])
+    peak = np.argmax(power[1:-1]) + 1
+
+    # A peak that does not stand out from the spectrum is noise, not a period
+    if power[peak] < 4.0 * np.mean(power[1:]):
+        return None
+
+    left, centre, right = np.log(power[peak - 1:peak + 2] + 1e-300)
+    shift = 0.5 * (left - right) / (left - 2 * centre + right)
+    return 1.0 / (freqs[peak] + shift * (freqs[1] - freqs[0]))
+
+
+def assess_convergence(t, f, tolerance=0.01, min_window=1.0, n_periods=4):
+    """
+    Test whether the tail of a force history has reached a steady state.
+
+    The averaging window spans `n_periods` oscillation periods (at least
+    `min_window` seconds) at the end of the history, and at least as much
+    history must precede it, so the start-up transient is never inside.
+    The state is steady when, relative to the window mean, both the drift of
+    the one-period running mean across the window and the difference between
+    the means of its two halves are below `tolerance`.
+    """
+    t = np.asarray(t, dtype=float)
+    f = np.asarray(f, dtype=float)
+    stats = {'converged': False, 't_end': float(t[-1]) if len(t) else 0.0}
+    if len(t) < 16:
+        return stats
+
+    t_end = t[-1]
+    tail = t >= t[0] + 0.5 * (t_end - t[0])
+    period = estimate_period(t[tail], f[tail])
+    window = max(min_window, n_periods * period) if period else min_window
+    t_start = t_end - window
+    stats.update({'period': float(period) if period else None, 't_start': float(t_start)})
+
+    if t_start - t[0] < window:
+        return stats
+
+    # Uniform resampling so that means are time averages, not step averages
+    n = max(int(np.count_nonzero(t >= t_start)), 16)
+    t_win = np.linspace(t_start, t_end, n)
+    f_win = np.interp(t_win, t, f)
+    mean = float(np.mean(f_win))
+    scale = abs(mean) if mean != 0 else 1.0
+
+    # Running mean over one period removes the oscillation before fitting a trend
+    dt = t_win[1] - t_win[0]
+    k = min(max(int(round(period / dt)), 1), n // 2) if period else 1
+    smooth = np.convolve(f_win, np.ones(k) / k, mode='valid')
+    slope = np.polyfit(t_win[k - 1:], smooth, 1)[0]
+    drift = float(slope * window / scale)
+    half_diff = float((np.mean(f_win[n // 2:]) - np.mean(f_win[:n // 2])) / scale)
+
+    stats.update({
+        'mean': mean,
+        'std': float(np.std(f_win, ddof=1)),
+        'drift': drift,
+        'half_difference': half_diff,
+        'converged': abs(drift) < tolerance and abs(half_diff) < tolerance,
+    })
+    return stats
+
+
+def request_stop(case_dir):
+    """Ask a running solver to write and stop via the runTimeModifiable controlDict."""
+    control_dict = case_dir / "system" / "controlDict"
+    content = control_dict.read_text()
+    new_content, count = STOP_AT_PATTERN.subn(r'\1writeNow\2', content, count=1)
+    if count == 0:
+        raise ValueError(f"No stopAt entry found in {control_dict}")
+    control_dict.write_text(new_content)
+    logging.info(f"Set 'stopAt writeNow' in {control_dict}")
+
+
+def load_convergence(case_dir):
+    """Return the convergence record written by the monitor, or None."""
+    record = Path(case_dir) / CONVERGENCE_FILE
+    if not record.exists():
+        return None
+    return json.loads(record.read_text())
+
+
+@click.command()
+@click.argument("case_dir", type=click.Path(path_type=Path))
+@click.option("--tolerance", default=0.01, show_default=True, help="Relative drift allowed in the averaging window")
+@click.option("--min-window", default=1.0, show_default=True, help="Minimum averaging window (simulated seconds)")
+@click.option("--n-periods", default=4, show_default=True, help="Oscillation periods covered by the averaging window")
+@click.option("--interval", default=30.0, show_default=True, help="Seconds between checks")
+@click.option("--idle-timeout", default=600.0, show_default=True, help="Give up after this many seconds without new force data")
+@click.option("--no-stop", is_flag=True, help="Only record convergence; do not stop the solver")
+def monitor(case_dir: Path, tolerance: float, min_window: float, n_periods: int, interval: float, idle_timeout: float, no_stop: bool):
+    """
+    Watch the force history of a running case and stop the solver once the
+    resistance is steady. The averaging window and statistics are written to
+    CASE_DIR/convergence.json for extract_data.py.
+    """
+    forces_root = case_dir / "postProcessing" / "forces"
+    last_size = -1
+    last_change = time.monotonic()
+
+    while True:
+        # A resumed run writes to a new start-time directory
+        force_files = force_history_files(forces_root)
+        size = sum(f.stat().st_size for f in force_files) if force_files else -1
+
+        if size != last_size:
+            last_size, last_change = size, time.monotonic()
+            df = load_force_history(forces_root)
+            if not df.empty:
+                stats = assess_convergence(
+                    df['time'].to_numpy(), df['force_total'].to_numpy(),
+                    tolerance=tolerance, min_window=min_window, n_periods=n_periods
+                )
+                logging.info(
+                    f"t={stats['t_end']:g}: drift={stats.get('drift', float('nan')):.4f} "
+                    f"period={stats.get('period') or float('nan'):.3g} converged={stats['converged']}"
+                )
+                if stats['converged']:
+                    stats.update({'tolerance': tolerance, 'stop_time': stats['t_end']})
+                    (case_dir / CONVERGENCE_FILE).write_text(json.dumps(stats, indent=2))
+                    logging.info(f"Converged: mean Fx={stats['mean']:.3f} N over [{stats['t_start']:g}, {stats['t_end']:g}]")
+                    if not no_stop:
+                        request_stop(case_dir)
+                    return
+        elif time.monotonic() - last_change > idle_timeout:
+            logging.warning(f"No new force data for {idle_timeout:.0f} s; stopping monitor without convergence.")
+            return
+
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    monitor()
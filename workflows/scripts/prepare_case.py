@@ -3,20 +3,124 @@ import shutil
 import os
 import click
 import logging
+from functools import lru_cache
 from pathlib import Path
 from jinja2 import Environment, FileSystemLoader
 import re
 
+from cell_estimate import check_memory, estimate_case, log_estimate, write_estimate
+from domain_sizing import domain_layout, hull_bounds
+from foam_case import symmetric_domain
+from hydrostatics import RHO, hull_hydrostatics, rigid_body_properties
+from stage_case import IMMUTABLE_INPUTS, STAGE_METHODS
+from thin_copy import sync_tree, thin_copytree
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
-@click.command()
-@click.argument("toml_path", type=click.Path(exists=True, path_type=Path))
-@click.argument("output_dir", type=click.Path(path_type=Path))
-def prepare_case(toml_path: Path, output_dir: Path):
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+TEMPLATES_ROOT = REPO_ROOT / "templates"
+TOPO_SET_PATTERN = re.compile(r"topoSetDict\.(\d+)\.j2")
+
+@lru_cache(maxsize=None)
+def template_environment(search_paths):
+    """
+    Jinja2 environment for a tuple of search paths, shared by every case
+    rendered in this process, so each template is loaded and compiled once.
+    """
+    return Environment(loader=FileSystemLoader(list(search_paths)))
+
+def template_layers(features):
+    """Template directories a case is composed of, later ones overriding earlier ones."""
+    layers = [TEMPLATES_ROOT / "base"]
+    if features.get("six_dof") and (TEMPLATES_ROOT / "features" / "six_dof").exists():
+        layers.append(TEMPLATES_ROOT / "features" / "six_dof")
+    return layers
+
+def case_templates(layers):
+    """The .j2 templates of a composed case as {relative path: source file}."""
+    templates = {}
+    for layer in layers:
+        for file_path in layer.rglob("*.j2"):
+            templates[file_path.relative_to(layer)] = file_path
+    return templates
+
+def geometry_source(toml_path, geo_name):
+    """Hull STL of a case: <geo_name>.stl(.gz) next to the TOML, else in config/geometry; None if missing."""
+    for directory in (Path(toml_path).parent, REPO_ROOT / "config" / "geometry"):
+        for name in (f"{geo_name}.stl", f"{geo_name}.stl.gz"):
+            if (directory / name).exists():
+                return directory / name
+    return None
+
+def rigid_body_parameters(toml_path, meta, parameters, case_name, half=True):
+    """
+    Parameters with mass, CoM and MoI of a six-DoF hull filled in from its
+    hydrostatics at `draft` (see hydrostatics.py); given values are kept.
+    With `half`, those of the y < 0 half in a symmetric half domain.
+    """
+    if all(key in parameters for key in ("mass", "CoM", "MoI")) or "draft" not in parameters:
+        return parameters
+    source = geometry_source(toml_path, meta.get("geometry_name", case_name))
+    if source is None:
+        logging.warning("No geometry to compute the rigid-body properties from; using the template defaults")
+        return parameters
+    hydro = hull_hydrostatics(source, parameters["draft"], parameters.get("scale") or 1.0,
+                              parameters.get("trim", 0.0), half=half)
+    body = rigid_body_properties(hydro, rho=parameters.get("rho", RHO), kg=parameters.get("KG"))
+    logging.info(f"Hydrostatics at draft {parameters['draft']}: displacement {hydro['volume']:.4g} m3, "
+                 f"wetted area {hydro['wetted_area']:.4g} m2, mass {body['mass']:.6g} kg")
+    return {**body, **parameters}
+
+def case_domain(toml_path, meta, parameters, features, case_name):
+    """
+    Domain layout of a case (see domain_sizing.py), sized from its hull
+    geometry when that exists. An auto-sized domain is reported against the
+    fixed one.
+    """
+    if not features.get("auto_domain"):
+        return domain_layout(parameters, features)
+    source = geometry_source(toml_path, meta.get("geometry_name", case_name))
+    bounds = hull_bounds(source, parameters.get("scale")) if source is not None else None
+    domain = domain_layout(parameters, features, bounds)
+    fixed = domain_layout(parameters, {**features, "auto_domain": False})
+    logging.info(f"Domain for L = {domain['length']:.4g} m, Kelvin wavelength {domain['wavelength']:.4g} m: "
+                 f"{len(domain['boxes'])} refinement box(es) down to {domain['cell_size']:.3g} m cells, "
+                 f"~{domain['cell_estimate']:,} cells before snappyHexMesh "
+                 f"(fixed domain: ~{fixed['cell_estimate']:,}, unrefined)")
+    return domain
+
+def prepare(toml_path: Path, output_dir: Path, incremental: bool = False):
     """
     Prepare an OpenFOAM case directory based on a TOML configuration.
+
+    Templates are rendered from the template directories themselves, through
+    environments shared between calls, so preparing many cases in one
+    process compiles every template only once (see prepare_cases.py).
+
+    With `incremental`, an existing case is rendered next to `output_dir`
+    and only files whose content changed are replaced (thin_copy.sync_tree);
+    unchanged files, such as the geometry, keep their mtime.
+
+    A mesh and geometry given in the case directory (e.g. the base mesh a
+    sweep variant links to) are linked into the case like stage_case links
+    them into the run directory, so one copy on disk serves cases/, build/
+    and results/.
     """
+    if incremental and output_dir.exists():
+        staging_dir = output_dir.parent / f".{output_dir.name}.{os.getpid()}.tmp"
+        if staging_dir.exists():
+            shutil.rmtree(staging_dir)
+        try:
+            prepare(toml_path, staging_dir)
+            done = sync_tree(staging_dir, output_dir, link=IMMUTABLE_INPUTS, methods=STAGE_METHODS)
+        finally:
+            if staging_dir.exists():
+                shutil.rmtree(staging_dir)
+        logging.info(f"Updated {output_dir}: {done['written']} file(s) written, {done['removed']} removed, "
+                     f"{done['unchanged']} unchanged")
+        return
+
     try:
         config = toml.load(toml_path)
     except Exception as e:
@@ -32,8 +136,8 @@ def prepare_case(toml_path: Path, output_dir: Path):
     logging.info(f"Preparing case '{meta.get('name', 'unnamed')}' for OpenFOAM {version}")
     
     # Define source paths
-    repo_root = Path(__file__).resolve().parent.parent.parent
-    templates_root = repo_root / "templates"
+    repo_root = REPO_ROOT
+    templates_root = TEMPLATES_ROOT
     
     # Clean output directory if exists
     if output_dir.exists():
@@ -46,8 +150,8 @@ def prepare_case(toml_path: Path, output_dir: Path):
     
     logging.info(f"Applying base template from {base_template}")
     
-    # Ignore build artifacts
-    ignore_func = shutil.ignore_patterns("log.*", "processor*", "postProcessing", "*.foam", "dynamicCode")
+    # Ignore build artifacts; templates are rendered from their source below
+    ignore_func = shutil.ignore_patterns("log.*", "processor*", "postProcessing", "*.foam", "dynamicCode", "*.j2")
     shutil.copytree(base_template, output_dir, ignore=ignore_func)
     
     # 2. Apply Features
@@ -58,7 +162,7 @@ def prepare_case(toml_path: Path, output_dir: Path):
         feature_path = templates_root / "features" / "six_dof"
         if feature_path.exists():
             logging.info("Applying feature: six_dof")
-            shutil.copytree(feature_path, output_dir, dirs_exist_ok=True)
+            shutil.copytree(feature_path, output_dir, dirs_exist_ok=True, ignore=shutil.ignore_patterns("*.j2"))
         else:
             logging.warning(f"Feature six_dof requested but template not found at {feature_path}")
 
@@ -93,10 +197,12 @@ def prepare_case(toml_path: Path, output_dir: Path):
     # Patch controlDict (Handling moved to templates/base/system/controlDict.j2)
     pass
 
-    # Patch dynamicMeshDict
-    dyn_mesh_dict = output_dir / "constant" / "dynamicMeshDict"
-    # Placeholder for mass property injection if we implement it dynamically
-    # For now, we rely on the template or manual edits, but could inject mass/CoM here.
+    # Domain and free-surface refinement for blockMeshDict.j2 and topoSetDict.<n>.j2
+    domain = case_domain(toml_path, meta, parameters, features, case_name)
+
+    # Rigid-body properties for dynamicMeshDict.j2
+    if features.get("six_dof"):
+        parameters = rigid_body_parameters(toml_path, meta, parameters, case_name, half=symmetric_domain(config))
     
     # Patch fvSolution (Moved to template)
     pass
@@ -128,20 +234,24 @@ def prepare_case(toml_path: Path, output_dir: Path):
              shutil.rmtree(item)
 
     # Template Processing
-    for file_path in output_dir.rglob("*.j2"):
+    layers = template_layers(features)
+    for rel_path, file_path in case_templates(layers).items():
         if file_path.name == "header.j2":
-            file_path.unlink()
             continue
 
-        target_path = file_path.with_suffix("") 
+        target_path = output_dir / rel_path.with_suffix("")
         
         # Jinja2 requires a str path for loader
-        # We add the file's parent AND templates/base to allow including common templates like header.j2
-        search_paths = [str(file_path.parent), str(templates_root / "base")]
-        env = Environment(loader=FileSystemLoader(search_paths))
+        # The template's directory in every layer (a feature file overrides the
+        # base one) AND templates/base to allow including common templates like header.j2
+        search_paths = [str(layer / rel_path.parent) for layer in reversed(layers) if (layer / rel_path.parent).is_dir()]
+        env = template_environment(tuple(search_paths + [str(templates_root / "base")]))
         if file_path.name == "snappyHexMeshDict.j2" and not features.get("meshing", True):
-             file_path.unlink()
              continue
+        # One topoSetDict.<n> per refinement box of the domain
+        box = TOPO_SET_PATTERN.fullmatch(file_path.name)
+        if box and int(box.group(1)) > len(domain["boxes"]):
+            continue
 
         template = env.get_template(file_path.name)
         rendered_content = template.render(
@@ -149,13 +259,14 @@ def prepare_case(toml_path: Path, output_dir: Path):
             parameters=parameters, 
             meta=meta, 
             case_name=case_name,
-            version=version
+            version=version,
+            domain=domain
         )
         
+        target_path.parent.mkdir(parents=True, exist_ok=True)
         with open(target_path, "w") as f:
             f.write(rendered_content)
         
-        file_path.unlink()
         logging.info(f"Rendered template: {target_path.name}")
     
     # Geometry Handling
@@ -165,26 +276,20 @@ def prepare_case(toml_path: Path, output_dir: Path):
     # Determine geometry filename
     geo_name = meta.get("geometry_name", case_name)
 
-    # Check for compressed or uncompressed source
-    source_stl = toml_path.parent / f"{geo_name}.stl"
-    source_stl_gz = toml_path.parent / f"{geo_name}.stl.gz"
-    
-    # Fallback to config/geometry if not in case dir
-    if not source_stl.exists() and not source_stl_gz.exists():
-         source_stl = repo_root / "config" / "geometry" / f"{geo_name}.stl"
-         source_stl_gz = repo_root / "config" / "geometry" / f"{geo_name}.stl.gz"
+    # Compressed or uncompressed source, in the case dir or else config/geometry
+    source_stl = geometry_source(toml_path, geo_name)
 
     target_stl = geometry_dir / f"{case_name}.stl"
 
-    if source_stl.exists():
+    if source_stl is not None and source_stl.suffix == ".stl":
         shutil.copy(source_stl, target_stl)
         logging.info(f"Copied geometry file: {source_stl.name}")
-    elif source_stl_gz.exists():
+    elif source_stl is not None:
         import gzip
-        with gzip.open(source_stl_gz, 'rb') as f_in:
+        with gzip.open(source_stl, 'rb') as f_in:
             with open(target_stl, 'wb') as f_out:
                 shutil.copyfileobj(f_in, f_out)
-        logging.info(f"Copied and decompressed geometry file: {source_stl_gz.name}")
+        logging.info(f"Copied and decompressed geometry file: {source_stl.name}")
     else:
         logging.warning(f"Geometry file for {case_name} not found in case dir or config/geometry.")
     
@@ -196,10 +301,7 @@ def prepare_case(toml_path: Path, output_dir: Path):
     allrun_template_path = templates_root / "scripts" / "Allrun.j2"
     
     if not allrun_path.exists() and allrun_template_path.exists():
-        with open(allrun_template_path, "r") as f:
-            template_content = f.read()
-            
-        template = Environment(loader=FileSystemLoader(allrun_template_path.parent)).from_string(template_content)
+        template = template_environment((str(allrun_template_path.parent),)).get_template(allrun_template_path.name)
 
         # Prepare Context
         context = {
@@ -210,8 +312,13 @@ def prepare_case(toml_path: Path, output_dir: Path):
             "has_snappy": (output_dir / "system" / "snappyHexMeshDict").exists(),
             "has_surface_features": (output_dir / "system" / "surfaceFeaturesDict").exists(),
             "has_surface_feature_extract": (output_dir / "system" / "surfaceFeatureExtractDict").exists(),
-            "has_set_fields": (output_dir / "system" / "setFieldsDict").exists(),
-            "has_decompose": (output_dir / "system" / "decomposeParDict").exists()
+            # A warm-started case already has its free surface in 0.orig
+            "has_set_fields": (output_dir / "system" / "setFieldsDict").exists() and not features.get("warm_start"),
+            "has_decompose": (output_dir / "system" / "decomposeParDict").exists(),
+            # Time steps reconstructPar writes: "latest" (default), "all" or "none"
+            "reconstruct": parameters.get("reconstruct", "latest"),
+            # Boxes refined by topoSet and refineMesh before snappyHexMesh
+            "refine_boxes": len(domain["boxes"]) if domain["auto"] else 0
         }
 
         rendered_allrun = template.render(context)
@@ -227,15 +334,43 @@ def prepare_case(toml_path: Path, output_dir: Path):
         shutil.copytree(case_dir / "system", output_dir / "system", dirs_exist_ok=True)
         logging.info(f"Applied system overrides from {case_dir}/system")
     if (case_dir / "constant").exists():
-        shutil.copytree(case_dir / "constant", output_dir / "constant", dirs_exist_ok=True)
-        logging.info(f"Applied constant overrides from {case_dir}/constant")
+        # Patterns of IMMUTABLE_INPUTS relative to constant/
+        link = [pattern.removeprefix("constant/") for pattern in IMMUTABLE_INPUTS]
+        used = thin_copytree(case_dir / "constant", output_dir / "constant", link=link, methods=STAGE_METHODS)
+        logging.info(f"Applied constant overrides from {case_dir}/constant: {dict(used)}")
     if (case_dir / "0.orig").exists():
-        if (output_dir / "0.orig").exists():
-             shutil.rmtree(output_dir / "0.orig") # Replace entirely to avoid mixing
-        shutil.copytree(case_dir / "0.orig", output_dir / "0.orig")
+        if features.get("warm_start"):
+            # Warm-start fields (see warm_start.py) replace only the fields they cover
+            shutil.copytree(case_dir / "0.orig", output_dir / "0.orig", dirs_exist_ok=True)
+        else:
+            if (output_dir / "0.orig").exists():
+                 shutil.rmtree(output_dir / "0.orig") # Replace entirely to avoid mixing
+            shutil.copytree(case_dir / "0.orig", output_dir / "0.orig")
         logging.info(f"Applied 0.orig overrides from {case_dir}/0.orig")
+
+    # Predicted mesh size and memory (see cell_estimate.py): a case over its
+    # memory_budget (GB per rank) is rejected before anything is meshed
+    if (output_dir / "system" / "blockMeshDict").exists():
+        estimate = estimate_case(output_dir, parameters.get("scale"))
+        log_estimate(estimate)
+        write_estimate(output_dir, estimate)
+        try:
+            check_memory(estimate, parameters.get("memory_budget"))
+        except ValueError:
+            shutil.rmtree(output_dir)
+            raise
         
     logging.info(f"Case preparation complete: {output_dir}")
 
+@click.command()
+@click.argument("toml_path", type=click.Path(exists=True, path_type=Path))
+@click.argument("output_dir", type=click.Path(path_type=Path))
+@click.option("--incremental", is_flag=True, help="Only rewrite files whose content changed")
+def prepare_case(toml_path: Path, output_dir: Path, incremental: bool):
+    """
+    Prepare an OpenFOAM case directory based on a TOML configuration.
+    """
+    prepare(toml_path, output_dir, incremental=incremental)
+
 if __name__ == "__main__":
     prepare_case()
@@ -0,0 +1,64 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import click
+
+from prepare_case import prepare
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+
+def case_output_dir(toml_path, output_root):
+    """Build directory of a case: cases/<name>/case.toml and cases/<name>.toml both go to <output_root>/<name>."""
+    toml_path = Path(toml_path)
+    name = toml_path.parent.name if toml_path.name == "case.toml" else toml_path.stem
+    return Path(output_root) / name
+
+
+def _prepare_chunk(pairs, incremental=False):
+    # One worker renders a whole chunk, reusing its compiled templates
+    for toml_path, output_dir in pairs:
+        prepare(toml_path, output_dir, incremental=incremental)
+    return len(pairs)
+
+
+def prepare_cases(toml_paths, output_root, jobs=1, incremental=False):
+    """
+    Prepare many cases in one go, byte-for-byte as prepare_case.py would.
+
+    One interpreter (or one per worker with jobs > 1) loads and compiles the
+    templates once for all cases, instead of once per case and process.
+    With `incremental`, existing build directories only get the files
+    whose content changed (see prepare_case.prepare).
+    Returns the prepared build directories.
+    """
+    pairs = [(Path(t), case_output_dir(t, output_root)) for t in toml_paths]
+    jobs = min(jobs or os.cpu_count() or 1, len(pairs))
+    if jobs <= 1:
+        _prepare_chunk(pairs, incremental)
+    else:
+        chunks = [pairs[i::jobs] for i in range(jobs)]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            list(pool.map(_prepare_chunk, chunks, [incremental] * jobs))
+    logging.info(f"Prepared {len(pairs)} case(s) in {output_root}")
+    return [output_dir for _, output_dir in pairs]
+
+
+@click.command()
+@click.argument("toml_paths", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--output-root", type=click.Path(file_okay=False, path_type=Path), default=Path("build"), show_default=True,
+              help="Directory the case directories are created in")
+@click.option("--jobs", "-j", default=1, show_default=True, help="Worker processes (0: all cores)")
+@click.option("--incremental", is_flag=True, help="Only rewrite files whose content changed")
+def main(toml_paths, output_root: Path, jobs: int, incremental: bool):
+    """
+    Prepare the OpenFOAM cases of all TOML_PATHS (see prepare_case.py).
+    """
+    prepare_cases(toml_paths, output_root, jobs=jobs, incremental=incremental)
+
+
+if __name__ == "__main__":
+    main()
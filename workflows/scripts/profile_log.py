@@ -0,0 +1,129 @@
+import json
+import logging
+from pathlib import Path
+
+import click
+import pandas as pd
+
+from foam_log import iter_step_profiles
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+# A step whose wait (ClockTime - ExecutionTime growth) exceeds this multiple of
+# the median wait is counted as an I/O step (field write, restart, MPI stall)
+IO_STEP_FACTOR = 5.0
+
+
+def load_profile(log_path):
+    """
+    Per-time-step profile of a solver log as a tidy DataFrame.
+
+    `step_execution` / `step_clock` are the CPU and wall seconds of each
+    step; `step_wait` (their difference) is time spent outside computation,
+    i.e. file I/O and MPI waits.
+    """
+    df = pd.DataFrame(list(iter_step_profiles(log_path)))
+    if df.empty:
+        return df
+
+    df['step_execution'] = df['execution_time'].diff().fillna(df['execution_time'])
+    df['step_clock'] = df['clock_time'].diff().fillna(df['clock_time'])
+    df['step_wait'] = (df['step_clock'] - df['step_execution']).clip(lower=0.0)
+    return df
+
+
+def equations(df):
+    """Equations that appear in a profile, in log order."""
+    return [column[:-len('_iterations')] for column in df.columns
+            if column.endswith('_iterations') and column != 'pimple_iterations']
+
+
+def summarize_profile(df):
+    """
+    Summary of where wall time goes in a profiled run.
+
+    The log does not time individual linear solves, so the split between
+    equations is reported as each equation's share of all linear-solver
+    iterations; that share is the usual proxy for its share of solve time.
+    """
+    clock = float(df['clock_time'].iloc[-1])
+    execution = float(df['execution_time'].iloc[-1])
+    simulated = float(df['time'].iloc[-1] - df['time'].iloc[0])
+    wait = df['step_wait']
+    io_steps = wait > IO_STEP_FACTOR * max(float(wait.median()), 1e-9)
+
+    eqs = equations(df)
+    total_iterations = sum(float(df[f'{eq}_iterations'].sum()) for eq in eqs)
+    per_equation = {}
+    for eq in eqs:
+        iterations = float(df[f'{eq}_iterations'].sum())
+        per_equation[eq] = {
+            'solver': str(df[f'{eq}_solver'].dropna().iloc[-1]),
+            'iterations': int(iterations),
+            'iterations_per_step': float(df[f'{eq}_iterations'].mean()),
+            'iteration_share': iterations / total_iterations if total_iterations else 0.0,
+            'mean_initial_residual': float(df[f'{eq}_initial_residual'].mean()),
+        }
+
+    summary = {
+        'steps': int(len(df)),
+        'simulated_time': simulated,
+        'mean_deltaT': float(df['deltaT'].mean()) if 'deltaT' in df else None,
+        'max_courant': float(df['courant_max'].max()) if 'courant_max' in df else None,
+        'max_interface_courant': float(df['interface_courant_max'].max()) if 'interface_courant_max' in df else None,
+        'mean_pimple_iterations': float(df['pimple_iterations'].mean()),
+        'clock_time': clock,
+        'execution_time': execution,
+        'wall_per_simulated_second': clock / simulated if simulated > 0 else None,
+        'wait_fraction': (clock - execution) / clock if clock > 0 else 0.0,
+        'mesh_update_fraction': float(df['mesh_update_time'].sum()) / execution if execution > 0 else 0.0,
+        'io_steps': int(io_steps.sum()),
+        'io_step_wait': float(wait[io_steps].sum()),
+        'equations': per_equation,
+    }
+    return summary
+
+
+def log_summary(summary):
+    """Write a short human-readable breakdown to the log."""
+    logging.info(f"{summary['steps']} steps over {summary['simulated_time']:g} s simulated, "
+                 f"mean deltaT {summary['mean_deltaT'] or float('nan'):.3g} s, max Co {summary['max_courant'] or float('nan'):.3g}")
+    logging.info(f"Wall time {summary['clock_time']:.1f} s "
+                 f"({summary['wall_per_simulated_second'] or float('nan'):.1f} s per simulated s)")
+    logging.info(f"  I/O + MPI wait: {100 * summary['wait_fraction']:.1f}% "
+                 f"({summary['io_steps']} I/O-heavy steps, {summary['io_step_wait']:.1f} s)")
+    logging.info(f"  Mesh motion:    {100 * summary['mesh_update_fraction']:.1f}% of execution time")
+    ranked = sorted(summary['equations'].items(), key=lambda item: item[1]['iteration_share'], reverse=True)
+    for eq, stats in ranked:
+        logging.info(f"  {eq:<18} {stats['solver']:<16} {100 * stats['iteration_share']:5.1f}% of iterations, "
+                     f"{stats['iterations_per_step']:.1f} per step")
+
+
+@click.command()
+@click.argument("log_path", type=click.Path(exists=True, path_type=Path))
+@click.option("--output-dir", type=click.Path(path_type=Path), default=None, help="Where to write the profile (default: next to the log)")
+def profile(log_path: Path, output_dir: Path):
+    """
+    Break a solver log down per time step and summarize where wall time goes.
+    Writes <log>.profile.csv (one row per step) and <log>.profile.json.
+    """
+    output_dir = output_dir or log_path.parent
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    df = load_profile(log_path)
+    if df.empty:
+        raise ValueError(f"No completed time steps found in {log_path}")
+
+    summary = summarize_profile(df)
+    csv_path = output_dir / f"{log_path.name}.profile.csv"
+    json_path = output_dir / f"{log_path.name}.profile.json"
+    df.to_csv(csv_path, index=False)
+    json_path.write_text(json.dumps(summary, indent=2))
+
+    log_summary(summary)
+    logging.info(f"Saved per-step profile to {csv_path} and summary to {json_path}")
+
+
+if __name__ == "__main__":
+    profile()
@@ -0,0 +1,179 @@
+"""
+History of finished runs and a runtime model fitted on it.
+
+Every finished run appends one record to results/run_history.jsonl: cell
+count, rank count, Froude number, speed, simulated end time, mean deltaT,
+number of time steps and wall time. The model splits a run's wall time into
+the number of time steps and the cost of one step:
+
+    steps      = endTime / deltaT,   log deltaT = d0 + d1 log U + d2 log cells
+    step cost  = serial cost * (s + (1 - s) / ranks),   log serial cost = c0 + c1 log cells
+
+A faster case takes smaller Courant-limited steps, a finer mesh takes both
+smaller and more expensive ones. The exponents are fitted by least squares,
+pulled towards their physical values (d1 = -1, d2 = -1/3, c1 = 1) by a ridge
+penalty, so a handful of runs at one mesh size still gives sane predictions
+and a varied history overrides the priors.
+"""
+import json
+import logging
+from pathlib import Path
+
+import click
+import numpy as np
+import toml
+
+from foam_case import read_cell_count, read_number_of_subdomains
+from foam_log import iter_time_steps
+from sweep_scheduler import SERIAL_FRACTION, parallel_runtime
+from warm_start import is_finished
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+HISTORY_FILE = Path("results/run_history.jsonl")
+# Prior exponents: Courant-limited deltaT ~ cell size / U with cell size ~ cells^(-1/3),
+# and step cost linear in the cell count
+DELTA_T_PRIOR = np.array([-1.0, -1.0 / 3.0])
+STEP_COST_PRIOR = np.array([1.0])
+RIDGE = 1.0
+
+
+def run_record(run_dir, config):
+    """History record of the finished run in `run_dir`, or None without usable steps."""
+    run_dir = Path(run_dir)
+    steps = list(iter_time_steps(run_dir / "log.foamRun"))
+    # A resumed run appends to the log and restarts its clock: only the last
+    # attempt has a consistent wall time
+    restarts = [i for i in range(1, len(steps)) if steps[i][2] < steps[i - 1][2]]
+    if restarts:
+        steps = steps[restarts[-1]:]
+    if len(steps) < 2:
+        return None
+    parameters = config.get("parameters", {})
+    times = [step[0] for step in steps]
+    processors = list(run_dir.glob("processor[0-9]*"))
+    return {
+        "case": config.get("meta", {}).get("name", run_dir.name),
+        "cells": read_cell_count(run_dir / "constant" / "polyMesh"),
+        "ranks": len(processors) or read_number_of_subdomains(run_dir) or 1,
+        "froude": parameters.get("froude"),
+        "velocity": parameters.get("velocity"),
+        "end_time": times[-1],
+        "mean_delta_t": (times[-1] - times[0]) / (len(times) - 1),
+        "steps": len(steps),
+        # ClockTime includes I/O and waiting, which is what a schedule has to budget for
+        "wall_time": steps[-1][2],
+    }
+
+
+def load_history(path=HISTORY_FILE):
+    """All records of the history file."""
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def record_run(run_dir, config_path, path=HISTORY_FILE):
+    """
+    Append the run in `run_dir` to the history if it finished and is not
+    recorded yet. Returns the record, or None.
+    """
+    if not is_finished(run_dir):
+        logging.info(f"{run_dir} has not finished; not recorded")
+        return None
+    record = run_record(run_dir, toml.load(config_path))
+    if record is None or not record["cells"] or not record["velocity"]:
+        logging.warning(f"{run_dir} lacks a cell count, speed or time steps; not recorded")
+        return None
+    if any(r["case"] == record["case"] and r["wall_time"] == record["wall_time"] for r in load_history(path)):
+        return None
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    logging.info(f"Recorded {record['case']}: {record['steps']} steps, {record['wall_time']:.0f} s on {record['ranks']} ranks")
+    return record
+
+
+def _ridge_fit(features, target, prior, ridge=RIDGE):
+    """Least squares for target = c0 + features @ c, with c pulled towards `prior`."""
+    n, k = features.shape
+    design = np.column_stack([np.ones(n), features])
+    # Penalty rows ridge * (c - prior) = 0; the intercept is left free
+    penalty = np.column_stack([np.zeros(k), ridge * np.eye(k)])
+    coefficients, *_ = np.linalg.lstsq(np.vstack([design, penalty]), np.concatenate([target, ridge * prior]), rcond=None)
+    return coefficients
+
+
+def fit_runtime_model(records, serial_fraction=SERIAL_FRACTION):
+    """
+    Fit the runtime model on history records. Returns a dict of coefficients,
+    or None without records.
+    """
+    records = [r for r in records if r.get("cells") and r.get("velocity") and r.get("steps")]
+    if not records:
+        return None
+    cells = np.log([r["cells"] for r in records])
+    velocity = np.log([r["velocity"] for r in records])
+    delta_t = np.log([r["mean_delta_t"] for r in records])
+    # Wall time of one step on one rank, undoing each run's parallel speed-up
+    serial_cost = np.log([r["wall_time"] / r["steps"] / parallel_runtime(1.0, r["ranks"], serial_fraction) for r in records])
+    return {
+        "delta_t": _ridge_fit(np.column_stack([velocity, cells]), delta_t, DELTA_T_PRIOR).tolist(),
+        "step_cost": _ridge_fit(cells[:, None], serial_cost, STEP_COST_PRIOR).tolist(),
+        "serial_fraction": serial_fraction,
+        "n_runs": len(records),
+    }
+
+
+def predict_runtime(model, cells, end_time, velocity, ranks=1):
+    """Predicted wall seconds of a case on `ranks` ranks."""
+    d0, d1, d2 = model["delta_t"]
+    c0, c1 = model["step_cost"]
+    delta_t = np.exp(d0 + d1 * np.log(velocity) + d2 * np.log(cells))
+    serial_step = np.exp(c0 + c1 * np.log(cells))
+    return float(parallel_runtime(end_time / delta_t * serial_step, ranks, model["serial_fraction"]))
+
+
+def rebuild_history(results_dir, cases_dir, path=HISTORY_FILE):
+    """Record every finished run under `results_dir` that has a case.toml in `cases_dir`."""
+    recorded = []
+    for run_dir in sorted(Path(results_dir).iterdir()):
+        config_path = Path(cases_dir) / run_dir.name / "case.toml"
+        if run_dir.is_dir() and config_path.exists():
+            record = record_run(run_dir, config_path, path)
+            if record is not None:
+                recorded.append(record)
+    return recorded
+
+
+@click.group()
+def cli():
+    """History of finished runs, for runtime prediction."""
+    pass
+
+
+@cli.command()
+@click.argument("run_dir", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option("--config", "config_path", type=click.Path(exists=True, path_type=Path), required=True, help="case.toml of the case")
+@click.option("--history", type=click.Path(path_type=Path), default=HISTORY_FILE, show_default=True)
+def record(run_dir: Path, config_path: Path, history: Path):
+    """Add the finished run in RUN_DIR to the history."""
+    record_run(run_dir, config_path, history)
+
+
+@cli.command()
+@click.option("--results-dir", type=click.Path(exists=True, file_okay=False, path_type=Path), default=Path("results"), show_default=True)
+@click.option("--cases-dir", type=click.Path(exists=True, file_okay=False, path_type=Path), default=Path("cases"), show_default=True)
+@click.option("--history", type=click.Path(path_type=Path), default=HISTORY_FILE, show_default=True)
+def rebuild(results_dir: Path, cases_dir: Path, history: Path):
+    """Record every finished run that is not in the history yet."""
+    recorded = rebuild_history(results_dir, cases_dir, history)
+    logging.info(f"Added {len(recorded)} run(s) to {history}")
+
+
+if __name__ == "__main__":
+    cli()
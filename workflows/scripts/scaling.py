@@ -0,0 +1,122 @@
+"""
+Strong-scaling benchmarks: how a case speeds up with its rank count.
+
+The same short case is run at several rank counts and each run's speed is
+measured as wall seconds per simulated second (T). An Amdahl curve
+T(r) = T1 * (s + (1 - s) / r) is fitted to the runs, and the rank count to
+use is read from the measurements themselves: the fastest run whose cost
+(core-seconds per simulated second, r * T) stays within 1 / min_efficiency
+of the cheapest run.
+
+Results are kept in one JSON file, keyed by machine and mesh cell count:
+
+    {"<hostname>": {"<cells>": {"runs": [...], "serial_time": ..., "serial_fraction": ...,
+                                "recommended_ranks": ..., ...}}}
+
+Sweeps look up the entry for their machine with the nearest cell count (see
+sweep_velocity.plan_ranks).
+"""
+import json
+import logging
+import math
+import os
+import platform
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+SCALING_FILE = Path("results/scaling_benchmarks.json")
+BENCHMARK_RANKS = (1, 2, 4, 8, 16, 32)
+# A run may cost this much more core time than the cheapest one and still be recommended
+MIN_EFFICIENCY = 0.7
+
+
+def machine_id():
+    """Key of the machine the benchmarks run on."""
+    return platform.node() or "unknown"
+
+
+def fit_amdahl(ranks, wall_per_sim):
+    """
+    Least-squares fit of T(r) = a + b / r to measured speeds.
+    Returns (serial time T1 = a + b, serial fraction a / T1).
+    """
+    ranks = np.asarray(ranks, dtype=float)
+    wall_per_sim = np.asarray(wall_per_sim, dtype=float)
+    if len(ranks) < 2 or len(np.unique(ranks)) < 2:
+        # One rank count says nothing about scaling; treat it as perfectly parallel
+        return float(np.mean(wall_per_sim * ranks)), 0.0
+    design = np.column_stack([np.ones_like(ranks), 1.0 / ranks])
+    (a, b), *_ = np.linalg.lstsq(design, wall_per_sim, rcond=None)
+    a, b = max(a, 0.0), max(b, 0.0)
+    serial_time = a + b
+    return float(serial_time), float(a / serial_time) if serial_time > 0 else 0.0
+
+
+def recommend_ranks(runs, min_efficiency=MIN_EFFICIENCY):
+    """
+    Rank count to run at: the fastest run whose core-seconds per simulated
+    second are at most 1 / `min_efficiency` times those of the cheapest run.
+    """
+    cheapest = min(run['ranks'] * run['wall_per_sim'] for run in runs)
+    affordable = [run for run in runs if run['ranks'] * run['wall_per_sim'] <= cheapest / min_efficiency]
+    return min(affordable, key=lambda run: (run['wall_per_sim'], run['ranks']))['ranks']
+
+
+def summarize(runs, cells, velocity, end_time, min_efficiency=MIN_EFFICIENCY):
+    """Scaling entry for a set of benchmark runs (dicts with ranks and wall_per_sim)."""
+    runs = sorted(runs, key=lambda run: run['ranks'])
+    cheapest = min(run['ranks'] * run['wall_per_sim'] for run in runs)
+    for run in runs:
+        run['cost_per_sim'] = run['ranks'] * run['wall_per_sim']
+        run['efficiency'] = cheapest / run['cost_per_sim']
+    serial_time, serial_fraction = fit_amdahl([run['ranks'] for run in runs], [run['wall_per_sim'] for run in runs])
+    return {
+        'cells': cells,
+        'velocity': velocity,
+        'end_time': end_time,
+        'cpu_count': os.cpu_count(),
+        'date': datetime.now().isoformat(timespec="seconds"),
+        'runs': runs,
+        'serial_time': serial_time,
+        'serial_fraction': serial_fraction,
+        'min_efficiency': min_efficiency,
+        'recommended_ranks': recommend_ranks(runs, min_efficiency),
+    }
+
+
+def save_scaling(entry, path=SCALING_FILE, machine=None):
+    """Add (or replace) the entry for this machine and cell count in the scaling file."""
+    path = Path(path)
+    data = json.loads(path.read_text()) if path.exists() else {}
+    data.setdefault(machine or machine_id(), {})[str(entry['cells'])] = entry
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=2, sort_keys=True))
+    logging.info(f"Scaling results saved to {path}")
+
+
+def load_scaling(cells=None, path=SCALING_FILE, machine=None):
+    """
+    Scaling entry of this machine for the cell count nearest to `cells`
+    (on a log scale), or None when the machine has no benchmark.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    entries = json.loads(path.read_text()).get(machine or machine_id(), {})
+    if not entries:
+        return None
+    if cells is None:
+        return max(entries.values(), key=lambda entry: entry['date'])
+    return min(entries.values(), key=lambda entry: abs(math.log(entry['cells'] / cells)))
+
+
+def log_scaling(entry):
+    """Log the runs and the fit of a scaling entry."""
+    logging.info(f"Strong scaling at {entry['cells']} cells:")
+    for run in entry['runs']:
+        marker = "  <- recommended" if run['ranks'] == entry['recommended_ranks'] else ""
+        logging.info(f"  {run['ranks']:>3} ranks  {run['wall_per_sim']:10.3g} s/s  "
+                     f"{run['cost_per_sim']:10.3g} core-s/s  efficiency {run['efficiency']:5.2f}{marker}")
+    logging.info(f"Amdahl fit: serial {entry['serial_time']:.3g} s/s, serial fraction {entry['serial_fraction']:.3f}")
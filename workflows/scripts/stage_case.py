@@ -0,0 +1,71 @@
+import logging
+from pathlib import Path
+
+import click
+
+from mesh_cache import mesh_key, meshing_inputs
+from thin_copy import sync_tree, thin_copytree
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+# Inputs nothing in the Allrun writes to: shared with the build directory.
+# (The scaled STL is written to a new file and renamed over the link.)
+IMMUTABLE_INPUTS = ["constant/polyMesh/*", "constant/polyMesh/*/*", "constant/triSurface/*.stl", "constant/triSurface/*.stl.gz"]
+
+# Symlinks would point at host paths that do not exist inside the container
+STAGE_METHODS = ("reflink", "hardlink", "copy")
+
+# What the meshing stage of the Allrun leaves in a run directory
+MESH_OUTPUTS = [
+    "constant/polyMesh/*", "constant/polyMesh/*/*", "constant/extendedFeatureEdgeMesh/*", "constant/triSurface/*.eMesh",
+    "log.blockMesh", "log.snappyHexMesh", "log.surfaceFeatures", "log.surfaceFeatureExtract",
+]
+# Meshing-input key of the build directory a run directory was staged from.
+# The run directory itself cannot be hashed: the Allrun rescales its STL and
+# adds the feature edges to constant/triSurface.
+MESH_KEY_FILE = ".mesh_key"
+
+
+def stage_case(build_dir, run_dir):
+    """
+    Create the run directory of a case from its build directory.
+
+    The mesh and geometry are reflinked or hardlinked (read-only), so
+    staging costs the same for any mesh size; the small dictionaries, 0.orig
+    and the Allrun are copied and stay writable. Time and processor
+    directories are created by the solver itself.
+
+    An existing run directory is updated in place: unchanged inputs are left
+    alone and results of the previous run are removed. A mesh the previous
+    run generated is kept when the meshing inputs did not change, so that
+    e.g. a new endTime does not remesh (the Allrun skips an existing mesh).
+    """
+    build_dir, run_dir = Path(build_dir), Path(run_dir)
+    key = mesh_key(meshing_inputs(build_dir, {}))
+    if not run_dir.exists():
+        used = thin_copytree(build_dir, run_dir, link=IMMUTABLE_INPUTS, methods=STAGE_METHODS)
+        (run_dir / MESH_KEY_FILE).write_text(key)
+        logging.info(f"Staged {build_dir} in {run_dir}: {dict(used)}")
+        return used
+
+    key_file = run_dir / MESH_KEY_FILE
+    same_mesh = key_file.exists() and key_file.read_text() == key
+    used = sync_tree(build_dir, run_dir, link=IMMUTABLE_INPUTS, keep=MESH_OUTPUTS if same_mesh else (), methods=STAGE_METHODS)
+    key_file.write_text(key)
+    logging.info(f"Restaged {build_dir} in {run_dir} ({'kept' if same_mesh else 'discarded'} the previous mesh): {dict(used)}")
+    return used
+
+
+@click.command()
+@click.argument("build_dir", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.argument("run_dir", type=click.Path(path_type=Path))
+def main(build_dir: Path, run_dir: Path):
+    """
+    Stage BUILD_DIR as RUN_DIR: link the mesh and geometry, copy the rest.
+    """
+    stage_case(build_dir, run_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Reading and writing STL surfaces as NumPy arrays.
+
+A surface is an (n, 3, 3) float array of triangles (triangle, corner, xyz).
+Binary STL is written in one buffer: an 80-byte header, the triangle count
+and one 50-byte record per triangle (normal, three vertices, attribute).
+Files ending in .gz are (de)compressed on the fly.
+"""
+import gzip
+import re
+from pathlib import Path
+
+import numpy as np
+
+HEADER_SIZE = 80
+RECORD = np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")])
+VERTEX_PATTERN = re.compile(rb"vertex\s+(\S+)\s+(\S+)\s+(\S+)")
+
+
+def _open(path, mode):
+    path = Path(path)
+    return gzip.open(path, mode) if path.suffix == ".gz" else open(path, mode)
+
+
+def facet_normals(triangles):
+    """Unit normals of (n, 3, 3) triangles (right-hand rule); zero for degenerate triangles."""
+    triangles = np.asarray(triangles, dtype=float)
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+
+def write_binary_stl(path, triangles, header="numpy binary STL"):
+    """Write (n, 3, 3) triangles as a binary STL."""
+    triangles = np.asarray(triangles, dtype=float)
+    records = np.zeros(len(triangles), dtype=RECORD)
+    records["normal"] = facet_normals(triangles)
+    records["vertices"] = triangles
+    buffer = header.encode()[:HEADER_SIZE].ljust(HEADER_SIZE, b" ")
+    buffer += np.uint32(len(triangles)).tobytes() + records.tobytes()
+    with _open(path, "wb") as f:
+        f.write(buffer)
+
+
+def write_ascii_stl(path, triangles, name="surface"):
+    """Write (n, 3, 3) triangles as an ASCII STL, formatted in one pass."""
+    triangles = np.asarray(triangles, dtype=float)
+    normals = facet_normals(triangles)
+    values = np.concatenate([normals, triangles.reshape(-1, 9)], axis=1)
+    facet = ("facet normal {} {} {}\n  outer loop\n    vertex {} {} {}\n    vertex {} {} {}\n"
+             "    vertex {} {} {}\n  endloop\nendfacet\n")
+    body = "".join(facet.format(*row) for row in values.tolist())
+    with _open(path, "wt") as f:
+        f.write(f"solid {name}\n{body}endsolid {name}\n")
+
+
+def read_stl(path):
+    """Triangles of a binary or ASCII STL (optionally gzipped) as an (n, 3, 3) array."""
+    with _open(path, "rb") as f:
+        data = f.read()
+    if len(data) >= HEADER_SIZE + 4:
+        count = int(np.frombuffer(data, dtype="<u4", count=1, offset=HEADER_SIZE)[0])
+        if len(data) == HEADER_SIZE + 4 + count * RECORD.itemsize:
+            records = np.frombuffer(data, dtype=RECORD, count=count, offset=HEADER_SIZE + 4)
+            return records["vertices"].astype(float)
+    vertices = np.array(VERTEX_PATTERN.findall(data), dtype=float)
+    if len(vertices) % 3:
+        raise ValueError(f"{path}: vertex count {len(vertices)} is not a multiple of 3")
+    return vertices.reshape(-1, 3, 3)
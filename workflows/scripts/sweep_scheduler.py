@@ -0,0 +1,158 @@
+"""
+Pack the cases of a sweep onto a fixed core budget.
+
+Each case gets a rank count, the threads of its solver job, and a single
+Snakemake run with the whole budget as --cores runs the cases side by side,
+so a 64-core node runs several 8- or 16-rank jobs at once instead of one at
+a time.
+
+Runtime model: with a Courant-limited time step the number of steps grows
+with endTime * U, and each step costs in proportion to the cell count, so a
+case needs work W = cells * endTime * U. On r ranks it takes
+W * (s + (1 - s) / r) (Amdahl, serial fraction s). A benchmark log, when
+available, turns these relative estimates into seconds.
+
+Candidate allocations (a common rank cap, or ranks balanced so that all
+cases run at once and finish together) are compared by simulating the
+schedule, and the one with the shortest makespan is kept. The simulation
+starts jobs longest first (the highest Froude numbers) and lets a smaller
+job go first when the next one does not fit the free cores. Snakemake
+follows the same rules with the plan order as job priorities (see the
+solve rules of the Snakefile).
+"""
+import heapq
+import logging
+
+# Below this many cells per rank communication dominates and speed-up stalls
+MIN_CELLS_PER_RANK = 20_000
+SERIAL_FRACTION = 0.05
+# Cell count assumed when no mesh is available yet (dry runs, first sweep)
+DEFAULT_CELLS = 2_000_000
+
+
+def parallel_runtime(work, ranks, serial_fraction=SERIAL_FRACTION):
+    """Runtime of `work` (serial seconds or relative units) on `ranks` ranks."""
+    return work * (serial_fraction + (1.0 - serial_fraction) / ranks)
+
+
+def max_useful_ranks(cells, budget, min_cells_per_rank=MIN_CELLS_PER_RANK):
+    """Largest rank count that keeps at least `min_cells_per_rank` cells per rank."""
+    return max(1, min(budget, int(cells // min_cells_per_rank)))
+
+
+def simulate_schedule(jobs, budget):
+    """
+    Start times of `jobs` (dicts with name, ranks, runtime) on `budget` cores.
+
+    Jobs are taken in list order; whenever cores free up, the first waiting
+    job that fits is started. Returns ({name: start}, makespan).
+    """
+    pending = list(jobs)
+    running = []  # heap of (end, ranks)
+    free = budget
+    now = 0.0
+    starts = {}
+
+    while pending:
+        fitting = next((job for job in pending if job['ranks'] <= free), None)
+        if fitting is None:
+            end, ranks = heapq.heappop(running)
+            now, free = end, free + ranks
+            continue
+        pending.remove(fitting)
+        starts[fitting['name']] = now
+        free -= fitting['ranks']
+        heapq.heappush(running, (now + fitting['runtime'], fitting['ranks']))
+
+    makespan = max((end for end, _ in running), default=0.0)
+    return starts, makespan
+
+
+def candidate_caps(budget, n_jobs):
+    """Rank caps worth trying: powers of two and even shares of the budget."""
+    caps = {budget // k for k in range(1, n_jobs + 1)}
+    power = 1
+    while power <= budget:
+        caps.add(power)
+        power *= 2
+    return sorted(cap for cap in caps if cap >= 1)
+
+
+def balanced_ranks(work, limits, budget, serial_fraction=SERIAL_FRACTION):
+    """
+    Ranks that let every case run at once with the shortest longest runtime.
+
+    Starting from one rank each, the spare cores go one at a time to the case
+    that is currently slowest. Returns None when the cases outnumber the cores.
+    """
+    if len(work) > budget:
+        return None
+    ranks = {name: 1 for name in work}
+    for _ in range(budget - len(work)):
+        growable = [name for name in work if ranks[name] < limits[name]]
+        if not growable:
+            break
+        slowest = max(growable, key=lambda name: parallel_runtime(work[name], ranks[name], serial_fraction))
+        ranks[slowest] += 1
+    return ranks
+
+
+def plan_sweep(cases, budget, serial_fraction=SERIAL_FRACTION, min_cells_per_rank=MIN_CELLS_PER_RANK):
+    """
+    Assign ranks and a start order to the cases of a sweep.
+
+    `cases` maps case name to a dict with `cells`, `end_time`, `velocity` and
+    optionally `seconds_per_work` (benchmark calibration), `min_ranks` (e.g.
+    to fit a memory budget, see cell_estimate.ranks_for_memory) and `ranks`
+    (a fixed rank count, e.g. of a resumed decomposed run). Returns the jobs in
+    planned start order, each with `ranks`, estimated `runtime` and planned `start`,
+    plus the estimated makespan.
+    """
+    if budget < 1:
+        raise ValueError(f"Core budget must be at least 1, got {budget}")
+
+    work = {
+        name: case['cells'] * case['end_time'] * case['velocity'] * case.get('seconds_per_work', 1.0)
+        for name, case in cases.items()
+    }
+    # Longest first: fastest cases need the smallest time steps
+    order = sorted(cases, key=lambda name: work[name], reverse=True)
+    floors = {name: min(case.get('min_ranks') or 1, budget) for name, case in cases.items()}
+    limits = {name: max(floors[name], max_useful_ranks(cases[name]['cells'], budget, min_cells_per_rank)) for name in cases}
+    fixed = {name: min(case['ranks'], budget) for name, case in cases.items() if case.get('ranks')}
+
+    allocations = [{name: min(cap, limits[name]) for name in order} for cap in candidate_caps(budget, len(cases))]
+    balanced = balanced_ranks(work, limits, budget, serial_fraction)
+    if balanced is not None:
+        allocations.append(balanced)
+    for allocation in allocations:
+        allocation.update({name: max(ranks, floors[name]) for name, ranks in allocation.items()})
+        allocation.update(fixed)
+
+    best = None
+    for allocation in allocations:
+        jobs = [
+            {'name': name, 'ranks': allocation[name], 'runtime': parallel_runtime(work[name], allocation[name], serial_fraction)}
+            for name in order
+        ]
+        starts, makespan = simulate_schedule(jobs, budget)
+        # Ties go to the earlier (smaller) cap, which wastes less on parallel overhead
+        if best is None or makespan < best[1] * (1 - 1e-9):
+            best = (jobs, makespan, starts)
+
+    jobs, makespan, starts = best
+    for job in jobs:
+        job['start'] = starts[job['name']]
+    jobs.sort(key=lambda job: job['start'])
+    return jobs, makespan
+
+
+def log_plan(jobs, makespan, budget, unit="s"):
+    """Log the planned schedule."""
+    logging.info(f"Sweep plan on {budget} cores, estimated makespan {makespan:.3g} {unit}:")
+    for job in jobs:
+        logging.info(f"  {job['name']:<16} {job['ranks']:>3} ranks  start {job['start']:10.3g}  runtime {job['runtime']:10.3g}")
+    if unit == "s":
+        core_hours = sum(job['ranks'] * job['runtime'] for job in jobs) / 3600
+        logging.info(f"Makespan {makespan / 3600:.2f} h, {core_hours:.1f} core-hours")
+
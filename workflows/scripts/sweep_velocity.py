@@ -1,3 +1,4 @@
+import os
 import shutil
 import subprocess
 import copy
@@ -8,6 +9,19 @@ import toml
 import logging
 from typing import List, Dict
 
+from adaptive_sweep import assess, candidate_grid, fit_surrogate, next_points, predict
+from cell_estimate import ranks_for_memory, read_estimate
+from extract_data import OUTPUT_FILE as SWEEP_RESULTS, extract_resistance
+from foam_case import latest_time, read_cell_count, read_number_of_subdomains, set_number_of_subdomains
+from foam_log import iter_time_steps
+from mesh_cache import build_mesh
+from prepare_cases import prepare_cases
+from run_history import fit_runtime_model, load_history, predict_runtime
+from scaling import BENCHMARK_RANKS, MIN_EFFICIENCY, load_scaling, log_scaling, save_scaling, summarize
+from sweep_scheduler import DEFAULT_CELLS, MIN_CELLS_PER_RANK, SERIAL_FRACTION, log_plan, plan_sweep
+from thin_copy import link_file, link_methods, thin_copytree
+from warm_start import finished_cases, is_finished, nearest_seed, seed_case
+
 # Configuration
 CASES_DIR = Path("cases")
 BUILD_DIR = Path("build")
@@ -18,6 +32,7 @@ GEOMETRY_SOURCE = Path("config/geometry/dtc_hull_esi.stl.gz")
 GRAVITY = 9.81
 LENGTH_DTC = 3.0  # Model scale length in meters
 FROUDE_POINTS = [0.10, 0.15, 0.18, 0.20, 0.22, 0.25]
+ADAPTIVE_OUTPUT = RESULTS_DIR / "dtc_adaptive_sweep.csv"
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -36,92 +51,87 @@ def run_command(command, cwd=None):
         raise
 
 def prepare_base_mesh(dry_run=False):
-    """Generate and run a base case solely for mesh generation."""
-    mesh_case_name = f"{BASE_CASE}_mesh_base"
-    mesh_case_path = CASES_DIR / mesh_case_name
-    
-    # Check if we already have a valid mesh source from a previous run
-    # If using results structure:
-    mesh_source_path = RESULTS_DIR / mesh_case_name / "constant" / "polyMesh"
-    if mesh_source_path.exists() and (mesh_source_path / "points").exists():
-        logging.info(f"Using existing base mesh from {mesh_source_path}")
-        return mesh_source_path
-
-    logging.info(f"Preparing base mesh case: {mesh_case_name}")
-    
-    if not dry_run:
-        if mesh_case_path.exists():
-            shutil.rmtree(mesh_case_path)
-        mesh_case_path.mkdir(parents=True)
-        
-        # Clean build
-        if (BUILD_DIR / mesh_case_name).exists():
-           shutil.rmtree(BUILD_DIR / mesh_case_name)
+    """
+    Return the shared base mesh of the sweep.
 
-        # Load base config
-        base_case_path = CASES_DIR / BASE_CASE
-        base_config_path = base_case_path / "case.toml"
-        
-        if not base_config_path.exists():
-            raise FileNotFoundError(f"Base case {BASE_CASE} not found at {base_config_path}")
-            
-        base_config = toml.load(base_config_path)
-            
-        # Create mesh base dir
-        mesh_case_path.mkdir(parents=True, exist_ok=True)
-        
-        # Write temporary mesh base TOML 
-        # We can just copy the file or render a slightly modified one
-        # For simplicity, we just copy it but might assume defaults are fine for meshing
-        shutil.copy(base_config_path, mesh_case_path / "case.toml")
-        
-        # Copy system directory to ensure overrides (like optimized snappyHexMeshDict) are used
-        if (base_case_path / "system").exists():
-            shutil.copytree(base_case_path / "system", mesh_case_path / "system", dirs_exist_ok=True)
-        
-        # Ensure system directory exists for overrides?
-        # Actually prepare_case handles this if we just point to it.
-        # But we might need specific mesh modifications? 
-        # For now, assuming base case mesh settings are what we want.
-
-    # Run prepare_case for the mesh base
-    # We use Snakemake to run just the 'run_case' rule (which triggers prepare)
-    # BUT we need to stop BEFORE running solver if possible?
-    # Our current Allrun runs everything. 
-    # Optimization: We let it run. The "mesh base" case will run a full simulation,
-    # but that's a one-time cost. 
-    # BETTER: just let it run. 
-    
-    log_path = RESULTS_DIR / MESH_BASE_CASE / "log.foamRun"
-    
-    if (RESULTS_DIR / MESH_BASE_CASE / "constant" / "polyMesh" / "points").exists():
-         logging.info(f"Using existing base mesh from {RESULTS_DIR / MESH_BASE_CASE / 'constant' / 'polyMesh'}")
-         return RESULTS_DIR / MESH_BASE_CASE / "constant" / "polyMesh"
+    The base case is prepared like any other case and its mesh taken from
+    the mesh cache (see mesh_cache.py). Only the meshing steps run, and only
+    when no earlier case was meshed from the same geometry, dictionaries and
+    OpenFOAM version.
+    """
+    mesh_case_path = CASES_DIR / MESH_BASE_CASE
+    base_case_path = CASES_DIR / BASE_CASE
+    base_config_path = base_case_path / "case.toml"
 
-    logging.info(f"Preparing base mesh case: {MESH_BASE_CASE}")
-    
-    cmd = [
-        "snakemake",
-        "-j", "1",
-        str(log_path)
-    ]
-    
     if dry_run:
-        logging.info(f"Dry run: Would execute {' '.join(cmd)}")
-        return RESULTS_DIR / MESH_BASE_CASE / "constant" / "polyMesh"  # Fake path
-    
-    subprocess.run(cmd, check=True)
-    
-    return RESULTS_DIR / MESH_BASE_CASE / "constant" / "polyMesh"
+        logging.info(f"[DRY-RUN] Would prepare {MESH_BASE_CASE} and take its mesh from the mesh cache")
+        return None
+
+    if not base_config_path.exists():
+        raise FileNotFoundError(f"Base case {BASE_CASE} not found at {base_config_path}")
+
+    logging.info(f"Preparing base mesh case: {MESH_BASE_CASE}")
+    if mesh_case_path.exists():
+        shutil.rmtree(mesh_case_path)
+    mesh_case_path.mkdir(parents=True)
+    if (BUILD_DIR / MESH_BASE_CASE).exists():
+        shutil.rmtree(BUILD_DIR / MESH_BASE_CASE)
+
+    # The base case settings are what we mesh with
+    shutil.copy(base_config_path, mesh_case_path / "case.toml")
+
+    # Copy system directory to ensure overrides (like optimized snappyHexMeshDict) are used
+    if (base_case_path / "system").exists():
+        shutil.copytree(base_case_path / "system", mesh_case_path / "system", dirs_exist_ok=True)
+
+    # Render the case (prepare_case rule) without running it
+    subprocess.run(["snakemake", "-j", "1", str(BUILD_DIR / MESH_BASE_CASE)], check=True)
+
+    return build_mesh(BUILD_DIR / MESH_BASE_CASE, toml.load(mesh_case_path / "case.toml"))
 
 def ensure_dir(path):
     if not path.exists():
         path.mkdir(parents=True)
 
-def setup_sweep_cases(froude_numbers: List[float], mesh_source_path: Path = None, dry_run: bool = False) -> Dict[str, float]:
+def case_progress(variant_name, froude):
+    """
+    State of a sweep case from an earlier invocation: ("finished", None),
+    ("partial", latest written time) or ("new", None). A case set up for
+    another Froude number counts as new.
+    """
+    config_path = CASES_DIR / variant_name / "case.toml"
+    run_dir = RESULTS_DIR / variant_name
+    if not config_path.exists() or not run_dir.exists():
+        return "new", None
+    if not np.isclose(toml.load(config_path)["parameters"].get("froude", -1), froude, atol=1e-4):
+        return "new", None
+    if is_finished(run_dir):
+        return "finished", None
+    latest = latest_time(run_dir)
+    if latest is not None and float(latest[0]) > 0:
+        return "partial", float(latest[0])
+    return "new", None
+
+def setup_sweep_cases(froude_numbers: List[float], mesh_source_path: Path = None, dry_run: bool = False, warm_start: bool = False,
+                      link_mode: str = "auto", clean: bool = False) -> Dict[str, float]:
     """
     Creates case variants for each Froude number.
     Returns a dictionary mapping case_name -> velocity.
+
+    With warm_start, each variant starts from the latest solution of the
+    finished case nearest in Froude number (see warm_start.py) instead of a
+    calm free surface. Cases of this sweep are rerun, so they are not seeds.
+
+    The base mesh and geometry are linked rather than copied (see
+    thin_copy.py; link_mode "copy" makes full copies). prepare_case and
+    stage_case link them on into build/ and results/, read-only, so every
+    variant shares the one mesh on disk.
+
+    Cases left by an earlier invocation are resumed unless `clean` is set:
+    finished cases are skipped, and partly run cases keep their inputs and
+    results so the solver restarts from the latest written time (controlDict
+    startFrom latestTime) and appends to its force history. Only new cases
+    are (re)created.
     """
     base_case_path = CASES_DIR / BASE_CASE
     base_config_path = base_case_path / "case.toml"
@@ -129,18 +139,52 @@ def setup_sweep_cases(froude_numbers: List[float], mesh_source_path: Path = None
         raise FileNotFoundError(f"Base case {BASE_CASE} configuration not found.")
 
     base_config = toml.load(base_config_path)
+    base_name = base_config['meta']['name']
     length = base_config["parameters"].get("length", 3.0) # Default to 3.0 for DTC
     g = 9.81
     
     case_map = {}
+    variant_names = [f"dtc_fr{int(fr*1000):04d}" for fr in froude_numbers]
+    seeds = {}
+    if warm_start:
+        # Seed fields are only valid on the shared base mesh they were computed on
+        if mesh_source_path and mesh_source_path.exists():
+            seeds = finished_cases(RESULTS_DIR, CASES_DIR, exclude=variant_names)
+        if not seeds:
+            logging.warning("No finished cases on the base mesh to warm start from; starting from 0.orig.")
     
     for fr in froude_numbers:
         vel = fr * (g * length) ** 0.5
         variant_name = f"dtc_fr{int(fr*1000):04d}"
         
         variant_path = CASES_DIR / variant_name
+        seed_name = nearest_seed(fr, seeds)
         
+        status, resume_time = ("new", None) if clean else case_progress(variant_name, fr)
+        if status == "finished":
+            logging.info(f"Skipping finished case: {variant_name} (Fr={fr:.3f})")
+            continue
+        if status == "partial":
+            logging.info(f"Resuming case: {variant_name} (Fr={fr:.3f}) from t={resume_time:g}")
+            if not dry_run:
+                # Only the solver and what follows it rerun; the inputs stay untouched
+                # so Snakemake keeps the staged, meshed and decomposed case
+                for marker in ("log.stage.solve", "log.stage.reconstruct"):
+                    (RESULTS_DIR / variant_name / marker).unlink(missing_ok=True)
+            config = toml.load(variant_path / "case.toml")
+            case_map[variant_name] = {
+                "path": variant_path,
+                "velocity": vel,
+                "froude": fr,
+                "resume_time": resume_time,
+                # processor* directories fix the decomposition of a resumed run
+                "ranks": read_number_of_subdomains(RESULTS_DIR / variant_name) or config["parameters"].get("nProcs"),
+            }
+            continue
+
         logging.info(f"Preparing case: {variant_name} (Fr={fr:.3f}, V={vel:.3f} m/s)")
+        if seed_name:
+            logging.info(f"  Warm start from {seeds[seed_name]['time_dir']} (Fr={seeds[seed_name]['froude']:.3f})")
         
         if not dry_run:
             # Create variant directory
@@ -152,7 +196,7 @@ def setup_sweep_cases(froude_numbers: List[float], mesh_source_path: Path = None
             if (BUILD_DIR / variant_name).exists():
                 shutil.rmtree(BUILD_DIR / variant_name)
             
-            # Clean results directory to force rerun
+            # Clean results directory of a stale or unstarted run to force a rerun
             if (RESULTS_DIR / variant_name).exists():
                 shutil.rmtree(RESULTS_DIR / variant_name)
 
@@ -161,6 +205,9 @@ def setup_sweep_cases(froude_numbers: List[float], mesh_source_path: Path = None
             variant_config['meta']['name'] = variant_name
             variant_config['parameters']['velocity'] = float(f"{vel:.4f}")
             variant_config['parameters']['froude'] = float(f"{fr:.4f}") 
+            if seed_name:
+                variant_config.setdefault('flags', {}).setdefault('features', {})['warm_start'] = True
+                variant_config['meta']['warm_start_source'] = str(seeds[seed_name]['time_dir'])
             
             with open(variant_path / "case.toml", "w") as f:
                 toml.dump(variant_config, f)
@@ -181,24 +228,22 @@ def setup_sweep_cases(froude_numbers: List[float], mesh_source_path: Path = None
                      with open(snappy_path, 'w') as f:
                          f.write(content)
 
-            # Copy Geometry
+            # Link Geometry
             if GEOMETRY_SOURCE.exists():
                  target_geo = variant_path / f"{variant_name}.stl.gz"
-                 shutil.copy(GEOMETRY_SOURCE, target_geo)
-
-            # Copy Pre-generated Mesh if available
-            # NOTE: run_case rule copies BUILD_DIR to RESULTS_DIR.
-            # prepare_case.py populates BUILD_DIR from CASES_DIR.
-            # So we must put the mesh in CASES_DIR for prepare_case to see it?
-            # prepare_case logic: "Overrides from case directory: Copy system/ and constant/"
-            # So if we put polyMesh in cases/{variant}/constant/polyMesh, prepare_case will copy it to build.
-            
+                 link_file(GEOMETRY_SOURCE, target_geo, link_methods(link_mode))
+
+            # Link the pre-generated mesh, if available, as a constant
+            # override; prepare_case links it into build/ in turn
             if mesh_source_path and mesh_source_path.exists():
                 target_mesh_dir = variant_path / "constant" / "polyMesh"
                 if target_mesh_dir.exists():
                     shutil.rmtree(target_mesh_dir)
-                shutil.copytree(mesh_source_path, target_mesh_dir)
-                logging.info(f"Copied mesh from base to {variant_name}")
+                used = thin_copytree(mesh_source_path, target_mesh_dir, methods=link_methods(link_mode))
+                logging.info(f"Linked mesh from base to {variant_name} ({dict(used)})")
+
+            if seed_name:
+                seed_case(variant_path, seeds[seed_name], vel, mesh_dir=mesh_source_path)
             
         case_map[variant_name] = {
             "path": variant_path,
@@ -208,45 +253,155 @@ def setup_sweep_cases(froude_numbers: List[float], mesh_source_path: Path = None
         
     return case_map
 
-def run_sweep(case_map, dry_run=False):
-    """Run simulations for all prepared cases using Snakemake."""
-    
-    targets = [f"results/{name}/log.foamRun" for name in case_map.keys()]
-    
-    # Run sequentially (-j 1) or parallel (-j N)
-    # Since we are reusing mesh, memory overhead is lower, but solver is still heavy.
-    # Keep -j 1 for safety unless requested otherwise.
-    cmd = f"snakemake -j 1 {' '.join(targets)}"
-    
+def benchmark_calibration(cells):
+    """
+    Scheduler settings measured by the strong-scaling benchmark of this
+    machine (see scaling.py), or None when it has not been run.
+
+    The fitted serial time gives seconds per unit of sweep work
+    (cells * endTime * U), the fitted serial fraction the shape of the
+    speed-up, and the recommended rank count the cells per rank below which
+    extra ranks no longer pay off.
+    """
+    entry = load_scaling(cells)
+    if entry is None:
+        return None
+    logging.info(f"Using strong-scaling benchmark at {entry['cells']} cells ({entry['date']}): "
+                 f"serial fraction {entry['serial_fraction']:.3f}, {entry['recommended_ranks']} ranks recommended")
+    return {
+        "seconds_per_work": entry["serial_time"] / (entry["cells"] * entry["velocity"]),
+        "serial_fraction": entry["serial_fraction"],
+        "min_cells_per_rank": entry["cells"] / entry["recommended_ranks"],
+    }
+
+def plan_ranks(case_map, mesh_source_path=None, cores=None):
+    """
+    Choose a rank count and start order for every case under a core budget.
+    Returns the planned jobs in start order (see sweep_scheduler.plan_sweep).
+    """
+    cores = cores or os.cpu_count()
+    history = load_history()
+    cells = read_cell_count(mesh_source_path) if mesh_source_path else None
+    estimate = read_estimate(BUILD_DIR / MESH_BASE_CASE)
+    if cells is None and estimate:
+        # Predicted by prepare_case from the base case's dictionaries
+        cells = estimate["cells"]
+        logging.info(f"No mesh to size the cases from; using the {cells} cells estimated for {MESH_BASE_CASE}.")
+    if cells is None and history:
+        # A dry run has no mesh yet; the last finished run is the best guess
+        cells = history[-1]["cells"]
+        logging.info(f"No mesh to size the cases from; using {cells} cells of the last finished run.")
+    if cells is None:
+        logging.warning(f"No mesh to size the cases from; assuming {DEFAULT_CELLS} cells.")
+        cells = DEFAULT_CELLS
+
+    calibration = benchmark_calibration(cells) or {}
+    serial_fraction = calibration.get("serial_fraction", SERIAL_FRACTION)
+    seconds_per_work = calibration.get("seconds_per_work")
+    # Finished runs predict each case better than one benchmark: they also
+    # capture how the time step shrinks with speed (see run_history.py)
+    model = fit_runtime_model(history, serial_fraction)
+    if model is not None:
+        logging.info(f"Predicting runtimes from {model['n_runs']} finished run(s)")
+
+    cases = {}
+    for name, info in case_map.items():
+        config_path = info["path"] / "case.toml"
+        parameters = toml.load(config_path)["parameters"] if config_path.exists() else {}
+        # Default endTime of templates/base/system/controlDict.j2; a resumed
+        # case only has the rest of its run to go
+        end_time = parameters.get("endTime", 5.0) - info.get("resume_time", 0.0)
+        case_seconds_per_work = seconds_per_work or 1.0
+        if model is not None:
+            serial_seconds = predict_runtime(model, cells, end_time, info["velocity"])
+            case_seconds_per_work = serial_seconds / (cells * end_time * info["velocity"])
+        cases[name] = {
+            "cells": cells,
+            "end_time": end_time,
+            "velocity": info["velocity"],
+            "seconds_per_work": case_seconds_per_work,
+            "ranks": info.get("ranks"),
+            # Enough ranks to keep each within the case's memory_budget (GB)
+            "min_ranks": ranks_for_memory(cells, parameters.get("memory_budget")),
+        }
+
+    jobs, makespan = plan_sweep(cases, cores, serial_fraction=serial_fraction,
+                                min_cells_per_rank=calibration.get("min_cells_per_rank", MIN_CELLS_PER_RANK))
+    log_plan(jobs, makespan, cores, unit="s" if seconds_per_work or model is not None else "(relative units)")
+    return jobs
+
+def apply_ranks(case_map, jobs):
+    """Write each job's rank count into its case.toml and decomposeParDict override."""
+    for job in jobs:
+        if "resume_time" in case_map[job["name"]]:
+            # Rewriting case.toml would make Snakemake redo the case from scratch
+            continue
+        variant_path = case_map[job["name"]]["path"]
+        config_path = variant_path / "case.toml"
+        config = toml.load(config_path)
+        config["parameters"]["nProcs"] = job["ranks"]
+        with open(config_path, "w") as f:
+            toml.dump(config, f)
+
+        # A copied system/decomposeParDict would override the rendered template
+        override = variant_path / "system" / "decomposeParDict"
+        if override.exists():
+            set_number_of_subdomains(override, job["ranks"])
+
+def run_sweep(case_map, dry_run=False, cores=None, mesh_source_path=None):
+    """
+    Run simulations for all prepared cases using Snakemake.
+
+    The cases share a budget of `cores` (default: all cores of the machine).
+    Each case gets its own rank count, and one Snakemake run with `cores`
+    as its budget solves the cases side by side in the planned order
+    (longest first), starting the next one as cores become free.
+    """
+    if not case_map:
+        logging.info("No cases left to run.")
+        return
+    cores = cores or os.cpu_count()
+    jobs = plan_ranks(case_map, mesh_source_path=mesh_source_path, cores=cores)
+
+    # The solver job of each case takes its nProcs as threads and its place in
+    # solve_order as priority (see the Snakefile), so Snakemake keeps the
+    # running ranks within the budget and starts the cases in plan order. A job
+    # killed with its node is left incomplete and must be allowed to rerun, and
+    # a failed case does not stop the others.
+    snakemake = ["snakemake", "--rerun-incomplete", "--keep-going", "--cores", str(cores)]
+    # Priorities only order jobs that are ready at the same time, so every
+    # case is meshed and decomposed before the first solver starts
+    decompose = snakemake + [f"results/{job['name']}/log.stage.decompose" for job in jobs]
+    solve = snakemake + [f"results/{job['name']}/log.stage.reconstruct" for job in jobs]
+    solve += ["--config", f"solve_order={','.join(job['name'] for job in jobs)}"]
+
     if dry_run:
-        logging.info(f"[DRY-RUN] Would execute: {cmd}")
-    else:
-        run_command(cmd)
+        logging.info(f"[DRY-RUN] Would execute: {' '.join(decompose)}")
+        logging.info(f"[DRY-RUN] Would execute: {' '.join(solve)}")
+        return
+
+    apply_ranks(case_map, jobs)
+    # Render all new cases in one process rather than one Snakemake job each;
+    # Snakemake then finds build/<case> up to date. Resumed cases keep theirs,
+    # a newer build would make Snakemake restage and rerun them.
+    fresh = [info["path"] / "case.toml" for info in case_map.values() if "resume_time" not in info]
+    if fresh:
+        prepare_cases(fresh, BUILD_DIR, jobs=min(len(fresh), cores), incremental=True)
+    if subprocess.run(decompose).returncode != 0:
+        # The solve run retries the failed steps and fails the sweep for them
+        logging.error("Meshing or decomposing failed for some cases; solving the others")
+    subprocess.run(solve, check=True)
 
 def parse_execution_time(log_path):
-    """Parse log file to calculate average execution time per simulated second."""
-    # This is a simplified parser. For accurate results, we'd need to parse the time loop.
-    # Assuming 'ExecutionTime = X s' lines exist.
-    times = []
-    sim_times = []
-    
-    with open(log_path, 'r') as f:
-        for line in f:
-            if "ExecutionTime =" in line:
-                parts = line.split()
-                try:
-                    # "ExecutionTime = 123.45 s"
-                    idx = parts.index("ExecutionTime")
-                    times.append(float(parts[idx + 2]))
-                except (ValueError, IndexError):
-                    pass
-            if "Time =" in line and "ExecutionTime" not in line:
-                 parts = line.split()
-                 try:
-                     sim_times.append(float(parts[2]))
-                 except (ValueError, IndexError):
-                     pass
-                     
+    """Parse log file to calculate average wall time per simulated second."""
+    # Single streaming pass over the 'Time =' / 'ClockTime = X s' pairs.
+    # ClockTime, not ExecutionTime (CPU time of the master rank): I/O and MPI
+    # waits grow with the rank count and belong in the scaling fit, as in
+    # run_history.py
+    steps = list(iter_time_steps(log_path))
+    sim_times = [step[0] for step in steps]
+    times = [step[2] for step in steps]
+
     if len(times) < 2 or len(sim_times) < 2:
         return None
 
@@ -263,14 +418,8 @@ def parse_execution_time(log_path):
         
     return delta_wall / delta_sim
 
-def run_benchmark():
-    """Run a single short benchmark case to estimate runtime."""
-    logging.info("Running benchmark...")
-    
-    # 1. Setup a single case with short duration
-    fr = 0.26 # Design speed
-    vel = calculate_velocity(fr)
-    variant_name = f"{BASE_CASE}_benchmark"
+def setup_benchmark_case(variant_name, velocity, n_procs):
+    """Create a short (2 s) copy of the base case that runs on `n_procs` ranks."""
     variant_path = CASES_DIR / variant_name
     
     if variant_path.exists():
@@ -287,14 +436,12 @@ def run_benchmark():
     base_name = base_config['meta']['name'] # Capture original name
     
     # Override for benchmark
-    # Use deep copy or manual dict creation to avoid mutating base_config if reused,
-    # though here it's single use. But for clarity:
-    import copy
     variant_config = copy.deepcopy(base_config)
     variant_config['meta']['name'] = variant_name
-    variant_config['parameters']['velocity'] = float(f"{vel:.4f}")
+    variant_config['parameters']['velocity'] = float(f"{velocity:.4f}")
     variant_config['parameters']['endTime'] = 2.0 
     variant_config['parameters']['writeInterval'] = 1.0
+    variant_config['parameters']['nProcs'] = n_procs
     
     with open(variant_path / "case.toml", "w") as f:
         toml.dump(variant_config, f)
@@ -327,41 +474,127 @@ def run_benchmark():
             shutil.copy(GEOMETRY_SOURCE, target_geo)
     else:
             logging.warning(f"Geometry source not found at {GEOMETRY_SOURCE}")
-        
-    # 2. Run simulation
-    logging.info(f"Executing benchmark simulation: {variant_name}")
-    log_path = RESULTS_DIR / variant_name / "log.foamRun"
-    
-    # Ensure results dir exists
-    (RESULTS_DIR / variant_name).mkdir(parents=True, exist_ok=True)
-    
-    # We use the Snakefile to run just this case
-    # Need to be careful: the Snakefile expects case directories to exist in cases/
-    # We just created cases/kcs_benchmark
-    
-    cmd = f"snakemake -j 1 results/{variant_name}/log.foamRun"
-    run_command(cmd)
-    
-    # 3. Analyze performance
-    if not log_path.exists():
-        logging.error("Benchmark failed: log file not found.")
-        return
 
-    wall_per_sim = parse_execution_time(log_path)
-    
-    if wall_per_sim:
-        logging.info(f"Benchmark Result: {wall_per_sim:.2f} wall-seconds per simulated-second")
-        
-        # Estimate full sweep
-        # 6 cases * 20s simulated time each = 120s simulated
-        # But wait, cases have different endTimes? KCS base says 20.0
-        total_sim_time = 6 * 20.0 
-        estimated_wall_seconds = wall_per_sim * total_sim_time
-        
-        hours = estimated_wall_seconds / 3600
-        logging.info(f"Estimated Total Sweep Time (6 cases, 20s each): {hours:.2f} hours")
-    else:
-        logging.warning("Could not calculate execution speed from logs.")
+    # A copied system/decomposeParDict would override the rendered template
+    override = variant_path / "system" / "decomposeParDict"
+    if override.exists():
+        set_number_of_subdomains(override, n_procs)
+    return variant_config
+
+def run_benchmark(ranks=BENCHMARK_RANKS, min_efficiency=MIN_EFFICIENCY):
+    """
+    Run the same short case at each rank count in `ranks`, fit the scaling
+    curve and store it for sweeps to plan with (see scaling.py).
+
+    Every rank count is its own case; the mesh cache meshes only the first.
+    The runs go one after another so they do not compete for cores.
+    """
+    logging.info("Running strong-scaling benchmark...")
+    ranks = sorted({r for r in ranks if r <= os.cpu_count()})
+    fr = 0.26 # Design speed
+    vel = calculate_velocity(fr)
+
+    runs = []
+    cells = None
+    for n_procs in ranks:
+        variant_name = f"{BASE_CASE}_benchmark_np{n_procs}"
+        variant_config = setup_benchmark_case(variant_name, vel, n_procs)
+
+        logging.info(f"Executing benchmark simulation: {variant_name}")
+        run_command(f"snakemake --cores {n_procs} results/{variant_name}/log.stage.solve")
+
+        log_path = RESULTS_DIR / variant_name / "log.foamRun"
+        wall_per_sim = parse_execution_time(log_path) if log_path.exists() else None
+        if not wall_per_sim:
+            logging.warning(f"Could not calculate execution speed from {log_path}; skipping {n_procs} ranks.")
+            continue
+        logging.info(f"{n_procs} ranks: {wall_per_sim:.2f} wall-seconds per simulated-second")
+        runs.append({'ranks': n_procs, 'wall_per_sim': wall_per_sim})
+        cells = cells or read_cell_count(RESULTS_DIR / variant_name / "constant" / "polyMesh")
+
+    if not runs:
+        logging.error("Benchmark failed: no run produced a usable log.")
+        return None
+    if cells is None:
+        logging.warning(f"Benchmark mesh size unknown; recording it as {DEFAULT_CELLS} cells.")
+        cells = DEFAULT_CELLS
+
+    entry = summarize(runs, cells, vel, variant_config['parameters']['endTime'], min_efficiency)
+    log_scaling(entry)
+    save_scaling(entry)
+
+    # Estimate the default sweep at the recommended rank count: wall time per
+    # simulated second grows with the speed (Courant-limited time step)
+    recommended = next(run for run in entry['runs'] if run['ranks'] == entry['recommended_ranks'])
+    end_time = toml.load(CASES_DIR / BASE_CASE / "case.toml")['parameters'].get('endTime', 5.0)
+    estimated_wall_seconds = sum(recommended['wall_per_sim'] * end_time * calculate_velocity(f) / vel for f in FROUDE_POINTS)
+    hours = estimated_wall_seconds / 3600
+    logging.info(f"Estimated Total Sweep Time ({len(FROUDE_POINTS)} cases, {end_time:g}s each, "
+                 f"{entry['recommended_ranks']} ranks, one at a time): {hours:.2f} hours")
+    return entry
+
+def load_sweep_results(fr_min, fr_max):
+    """Extract all finished sweep cases and return those within [fr_min, fr_max]."""
+    extract_resistance()
+    if not SWEEP_RESULTS.exists():
+        return pd.DataFrame(columns=['case', 'froude', 'velocity', 'force_x'])
+    df = pd.read_csv(SWEEP_RESULTS)
+    df = df[df['case'].str.startswith('dtc_fr') & df['froude'].between(fr_min - 1e-9, fr_max + 1e-9)]
+    return df.dropna(subset=['froude', 'velocity', 'force_x'])
+
+def run_adaptive(fr_min, fr_max, n_seed=3, batch_size=2, max_runs=12, tolerance=0.02, target="power",
+                 cores=None, warm_start=False):
+    """
+    Adaptive sweep: run a few seed points, then keep adding the Froude numbers
+    where the surrogate is least certain until it meets `tolerance` over the
+    whole range or `max_runs` cases have been run (see adaptive_sweep.py).
+    Finished cases from earlier sweeps count as data, so a sweep can resume.
+    """
+    mesh_source_path = prepare_base_mesh()
+    df = load_sweep_results(fr_min, fr_max)
+    seeds = [] if len(df) >= n_seed else [float(fr) for fr in np.round(np.linspace(fr_min, fr_max, n_seed), 3)]
+    pending = [fr for fr in seeds if not np.isclose(df['froude'], fr).any()]
+    runs = 0
+
+    while True:
+        if pending:
+            logging.info(f"Running Froude numbers: {pending}")
+            case_map = setup_sweep_cases(pending, mesh_source_path=mesh_source_path, warm_start=warm_start)
+            run_sweep(case_map, cores=cores, mesh_source_path=mesh_source_path)
+            runs += len(pending)
+            df = load_sweep_results(fr_min, fr_max)
+
+        if len(df) < 2:
+            raise RuntimeError(f"Only {len(df)} finished case(s) in Fr [{fr_min}, {fr_max}]; cannot fit a surrogate.")
+
+        model = fit_surrogate(df['froude'], df['velocity'], df['force_x'])
+        width, converged = assess(model, fr_min, fr_max, LENGTH_DTC, target=target, tolerance=tolerance)
+        if converged:
+            logging.info(f"Surrogate within {100 * tolerance:.1f}% after {len(df)} cases ({runs} run in this sweep).")
+            break
+        if runs >= max_runs:
+            logging.warning(f"Stopping after {runs} runs; {target} uncertainty still +/-{100 * width:.1f}%.")
+            break
+
+        pending = next_points(model, df['froude'], fr_min, fr_max, LENGTH_DTC, target=target,
+                              batch_size=min(batch_size, max_runs - runs))
+        if not pending:
+            logging.warning("No Froude numbers left to sample at the minimum spacing.")
+            break
+
+    grid = candidate_grid(fr_min, fr_max)
+    resistance, resistance_std = predict(model, grid, LENGTH_DTC, "resistance")
+    power, power_std = predict(model, grid, LENGTH_DTC, "power")
+    curve = pd.DataFrame({
+        'froude': grid,
+        'velocity': calculate_velocity(grid),
+        'resistance': resistance,
+        'resistance_std': resistance_std,
+        'power': power,
+        'power_std': power_std,
+    })
+    curve.to_csv(ADAPTIVE_OUTPUT, index=False)
+    logging.info(f"Surrogate curve saved to {ADAPTIVE_OUTPUT}")
 
 import click
 
@@ -371,16 +604,27 @@ def cli():
     pass
 
 @cli.command()
-def benchmark():
-    """Run a single short benchmark case to estimate runtime."""
-    run_benchmark()
+@click.option("--ranks", "-n", multiple=True, type=int, help=f"Rank counts to run (default: {', '.join(map(str, BENCHMARK_RANKS))})")
+@click.option("--min-efficiency", default=MIN_EFFICIENCY, show_default=True,
+              help="Lowest parallel efficiency (vs. the cheapest run) the recommended rank count may have")
+def benchmark(ranks, min_efficiency):
+    """Measure strong scaling of a short case and store it for sweep planning."""
+    run_benchmark(ranks=ranks or BENCHMARK_RANKS, min_efficiency=min_efficiency)
 
 @cli.command()
 @click.option("--froude", "-f", multiple=True, type=float, help="Froude numbers to run (default: defined in FROUDE_POINTS)")
-@click.option("--dry-run", is_flag=True, help="Generate cases but do not run simulations")
-def sweep(froude, dry_run):
+@click.option("--dry-run", is_flag=True, help="Print the planned schedule and makespan without running simulations")
+@click.option("--cores", "-c", type=int, default=None, help="Total core budget shared by the cases (default: all cores)")
+@click.option("--warm-start", is_flag=True, help="Start each case from the nearest finished Froude solution")
+@click.option("--link-mode", type=click.Choice(["auto", "reflink", "hardlink", "symlink", "copy"]), default="auto", show_default=True,
+              help="How variants share the base mesh and geometry")
+@click.option("--clean", is_flag=True, help="Discard earlier runs of these cases instead of resuming them")
+def sweep(froude, dry_run, cores, warm_start, link_mode, clean):
     """
     Run a velocity sweep for the base case.
+
+    An interrupted sweep is resumed by running it again: finished cases are
+    skipped and partly run cases continue from their latest written time.
     """
     froude_points = list(froude) if froude else FROUDE_POINTS
     
@@ -393,16 +637,40 @@ def sweep(froude, dry_run):
         
         # 2. Setup Cases (copying the base mesh)
         logging.info("Step 2: Setting up Sweep Cases...")
-        case_map = setup_sweep_cases(froude_points, mesh_source_path=mesh_source_path, dry_run=dry_run)
+        case_map = setup_sweep_cases(froude_points, mesh_source_path=mesh_source_path, dry_run=dry_run, warm_start=warm_start,
+                                     link_mode=link_mode, clean=clean)
         
         # 3. Run Sweep
         logging.info("Step 3: Running Sweep...")
-        run_sweep(case_map, dry_run=dry_run)
+        run_sweep(case_map, dry_run=dry_run, cores=cores, mesh_source_path=mesh_source_path)
         logging.info("Sweep completed successfully.")
         
     except Exception as e:
         logging.error(f"Sweep failed: {e}")
         exit(1)
 
+@cli.command()
+@click.option("--fr-min", default=min(FROUDE_POINTS), show_default=True, help="Lowest Froude number of the range")
+@click.option("--fr-max", default=max(FROUDE_POINTS), show_default=True, help="Highest Froude number of the range")
+@click.option("--seed-points", default=3, show_default=True, help="Evenly spaced points run before the surrogate takes over")
+@click.option("--batch-size", default=2, show_default=True, help="Froude numbers added per round (run in parallel)")
+@click.option("--max-runs", default=12, show_default=True, help="Upper limit on cases run by this sweep")
+@click.option("--tolerance", default=0.02, show_default=True, help="Target relative 95% half-width over the range")
+@click.option("--target", type=click.Choice(["resistance", "power"]), default="power", show_default=True, help="Quantity whose uncertainty drives the sampling")
+@click.option("--cores", "-c", type=int, default=None, help="Total core budget shared by the cases (default: all cores)")
+@click.option("--warm-start", is_flag=True, help="Start each case from the nearest finished Froude solution")
+def adaptive(fr_min, fr_max, seed_points, batch_size, max_runs, tolerance, target, cores, warm_start):
+    """
+    Run a sweep that chooses its own Froude numbers.
+    Writes the surrogate resistance and power curve with uncertainty to
+    results/dtc_adaptive_sweep.csv.
+    """
+    try:
+        run_adaptive(fr_min, fr_max, n_seed=seed_points, batch_size=batch_size, max_runs=max_runs,
+                     tolerance=tolerance, target=target, cores=cores, warm_start=warm_start)
+    except Exception as e:
+        logging.error(f"Adaptive sweep failed: {e}")
+        exit(1)
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,176 @@
+"""
+Thin copies of case inputs.
+
+Large read-only inputs (polyMesh, triSurface geometry) are linked to one
+shared store instead of copied into every case variant; everything else is
+copied as usual. Each file is linked with the first method that works:
+
+    reflink   copy-on-write clone (btrfs, XFS, APFS via cp); fully independent
+    hardlink  same inode; shares data and permissions with the store
+    symlink   works across file systems
+
+Hardlinks and symlinks are only safe while nobody writes to the linked file,
+so the store is made read-only: a tool that tries to overwrite a linked file
+fails instead of silently changing every variant. Tools that regenerate an
+input (blockMesh, surfaceFeatureExtract) must get a case without that input
+rather than a link to it.
+"""
+import filecmp
+import fnmatch
+import logging
+import os
+import shutil
+import stat
+from collections import Counter
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+# ioctl request that clones a file's extents (Linux FICLONE)
+FICLONE = 0x40049409
+LINK_METHODS = ("reflink", "hardlink", "symlink")
+READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+
+def _reflink(src, dst):
+    if fcntl is None:
+        raise OSError("reflinks need fcntl")
+    with open(src, "rb") as source, open(dst, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.unlink(dst)
+            raise
+
+
+def link_file(src, dst, methods=LINK_METHODS):
+    """
+    Link `dst` to `src` with the first of `methods` that works; "copy" copies.
+    Returns the method used.
+    """
+    src, dst = Path(src), Path(dst)
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+    for method in methods:
+        try:
+            if method == "reflink":
+                _reflink(src, dst)
+            elif method == "hardlink":
+                os.link(src, dst)
+            elif method == "symlink":
+                dst.symlink_to(src.resolve())
+            elif method == "copy":
+                shutil.copy2(src, dst)
+            else:
+                raise ValueError(f"Unknown link method {method!r}")
+            return method
+        except OSError as e:
+            logging.debug(f"{method} {src} -> {dst} failed: {e}")
+    raise OSError(f"Could not link {dst} to {src} with any of {methods}")
+
+
+def matches(rel, patterns):
+    """True if the relative path `rel`, or its file name, matches one of the glob `patterns`."""
+    return any(fnmatch.fnmatch(rel, pattern) or fnmatch.fnmatch(Path(rel).name, pattern) for pattern in patterns)
+
+
+def make_read_only(path):
+    """Remove write permission from every file below `path` (directories stay writable)."""
+    path = Path(path)
+    files = [path] if path.is_file() else [p for p in path.rglob("*") if p.is_file() and not p.is_symlink()]
+    for file in files:
+        file.chmod(file.stat().st_mode & READ_ONLY)
+
+
+def thin_copytree(src, dst, link=("*",), ignore=(), methods=LINK_METHODS):
+    """
+    Copy the tree `src` to `dst`, linking files that match `link`.
+
+    `link` and `ignore` are glob patterns matched against paths relative to
+    `src`; ignored files and directories are left out. Linked files are
+    made read-only in `src` first (see module docstring). Returns a Counter
+    of the methods used.
+    """
+    src, dst = Path(src), Path(dst)
+    used = Counter()
+
+    for root, dirs, files in os.walk(src):
+        rel_root = Path(root).relative_to(src)
+        dirs[:] = [d for d in dirs if not matches(str(rel_root / d), ignore)]
+        (dst / rel_root).mkdir(parents=True, exist_ok=True)
+        for name in files:
+            rel = str(rel_root / name)
+            if matches(rel, ignore):
+                continue
+            source = Path(root) / name
+            if matches(rel, link):
+                make_read_only(source)
+                used[link_file(source, dst / rel, methods)] += 1
+            else:
+                shutil.copy2(source, dst / rel)
+                used["copy"] += 1
+    return used
+
+
+def link_methods(mode):
+    """Methods to try for a --link-mode value ("auto" tries all, in order)."""
+    return LINK_METHODS if mode == "auto" else (mode,)
+
+
+def same_content(a, b):
+    """True if the files `a` and `b` hold the same bytes (or are the same file)."""
+    a, b = Path(a), Path(b)
+    if not b.exists():
+        return False
+    if os.path.samefile(a, b):
+        return True
+    return a.stat().st_size == b.stat().st_size and filecmp.cmp(a, b, shallow=False)
+
+
+def sync_tree(src, dst, link=(), keep=(), methods=LINK_METHODS):
+    """
+    Make `dst` a copy of `src`, touching only what differs.
+
+    Files whose content already matches are left alone, mtime included, so
+    tools that compare mtimes (make, Snakemake) do not see them change. Changed
+    and new files are replaced atomically (linked when they match `link`, see
+    thin_copytree), and files that are not in `src` are removed unless they
+    match `keep`. Returns a Counter of unchanged, written and removed files.
+    """
+    src, dst = Path(src), Path(dst)
+    done = Counter()
+
+    wanted = set()
+    for root, dirs, files in os.walk(src):
+        rel_root = Path(root).relative_to(src)
+        (dst / rel_root).mkdir(parents=True, exist_ok=True)
+        for name in files:
+            rel = rel_root / name
+            wanted.add(rel)
+            source, target = Path(root) / name, dst / rel
+            if same_content(source, target):
+                done["unchanged"] += 1
+                continue
+            if matches(str(rel), link):
+                make_read_only(source)
+                link_file(source, target, methods)
+            else:
+                tmp = target.with_name(f".{name}.{os.getpid()}.tmp")
+                shutil.copy2(source, tmp)
+                os.replace(tmp, target)
+            done["written"] += 1
+
+    for root, dirs, files in os.walk(dst, topdown=False):
+        rel_root = Path(root).relative_to(dst)
+        for name in files:
+            rel = rel_root / name
+            if rel not in wanted and not matches(str(rel), keep):
+                (dst / rel).unlink()
+                done["removed"] += 1
+        if rel_root != Path(".") and not any(Path(root).iterdir()) and not (src / rel_root).is_dir():
+            Path(root).rmdir()
+    return done
@@ -0,0 +1,89 @@
+"""
+Columnar cache for parsed time series (force histories, log records).
+
+Each cache is an uncompressed .npz next to the file it was parsed from, with
+one array per column plus the size and mtime of every source file. A cache is
+used as long as those still match, so re-extracting an unchanged case costs
+one small binary read instead of an ASCII parse. Columns are loaded lazily:
+`open_columns` gives notebooks and other scripts access to single columns
+without reading the rest.
+"""
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Reserved array name holding the (size, mtime_ns) of each source file
+KEY_FIELD = "__source_key__"
+
+
+def cache_path(source):
+    """Location of the cache for `source`."""
+    source = Path(source)
+    return source.with_name(f"{source.name}.npz")
+
+
+def source_key(sources):
+    """(size, mtime_ns) of every source file, as an (n, 2) int64 array."""
+    stats = [Path(source).stat() for source in sources]
+    return np.array([[st.st_size, st.st_mtime_ns] for st in stats], dtype=np.int64)
+
+
+def write_columns(path, df, key=None):
+    """
+    Write the columns of `df` to `path`.
+
+    The file is written next to its destination and renamed into place, so
+    a reader never sees a half-written cache.
+    """
+    path = Path(path)
+    arrays = {column: df[column].to_numpy() for column in df.columns}
+    if key is not None:
+        arrays[KEY_FIELD] = key
+
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    tmp_path.replace(path)
+
+
+def open_columns(path):
+    """Open a cache lazily; each column is read from disk on first access."""
+    return np.load(path, allow_pickle=False)
+
+
+def read_columns(path):
+    """Read every column of a cache into a DataFrame."""
+    with open_columns(path) as npz:
+        return pd.DataFrame({name: npz[name] for name in npz.files if name != KEY_FIELD})
+
+
+def read_key(path):
+    """Return the source key stored in a cache, or None if it has none."""
+    with open_columns(path) as npz:
+        return npz[KEY_FIELD] if KEY_FIELD in npz.files else None
+
+
+def load_cached(sources, parser, cache_file=None):
+    """
+    Return parser() as a DataFrame, reusing the cache while `sources` are unchanged.
+
+    `sources` lists every file the parser reads; a change in the size or
+    mtime of any of them invalidates the cache. The cache defaults to a .npz
+    next to the first source.
+    """
+    sources = [Path(source) for source in sources]
+    cache_file = Path(cache_file) if cache_file is not None else cache_path(sources[0])
+    key = source_key(sources)
+
+    if cache_file.exists():
+        cached_key = read_key(cache_file)
+        if cached_key is not None and np.array_equal(cached_key, key):
+            logging.debug(f"Using cached time series {cache_file}")
+            return read_columns(cache_file)
+
+    df = parser()
+    write_columns(cache_file, df, key=key)
+    return df
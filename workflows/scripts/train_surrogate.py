@@ -11,6 +11,8 @@ from pathlib import Path
 import json
 import pickle
 
+from hydrostatics import resistance_coefficients
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -44,6 +46,12 @@ def calculate_coefficients(df, scale=1.0):
     
     # For now, we will focus on P vs V fitting directly for the surrogate
     df['power'] = df['force_x'] * df['velocity']
+
+    # Ct and Cf need the wetted surface, which extract_data.py adds from the hull's hydrostatics
+    if 'wetted_area' in df and 'ct' not in df:
+        coefficients = resistance_coefficients(df['force_x'], df['velocity'], df['wetted_area'], df['waterline_length'])
+        df['ct'] = coefficients['ct']
+        df['cf'] = coefficients['cf']
     return df
 
 def train_model(df):
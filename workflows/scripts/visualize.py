@@ -1,54 +1,98 @@
+import os
 import click
 import pyvista as pv
 import numpy as np
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from foam_case import latest_time, processor_dirs
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
+def read_processor(processor_dir, time_name):
+    """
+    Read the internal mesh and alpha.water of one processor directory at `time_name`.
+
+    Each processor directory is read as a case of its own (its system/ is
+    linked to the parent case's), so processors can be read in parallel.
+    """
+    processor_dir = Path(processor_dir)
+    system = processor_dir / "system"
+    if not system.exists():
+        system.symlink_to(Path("..") / "system")
+    foam_file = processor_dir / "processor.foam"
+    if not foam_file.exists():
+        foam_file.touch()
+
+    reader = pv.POpenFOAMReader(str(foam_file))
+    reader.set_active_time_value(float(time_name))
+    reader.disable_all_patch_arrays()
+    reader.enable_patch_array("internalMesh")
+    reader.disable_all_cell_arrays()
+    if "alpha.water" in reader.cell_array_names:
+        reader.enable_cell_array("alpha.water")
+    # Point data is interpolated once on the merged mesh, not per processor
+    reader.cell_to_point_creation = False
+
+    mesh = reader.read()
+    return mesh["internalMesh"] if isinstance(mesh, pv.MultiBlock) else mesh
+
+def read_decomposed(case_dir, time_name, jobs=None):
+    """
+    Read the internal mesh of a decomposed case at `time_name` without
+    reconstructPar, one processor directory per worker.
+    """
+    processors = processor_dirs(case_dir)
+    jobs = min(jobs or os.cpu_count() or 1, len(processors))
+    logging.info(f"Reading {len(processors)} processor directories with {jobs} worker(s)")
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            parts = list(pool.map(read_processor, processors, [time_name] * len(processors)))
+    else:
+        parts = [read_processor(processor, time_name) for processor in processors]
+    return pv.merge([part for part in parts if part.n_cells > 0])
+
 @click.command()
 @click.argument("case_dir", type=click.Path(exists=True, path_type=Path))
 @click.argument("output_dir", type=click.Path(path_type=Path))
 @click.option("--view", default="default", help="Camera view: default, xz (side), xy (top)")
 @click.option("--focus-interface", is_flag=True, help="Zoom camera to fit the water interface")
 @click.option("--z-scale", default=1.0, help="Scale factor for Z-axis (amplify details)")
-def visualize(case_dir: Path, output_dir: Path, view: str, focus_interface: bool, z_scale: float):
+@click.option("--jobs", "-j", type=int, default=None, help="Processor directories to read in parallel (default: all cores)")
+def visualize(case_dir: Path, output_dir: Path, view: str, focus_interface: bool, z_scale: float, jobs: int):
     """
     Generate visualizations for an OpenFOAM case.
+
+    A case whose latest time was not reconstructed is read directly from its
+    processor directories.
     """
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # Locate the latest time directory (simple heuristic)
-    # OpenFOAM time directories are numbers.
-    time_dirs = []
-    for item in case_dir.iterdir():
-        if item.is_dir():
-            try:
-                float(item.name)
-                time_dirs.append(item)
-            except ValueError:
-                pass
-    
-    if not time_dirs:
+    # Locate the latest time directory, reconstructed or in processor*/
+    latest = latest_time(case_dir)
+    if latest is None:
         logging.warning(f"No time directories found in {case_dir}. Skipping visualization.")
         return
 
-    latest_proctime = max(time_dirs, key=lambda p: float(p.name))
-    logging.info(f"Visualizing results from time: {latest_proctime.name}")
+    time_name, decomposed = latest
+    logging.info(f"Visualizing results from time: {time_name}" + (" (decomposed)" if decomposed else ""))
 
     try:
-        # Create a dummy .foam file for Reader if it doesn't exist
-        foam_file = case_dir / "case.foam"
-        if not foam_file.exists():
-            foam_file.touch()
-            
-        reader = pv.POpenFOAMReader(str(foam_file))
-        reader.set_active_time_value(float(latest_proctime.name))
-        
         pv.global_theme.allow_empty_mesh = True
-        
-        mesh = reader.read()
+
+        if decomposed:
+            mesh = read_decomposed(case_dir, time_name, jobs)
+        else:
+            # Create a dummy .foam file for Reader if it doesn't exist
+            foam_file = case_dir / "case.foam"
+            if not foam_file.exists():
+                foam_file.touch()
+
+            reader = pv.POpenFOAMReader(str(foam_file))
+            reader.set_active_time_value(float(time_name))
+            mesh = reader.read()
         logging.info(f"Reader returned: {type(mesh)}")
         if isinstance(mesh, pv.MultiBlock):
             logging.info(f"MultiBlock keys: {mesh.keys()}")
@@ -91,7 +135,7 @@ def visualize(case_dir: Path, output_dir: Path, view: str, focus_interface: bool
         else:
              logging.info("alpha.water not found in mesh data.")
         
-        p.add_title(f"Simulation: {case_dir.name} at t={latest_proctime.name}", color="black")
+        p.add_title(f"Simulation: {case_dir.name} at t={time_name}", color="black")
         p.add_legend() # Default color
         p.show_axes()
         p.show_grid(color="gray")
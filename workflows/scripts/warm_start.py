@@ -0,0 +1,221 @@
+"""
+Seed a sweep case with the solution of the nearest finished Froude case.
+
+The fields of the latest time directory become the initial conditions of
+the new case, so it starts from a developed wave pattern and boundary layer
+instead of a calm free surface. All sweep cases share the base mesh, so the
+fields can be copied one to one. Flow quantities are rescaled to the new
+speed: U and the turbulence frequency with U, k with U^2, nut with U.
+alpha.water and p_rgh (dominated by the hydrostatic part) are copied as is.
+
+Both ASCII and binary field files are handled; binary lists are rescaled in
+place without changing their layout.
+"""
+import logging
+import re
+import shutil
+from pathlib import Path
+
+import numpy as np
+import toml
+
+from foam_case import read_cell_count
+
+# Field name -> power of the velocity ratio it scales with
+FIELD_SCALING = {
+    "U": 1,
+    "alpha.water": 0,
+    "p_rgh": 0,
+    "k": 2,
+    "omega": 1,
+    "nut": 1,
+}
+
+FLOAT = rb'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+LIST_PATTERN = re.compile(rb'nonuniform\s+List<(scalar|vector)>\s*(\d+)\s*\(')
+UNIFORM_SCALAR_PATTERN = re.compile(rb'(uniform\s+)(' + FLOAT + rb')')
+UNIFORM_VECTOR_PATTERN = re.compile(rb'(uniform\s+\()([^()]*)(\))')
+# Scalar speed entries of outletPhaseMeanVelocity (plain or Function1 "constant")
+MEAN_VELOCITY_PATTERN = re.compile(rb'^(\s*(?:Umean|UnMean)\s+(?:constant\s+)?)(' + FLOAT + rb')(\s*;)', re.MULTILINE)
+FORMAT_PATTERN = re.compile(rb'^\s*format\s+(\w+)\s*;', re.MULTILINE)
+ARCH_SCALAR_PATTERN = re.compile(rb'scalar=(\d+)')
+FINISHED_MARKER = "End"
+
+COMPONENTS = {b"scalar": 1, b"vector": 3}
+
+
+def _scale_numbers(text, factor):
+    """Scale every number in a short ASCII fragment."""
+    return re.sub(FLOAT, lambda m: b'%.9g' % (float(m.group(0)) * factor), text)
+
+
+def _ascii_list_end(content, start):
+    """Index just past the ')' closing the list whose '(' ends at `start`."""
+    chars = np.frombuffer(content, dtype=np.uint8, offset=start)
+    depth = np.cumsum((chars == ord('(')).astype(np.int64) - (chars == ord(')')))
+    closing = np.flatnonzero(depth == -1)
+    if len(closing) == 0:
+        raise ValueError("Unterminated nonuniform list")
+    return start + int(closing[0]) + 1
+
+
+def _scale_ascii_list(body, kind, factor):
+    values = np.array(body.translate(bytes.maketrans(b"()", b"  ")).split(), dtype=float) * factor
+    if kind == b"vector":
+        lines = ("(%.9g %.9g %.9g)" % tuple(row) for row in values.reshape(-1, 3))
+    else:
+        lines = ("%.9g" % value for value in values)
+    return ("\n" + "\n".join(lines) + "\n").encode()
+
+
+def _field_layout(content):
+    """(binary, scalar dtype) of a field file from its FoamFile header."""
+    fmt = FORMAT_PATTERN.search(content)
+    arch = ARCH_SCALAR_PATTERN.search(content)
+    dtype = np.float32 if arch is not None and arch.group(1) == b"32" else np.float64
+    return fmt is not None and fmt.group(1) == b"binary", dtype
+
+
+def iter_lists(content):
+    """
+    Yield (kind, count, start, end) for every nonuniform list of a field file.
+
+    `start` is the first byte after the opening '(' and `end` the index of
+    the closing ')'. Binary data is skipped rather than searched, so bytes
+    inside it are never mistaken for a list header.
+    """
+    binary, dtype = _field_layout(content)
+    pos = 0
+    while True:
+        match = LIST_PATTERN.search(content, pos)
+        if match is None:
+            return
+        kind, count, start = match.group(1), int(match.group(2)), match.end()
+        if binary:
+            end = start + count * COMPONENTS[kind] * np.dtype(dtype).itemsize
+            if content[end:end + 1] != b")":
+                raise ValueError(f"Binary list of {count} {kind.decode()}s is not followed by ')'")
+        else:
+            end = _ascii_list_end(content, start) - 1
+        yield kind, count, start, end
+        pos = end
+
+
+def list_lengths(content):
+    """Lengths of all nonuniform lists in a field file (internal field first)."""
+    return [count for _, count, _, _ in iter_lists(content)]
+
+
+def scale_field(content, factor):
+    """
+    Multiply every value of an OpenFOAM field file (bytes) by `factor`.
+
+    Uniform values, nonuniform lists (ASCII or binary) and the mean-velocity
+    entries of outlet conditions are scaled; everything else is kept.
+    """
+    binary, dtype = _field_layout(content)
+    parts = []
+    pos = 0
+    for kind, count, start, end in iter_lists(content):
+        parts.append(_scale_uniform(content[pos:start], factor))
+        if binary:
+            values = np.frombuffer(content, dtype=dtype, count=count * COMPONENTS[kind], offset=start)
+            parts.append((values * factor).astype(dtype).tobytes())
+        else:
+            parts.append(_scale_ascii_list(content[start:end], kind, factor))
+        pos = end
+    parts.append(_scale_uniform(content[pos:], factor))
+    return b"".join(parts)
+
+
+def _scale_uniform(text, factor):
+    text = UNIFORM_VECTOR_PATTERN.sub(lambda m: m.group(1) + _scale_numbers(m.group(2), factor) + m.group(3), text)
+    text = UNIFORM_SCALAR_PATTERN.sub(lambda m: m.group(1) + b'%.9g' % (float(m.group(2)) * factor), text)
+    return MEAN_VELOCITY_PATTERN.sub(lambda m: m.group(1) + b'%.9g' % (float(m.group(2)) * factor) + m.group(3), text)
+
+
+def latest_time_dir(run_dir):
+    """The latest reconstructed time directory (holding U) of a run, or None."""
+    times = []
+    for path in Path(run_dir).iterdir():
+        try:
+            value = float(path.name)
+        except ValueError:
+            continue
+        if value > 0 and (path / "U").exists():
+            times.append((value, path))
+    return max(times)[1] if times else None
+
+
+def is_finished(run_dir):
+    """True once the solver log of a run ends with the 'End' marker."""
+    log_path = Path(run_dir) / "log.foamRun"
+    if not log_path.exists():
+        return False
+    with open(log_path, "rb") as f:
+        f.seek(max(0, log_path.stat().st_size - 1024))
+        tail = f.read().decode(errors="replace").split()
+    return bool(tail) and tail[-1] == FINISHED_MARKER
+
+
+def finished_cases(results_dir, cases_dir, exclude=()):
+    """
+    Finished runs that can seed a warm start.
+
+    Returns {case name: {'froude', 'velocity', 'time_dir'}}, with the speed
+    read from the case.toml of each case.
+    """
+    seeds = {}
+    if not Path(results_dir).exists():
+        return seeds
+    for run_dir in sorted(Path(results_dir).iterdir()):
+        config_path = Path(cases_dir) / run_dir.name / "case.toml"
+        if run_dir.name in exclude or not config_path.exists() or not is_finished(run_dir):
+            continue
+        parameters = toml.load(config_path).get("parameters", {})
+        time_dir = latest_time_dir(run_dir)
+        if parameters.get("froude") is None or parameters.get("velocity") is None or time_dir is None:
+            continue
+        seeds[run_dir.name] = {
+            'froude': parameters["froude"],
+            'velocity': parameters["velocity"],
+            'time_dir': time_dir,
+        }
+    return seeds
+
+
+def nearest_seed(froude, seeds):
+    """Name of the seed closest in Froude number, or None without seeds."""
+    if not seeds:
+        return None
+    return min(seeds, key=lambda name: abs(seeds[name]['froude'] - froude))
+
+
+def write_warm_start(time_dir, target_dir, velocity_ratio, n_cells=None):
+    """
+    Write the fields of `time_dir`, rescaled to the new speed, to `target_dir`.
+
+    With `n_cells` given, a field whose internal field does not have one value
+    per cell raises ValueError, since it belongs to a different mesh.
+    """
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    for name, power in FIELD_SCALING.items():
+        source = Path(time_dir) / name
+        if not source.exists():
+            continue
+        content = source.read_bytes()
+        lengths = list_lengths(content)
+        if n_cells is not None and lengths and lengths[0] != n_cells:
+            raise ValueError(f"{source} has {lengths[0]} values but the mesh has {n_cells} cells")
+        if power == 0:
+            shutil.copy(source, target_dir / name)
+        else:
+            (target_dir / name).write_bytes(scale_field(content, velocity_ratio ** power))
+    logging.info(f"Warm start fields from {time_dir} (U x {velocity_ratio:.4f}) written to {target_dir}")
+
+
+def seed_case(variant_path, seed, velocity, mesh_dir=None):
+    """Seed the 0.orig of a sweep case from a `finished_cases` record."""
+    n_cells = read_cell_count(mesh_dir) if mesh_dir else None
+    write_warm_start(seed['time_dir'], Path(variant_path) / "0.orig", velocity / seed['velocity'], n_cells=n_cells)